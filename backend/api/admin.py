@@ -1,3 +1,54 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Document, ExtractedField, ExtractedText, Job, JobFile, LLMResponse
+
+
+@admin.register(ExtractedText)
+class ExtractedTextAdmin(admin.ModelAdmin):
+    list_display = ('content_hash', 'extractor_version', 'method', 'size', 'hits', 'last_accessed')
+    list_filter = ('method',)
+    readonly_fields = ('created_at',)
+
+
+@admin.register(LLMResponse)
+class LLMResponseAdmin(admin.ModelAdmin):
+    list_display = ('key', 'model_name', 'size', 'hits', 'created_at', 'last_accessed')
+    list_filter = ('model_name',)
+
+
+@admin.register(ExtractedField)
+class ExtractedFieldAdmin(admin.ModelAdmin):
+    list_display = ('content_hash', 'model_name', 'field', 'value', 'source', 'created_at')
+    list_filter = ('model_name', 'field', 'source')
+    search_fields = ('content_hash', 'value')
+
+
+class JobFileInline(admin.TabularInline):
+    model = JobFile
+    fields = ('filename', 'content_hash', 'status', 'error', 'started_at', 'finished_at')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'model_name', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status', 'model_name')
+    readonly_fields = ('created_at',)
+    inlines = (JobFileInline,)
+
+
+@admin.register(JobFile)
+class JobFileAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'job', 'status', 'content_hash', 'started_at', 'finished_at')
+    list_filter = ('status',)
+    search_fields = ('filename', 'content_hash')
+
+
+@admin.register(Document)
+class DocumentAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'content_hash', 'size', 'persistent', 'uploaded_at', 'last_accessed')
+    list_filter = ('persistent',)
+    search_fields = ('filename', 'content_hash')
+    readonly_fields = ('uploaded_at',)
@@ -0,0 +1,285 @@
+import json
+import hashlib
+import threading
+import logging
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .metrics import register_collector
+from .models import ExtractedText, LLMResponse
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the total size of cached text before LRU eviction kicks in
+EXTRACTION_CACHE_MAX_BYTES = getattr(settings, 'EXTRACTION_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+
+# LLM responses expire after the TTL and are LRU-evicted above the byte budget
+LLM_CACHE_TTL_SECONDS = getattr(settings, 'LLM_CACHE_TTL_SECONDS', 7 * 24 * 60 * 60)
+LLM_CACHE_MAX_BYTES = getattr(settings, 'LLM_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+
+_stats_lock = threading.Lock()
+_extraction_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_llm_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _count(stats, key, amount=1):
+    with _stats_lock:
+        stats[key] += amount
+
+
+def _evict_lru(model, max_bytes, stats, label):
+    """
+    Drop least recently used rows of model until their total size fits in max_bytes
+    """
+    try:
+        total = model.objects.aggregate(total=Sum('size'))['total'] or 0
+        if total <= max_bytes:
+            return 0
+
+        to_free = total - max_bytes
+        stale_ids = []
+        for entry_id, size in model.objects.order_by('last_accessed').values_list('id', 'size'):
+            stale_ids.append(entry_id)
+            to_free -= size
+            if to_free <= 0:
+                break
+
+        deleted, _ = model.objects.filter(id__in=stale_ids).delete()
+        _count(stats, "evictions", deleted)
+        logger.info(f"Evicted {deleted} entries from {label} cache")
+        return deleted
+
+    except Exception as e:
+        logger.warning(f"Eviction from {label} cache failed: {e}")
+        return 0
+
+
+def _summarize(model, stats, max_bytes):
+    with _stats_lock:
+        summary = dict(stats)
+
+    lookups = summary["hits"] + summary["misses"]
+    summary["hit_rate"] = round(summary["hits"] / lookups, 4) if lookups else 0.0
+
+    try:
+        summary["entries"] = model.objects.count()
+        summary["bytes"] = model.objects.aggregate(total=Sum('size'))['total'] or 0
+    except Exception:
+        summary["entries"] = None
+        summary["bytes"] = None
+
+    summary["max_bytes"] = max_bytes
+    return summary
+
+
+def get_cached_text(content_hash, extractor_version):
+    """
+    Return cached cleaned text for a document or None on a miss.
+    Cache failures (e.g. missing migrations) are logged and treated as misses.
+    """
+    try:
+        entry = ExtractedText.objects.filter(
+            content_hash=content_hash,
+            extractor_version=str(extractor_version),
+        ).only('id', 'text').first()
+
+        if entry is None:
+            _count(_extraction_stats, "misses")
+            return None
+
+        ExtractedText.objects.filter(id=entry.id).update(
+            hits=F('hits') + 1,
+            last_accessed=timezone.now(),
+        )
+        _count(_extraction_stats, "hits")
+        return entry.text
+
+    except Exception as e:
+        logger.warning(f"Extraction cache lookup failed: {e}")
+        _count(_extraction_stats, "misses")
+        return None
+
+
+def store_text(content_hash, extractor_version, text, method=''):
+    """
+    Store cleaned text for a document, with the extraction method that
+    produced it, and evict old entries if over budget
+    """
+    if not text:
+        return
+
+    try:
+        ExtractedText.objects.create(
+            content_hash=content_hash,
+            extractor_version=str(extractor_version),
+            method=method,
+            text=text,
+            size=len(text.encode('utf-8')),
+        )
+    except IntegrityError:
+        # Another worker extracted the same document concurrently
+        return
+    except Exception as e:
+        logger.warning(f"Extraction cache store failed: {e}")
+        return
+
+    evict_extraction_cache()
+
+
+def evict_extraction_cache(max_bytes=None):
+    """
+    Drop least recently used entries until the cache fits in max_bytes
+    """
+    max_bytes = EXTRACTION_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    return _evict_lru(ExtractedText, max_bytes, _extraction_stats, "extraction")
+
+
+def extraction_cache_stats():
+    """
+    Hit/miss counters for this process plus the current size of the cache
+    """
+    return _summarize(ExtractedText, _extraction_stats, EXTRACTION_CACHE_MAX_BYTES)
+
+
+def llm_cache_key(model_name, params, prompt):
+    """
+    Stable key for a completion: same model, parameters and prompt give the same key
+    """
+    payload = json.dumps(
+        {"model": model_name, "params": params, "prompt": prompt},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get_cached_response(key):
+    """
+    Return a cached completion or None if missing or older than the TTL
+    """
+    try:
+        entry = LLMResponse.objects.filter(key=key).only('id', 'response', 'created_at').first()
+
+        if entry is None:
+            _count(_llm_stats, "misses")
+            return None
+
+        if entry.created_at < timezone.now() - timedelta(seconds=LLM_CACHE_TTL_SECONDS):
+            LLMResponse.objects.filter(id=entry.id).delete()
+            _count(_llm_stats, "evictions")
+            _count(_llm_stats, "misses")
+            return None
+
+        LLMResponse.objects.filter(id=entry.id).update(
+            hits=F('hits') + 1,
+            last_accessed=timezone.now(),
+        )
+        _count(_llm_stats, "hits")
+        return entry.response
+
+    except Exception as e:
+        logger.warning(f"LLM cache lookup failed: {e}")
+        _count(_llm_stats, "misses")
+        return None
+
+
+def store_response(key, model_name, response):
+    """
+    Store a completion and evict expired or least recently used entries
+    """
+    if not response:
+        return
+
+    try:
+        LLMResponse.objects.create(
+            key=key,
+            model_name=model_name,
+            response=response,
+            size=len(response.encode('utf-8')),
+        )
+    except IntegrityError:
+        return
+    except Exception as e:
+        logger.warning(f"LLM cache store failed: {e}")
+        return
+
+    evict_llm_cache()
+
+
+def evict_llm_cache(max_bytes=None):
+    """
+    Drop expired completions, then LRU entries until the cache fits in max_bytes
+    """
+    max_bytes = LLM_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    try:
+        cutoff = timezone.now() - timedelta(seconds=LLM_CACHE_TTL_SECONDS)
+        expired, _ = LLMResponse.objects.filter(created_at__lt=cutoff).delete()
+        _count(_llm_stats, "evictions", expired)
+    except Exception as e:
+        logger.warning(f"LLM cache expiry failed: {e}")
+        expired = 0
+
+    return expired + _evict_lru(LLMResponse, max_bytes, _llm_stats, "LLM")
+
+
+def llm_cache_stats():
+    """
+    Hit/miss counters for this process plus the current size of the cache
+    """
+    stats = _summarize(LLMResponse, _llm_stats, LLM_CACHE_MAX_BYTES)
+    stats["ttl_seconds"] = LLM_CACHE_TTL_SECONDS
+    return stats
+
+
+def _cache_metrics():
+    with _stats_lock:
+        caches = {"extraction": dict(_extraction_stats), "llm": dict(_llm_stats)}
+    return [
+        (f"biodata_cache_{key}_total", 'counter', f"Cache {key} per cache since start",
+         [({"cache": cache}, stats[key]) for cache, stats in caches.items()])
+        for key in ("hits", "misses", "evictions")
+    ]
+
+
+register_collector(_cache_metrics)
+
+
+class CachedLLM:
+    """
+    Memoizing wrapper around an LLM: invoke() and ainvoke() answer repeated
+    prompts for the same model and generation parameters from the response
+    cache. Per-call overrides (e.g. format, options) are passed through and
+    part of the key.
+    """
+
+    def __init__(self, llm, model_name, params):
+        self.llm = llm
+        self.model_name = model_name
+        self.params = params
+
+    def invoke(self, prompt, **kwargs):
+        key = llm_cache_key(self.model_name, {**self.params, **kwargs}, prompt)
+
+        cached = get_cached_response(key)
+        if cached is not None:
+            return cached
+
+        response = self.llm.invoke(prompt, **kwargs)
+        store_response(key, self.model_name, response)
+        return response
+
+    async def ainvoke(self, prompt, **kwargs):
+        key = llm_cache_key(self.model_name, {**self.params, **kwargs}, prompt)
+
+        cached = await sync_to_async(get_cached_response)(key)
+        if cached is not None:
+            return cached
+
+        response = await self.llm.ainvoke(prompt, **kwargs)
+        await sync_to_async(store_response)(key, self.model_name, response)
+        return response
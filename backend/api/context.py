@@ -0,0 +1,150 @@
+import re
+import logging
+from django.conf import settings
+
+from .criteria import search_text
+from .rules import FIELD_RULES, normalize_key
+from .search import tokens
+
+logger = logging.getLogger(__name__)
+
+# Send only the biodata sections relevant to a prompt instead of the whole text
+SECTION_CONTEXT = getattr(settings, 'SECTION_CONTEXT', True)
+
+# Document tokens per prompt for each model (Ollama truncates past num_ctx)
+MODEL_CONTEXT_TOKENS = getattr(settings, 'MODEL_CONTEXT_TOKENS', {'phi4': 3000, 'phi3': 1500, 'mistral': 3000})
+DEFAULT_CONTEXT_TOKENS = getattr(settings, 'DEFAULT_CONTEXT_TOKENS', 2000)
+
+# Rough size of a token in English biodata text
+CHARS_PER_TOKEN = 4
+
+PARTICULARS = 'particulars'
+QUALIFICATION = 'qualification'
+EXPERIENCE = 'experience'
+OTHER = 'other'
+
+# Section headers as normalized by clean_extracted_text
+_HEADER = re.compile(r'(?:[A-Z][a-z]+ Particulars|Qualifications?|Experience\b[^:]{0,60}):\s')
+
+# Criteria keys that are not BHEL particulars but name a section
+_KEY_SECTIONS = [
+    (re.compile(r'qualif|degree|educat|academic'), QUALIFICATION),
+    (re.compile(r'experien|project|training|career|history'), EXPERIENCE),
+]
+
+
+def split_sections(text):
+    """
+    Split cleaned biodata text at its section headers.
+    Returns [(kind, text)] in document order; text before the first header
+    counts as particulars since it holds the employee's identity.
+    """
+    sections = []
+    start = 0
+    kind = PARTICULARS
+    for header in _HEADER.finditer(text):
+        if header.start() > start:
+            sections.append((kind, text[start:header.start()].strip()))
+        start = header.start()
+        kind = _header_kind(header.group())
+    sections.append((kind, text[start:].strip()))
+    return [(kind, body) for kind, body in sections if body]
+
+
+def _header_kind(header):
+    if 'Particulars' in header:
+        return PARTICULARS
+    if header.startswith('Qualification'):
+        return QUALIFICATION
+    if header.startswith('Experience'):
+        return EXPERIENCE
+    return OTHER
+
+
+def field_section(key):
+    """
+    Section kind holding a criteria field, or None when it could be anywhere
+    """
+    normalized = normalize_key(key)
+    if normalized in FIELD_RULES:
+        return PARTICULARS
+    for pattern, kind in _KEY_SECTIONS:
+        if pattern.search(normalized):
+            return kind
+    return None
+
+
+def context_budget(model_name):
+    """
+    Characters of document text a prompt for the model may carry
+    """
+    return MODEL_CONTEXT_TOKENS.get(model_name, DEFAULT_CONTEXT_TOKENS) * CHARS_PER_TOKEN
+
+
+def build_context(text, model_name, criteria=None, extra_prompt=''):
+    """
+    Document text for a prompt about criteria and/or an extra prompt, within
+    the model's budget. When every criteria field belongs to a known section
+    and there is no extra prompt, only those sections are sent. Otherwise
+    sections holding requested fields come first, then those sharing the most
+    words with the criteria values and the extra prompt. Sections too long
+    for what is left of the budget contribute their most relevant chunks.
+    Selected text keeps document order.
+    """
+    criteria = criteria or {}
+    wanted = {field_section(key) for key in criteria}
+    focused = bool(wanted) and None not in wanted and not extra_prompt
+
+    budget = context_budget(model_name)
+    if not SECTION_CONTEXT or (len(text) <= budget and not focused):
+        return text
+
+    sections = split_sections(text)
+    if focused:
+        relevant = [(kind, body) for kind, body in sections if kind in wanted]
+        if relevant:
+            sections = relevant
+        if sum(len(body) + 1 for _, body in sections) <= budget:
+            return _trimmed(text, " ".join(body for _, body in sections))
+
+    query = {
+        token for token in tokens(" ".join([extra_prompt or '', *map(search_text, criteria.values())]))
+        if len(token) >= 3
+    }
+
+    candidates = []
+    for index, (kind, body) in enumerate(sections):
+        if len(body) > budget:
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+            pieces = RecursiveCharacterTextSplitter(
+                chunk_size=budget // 4,
+                chunk_overlap=0,
+                separators=["; ", ". ", ", ", " ", ""],
+            ).split_text(body)
+        else:
+            pieces = [body]
+
+        for position, piece in enumerate(pieces):
+            score = len(query & set(tokens(piece))) / max(len(query), 1)
+            if kind in wanted or None in wanted:
+                score += 1
+            candidates.append((score, (index, position), piece))
+
+    # Best first; ties keep document order
+    candidates.sort(key=lambda candidate: (-candidate[0], candidate[1]))
+
+    selected = []
+    remaining = budget
+    for score, order, piece in candidates:
+        if len(piece) <= remaining:
+            selected.append((order, piece))
+            remaining -= len(piece) + 1
+
+    selected.sort()
+    return _trimmed(text, " ".join(piece for _, piece in selected))
+
+
+def _trimmed(text, context):
+    logger.info(f"Prompt context trimmed from {len(text)} to {len(context)} characters")
+    return context
@@ -0,0 +1,210 @@
+import re
+import math
+import datetime
+from functools import lru_cache
+
+import numpy as np
+
+# Criteria operators. A plain criterion value uses MATCH, the original loose
+# word match; {"op": ..., "value": ...} selects a typed one.
+MATCH = 'match'
+EQUALS = 'eq'
+CONTAINS = 'contains'
+IN = 'in'
+LT = 'lt'
+LTE = 'lte'
+GT = 'gt'
+GTE = 'gte'
+BETWEEN = 'between'
+
+RANGE_OPERATORS = {LT, LTE, GT, GTE, BETWEEN}
+OPERATORS = {MATCH, EQUALS, CONTAINS, IN} | RANGE_OPERATORS
+
+# Fields compared as dates by range operators even when the bound is a bare year
+DATE_FIELDS = {'dateofbirth', 'dateofgrade', 'postingwef'}
+
+_DMY = re.compile(r'(\d{1,2})[./-](\d{1,2})[./-](\d{2,4})(?!\d)')
+_YMD = re.compile(r'(\d{4})[./-](\d{1,2})[./-](\d{1,2})(?!\d)')
+_YEAR = re.compile(r'(?:19|20)\d{2}')
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?')
+
+
+def parse_criterion(value):
+    """
+    (operator, operand) of a criterion value. Raises ValueError for an
+    unknown operator or an operand that does not fit it.
+    """
+    if not isinstance(value, dict):
+        return MATCH, value
+
+    op = str(value.get('op', MATCH)).lower()
+    operand = value.get('value')
+    if op not in OPERATORS:
+        raise ValueError(f"Unknown criteria operator '{op}'")
+    if operand is None or operand == '' or operand == []:
+        raise ValueError(f"Missing value for criteria operator '{op}'")
+    if op == IN and not isinstance(operand, list):
+        operand = [operand]
+    if op == BETWEEN and not (isinstance(operand, list) and len(operand) == 2):
+        raise ValueError("'between' needs a [low, high] value")
+    return op, operand
+
+
+def validate_criteria(criteria):
+    """
+    Raise ValueError if some criterion is malformed
+    """
+    for value in criteria.values():
+        parse_criterion(value)
+
+
+def search_text(value):
+    """
+    Text a document must share words with to satisfy the criterion, or ''
+    when it cannot be told from words (ranges)
+    """
+    op, operand = parse_criterion(value)
+    if op in RANGE_OPERATORS:
+        return ''
+    if op == IN:
+        return ' '.join(map(str, operand))
+    return str(operand)
+
+
+def normalize_fields(extracted_data):
+    """
+    Lower-cased string fields with null values dropped and birth dates
+    written with dots
+    """
+    fields = {k.lower(): str(v).lower() for k, v in extracted_data.items() if v is not None}
+    if 'dateofbirth' in fields:
+        fields['dateofbirth'] = re.sub(r'[-/\\.]', '.', fields['dateofbirth'])
+    return fields
+
+
+@lru_cache(maxsize=65536)
+def parse_date(text):
+    """
+    Day number of the first dd.mm.yyyy or yyyy-mm-dd date in text, NaN if none
+    """
+    match = _YMD.search(text)
+    if match:
+        year, month, day = map(int, match.groups())
+    else:
+        match = _DMY.search(text)
+        if not match:
+            return math.nan
+        day, month, year = map(int, match.groups())
+        if year < 100:
+            year += 1900 if year > 30 else 2000
+    try:
+        return float(datetime.date(year, month, day).toordinal())
+    except ValueError:
+        return math.nan
+
+
+@lru_cache(maxsize=65536)
+def parse_number(text):
+    match = _NUMBER.search(text)
+    return float(match.group()) if match else math.nan
+
+
+def _bound(operand, as_date, upper):
+    """
+    Comparable value of a range bound. A bare year bounding a date means
+    its first day, or its last day for an upper bound.
+    """
+    text = str(operand).strip()
+    if as_date:
+        if _YEAR.fullmatch(text):
+            return float(datetime.date(int(text), 12, 31).toordinal() if upper
+                         else datetime.date(int(text), 1, 1).toordinal())
+        return parse_date(text)
+    return parse_number(text)
+
+
+def _values(column, as_date):
+    parse = parse_date if as_date else parse_number
+    return np.fromiter((parse(value) for value in column), dtype=float, count=len(column))
+
+
+def _loose_match(column, criterion):
+    # Original rule: either string contains the other, or any word of one
+    # occurs in the other
+    hits = np.char.find(column, criterion) >= 0
+    for word in criterion.split():
+        hits |= np.char.find(column, word) >= 0
+    hits |= np.fromiter(
+        (value in criterion or any(word in criterion for word in value.split()) for value in column),
+        dtype=bool, count=len(column),
+    )
+    return hits
+
+
+def _mask(column, key, op, operand):
+    """
+    Which values of a column of normalized field values satisfy a criterion
+    """
+    if op == MATCH:
+        return _loose_match(column, str(operand).lower())
+
+    if op in RANGE_OPERATORS:
+        bounds = operand if op == BETWEEN else [operand]
+        as_date = key in DATE_FIELDS or not math.isnan(parse_date(str(bounds[0])))
+        values = _values(column, as_date)
+        # Comparisons with NaN (no value of the right type) are False
+        with np.errstate(invalid='ignore'):
+            if op == LT:
+                return values < _bound(operand, as_date, upper=False)
+            if op == LTE:
+                return values <= _bound(operand, as_date, upper=True)
+            if op == GT:
+                return values > _bound(operand, as_date, upper=True)
+            if op == GTE:
+                return values >= _bound(operand, as_date, upper=False)
+            return ((values >= _bound(bounds[0], as_date, upper=False))
+                    & (values <= _bound(bounds[1], as_date, upper=True)))
+
+    column = np.char.strip(column)
+    if op == CONTAINS:
+        return np.char.find(column, str(operand).lower().strip()) >= 0
+
+    operands = operand if op == IN else [operand]
+    hits = np.isin(column, [str(value).lower().strip() for value in operands])
+    # Dates are equal whatever their format
+    dates = [parse_date(str(value)) for value in operands]
+    dates = [date for date in dates if not math.isnan(date)]
+    if dates:
+        hits |= np.isin(_values(column, as_date=True), dates)
+    return hits
+
+
+def evaluate(records, criteria):
+    """
+    Evaluate criteria over a batch of normalized field records at once.
+    Returns boolean arrays (answered, passed) of shape (criteria, records):
+    whether a record has the criterion's field (possibly null) and whether
+    its value satisfies the criterion.
+    """
+    answered = np.zeros((len(criteria), len(records)), dtype=bool)
+    passed = np.zeros((len(criteria), len(records)), dtype=bool)
+
+    for row, (key, value) in enumerate(criteria.items()):
+        key = key.lower()
+        op, operand = parse_criterion(value)
+        values = [record.get(key) for record in records]
+        present = np.fromiter((key in record for record in records), dtype=bool, count=len(records))
+        known = np.fromiter((v is not None for v in values), dtype=bool, count=len(records))
+        column = np.array([v if v is not None else '' for v in values], dtype=str)
+
+        answered[row] = present
+        passed[row] = known & _mask(column, key, op, operand)
+    return answered, passed
+
+
+def match_records(records, criteria):
+    """
+    Which records satisfy every criterion
+    """
+    answered, passed = evaluate(records, criteria)
+    return (answered & passed).all(axis=0)
@@ -0,0 +1,261 @@
+import os
+import re
+import json
+import queue
+import hashlib
+import tempfile
+import threading
+import logging
+import numpy as np
+from django.conf import settings
+from django.db import connection
+
+from .context import split_sections
+from .hosts import PooledEmbeddings
+from .search import tokens
+
+logger = logging.getLogger(__name__)
+
+# 'ollama' embeds with EMBEDDING_MODEL; 'stub' hashes words locally (offline/tests)
+EMBEDDING_BACKEND = getattr(settings, 'EMBEDDING_BACKEND', 'ollama')
+EMBEDDING_MODEL = getattr(settings, 'EMBEDDING_MODEL', 'nomic-embed-text')
+
+# Characters per embedded chunk; chunks never span two biodata sections
+EMBEDDING_CHUNK_CHARS = getattr(settings, 'EMBEDDING_CHUNK_CHARS', 1000)
+
+# Candidates /api/semantic-search/ returns (and verifies with the LLM) by default
+SEMANTIC_TOP_K = getattr(settings, 'SEMANTIC_TOP_K', 5)
+
+# Embed documents in a background thread as they are extracted or ingested,
+# so searches only embed the query (off: documents are never embedded)
+BACKGROUND_EMBEDDING = getattr(settings, 'BACKGROUND_EMBEDDING', True)
+
+STUB_DIMENSIONS = 256
+
+_embedder = None
+_embedder_lock = threading.Lock()
+# Vectors and chunks by .npy path, so each embedding model has its own entries
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+_queue = queue.Queue()
+_queued = set()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+class StubEmbedder:
+    """
+    Deterministic bag-of-words embeddings via feature hashing, so semantic
+    search works without an embedding model (e.g. in tests)
+    """
+
+    def __init__(self, dimensions=STUB_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in tokens(text):
+            digest = hashlib.md5(token.encode('utf-8')).digest()
+            index = int.from_bytes(digest[:4], 'little') % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def embedding_model_name():
+    return 'stub' if EMBEDDING_BACKEND == 'stub' else EMBEDDING_MODEL
+
+
+def get_embedder():
+    global _embedder
+
+    with _embedder_lock:
+        if _embedder is None:
+            if EMBEDDING_BACKEND == 'stub':
+                _embedder = StubEmbedder()
+            else:
+                from langchain_ollama import OllamaEmbeddings
+
+                # Spread over the Ollama hosts like the LLM calls
+                _embedder = PooledEmbeddings(
+                    EMBEDDING_MODEL,
+                    lambda host: OllamaEmbeddings(model=EMBEDDING_MODEL, base_url=host.url),
+                )
+        return _embedder
+
+
+def embedding_dir():
+    slug = re.sub(r'[^A-Za-z0-9_.-]', '_', embedding_model_name())
+    return os.path.join(settings.MEDIA_ROOT, 'embeddings', slug)
+
+
+def _paths(content_hash):
+    base = os.path.join(embedding_dir(), content_hash)
+    return f"{base}.npy", f"{base}.json"
+
+
+def chunk_text(text):
+    """
+    Split cleaned biodata text into embedding chunks within its sections
+    """
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=EMBEDDING_CHUNK_CHARS,
+        chunk_overlap=EMBEDDING_CHUNK_CHARS // 10,
+        separators=["; ", ". ", ", ", " ", ""],
+    )
+    chunks = []
+    for _, body in split_sections(text):
+        chunks.extend(splitter.split_text(body))
+    return chunks
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _write_atomic(path, write):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as dest:
+            write(dest)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def is_embedded(content_hash):
+    vector_path = _paths(content_hash)[0]
+    with _loaded_lock:
+        if vector_path in _loaded:
+            return True
+    return os.path.exists(vector_path)
+
+
+def embed_document(content_hash, text):
+    """
+    Embed a document's chunks and save them next to the other vectors
+    """
+    chunks = chunk_text(text)
+    if not chunks:
+        return
+
+    vectors = _normalize(get_embedder().embed_documents(chunks))
+    vector_path, chunks_path = _paths(content_hash)
+    os.makedirs(embedding_dir(), exist_ok=True)
+    _write_atomic(chunks_path, lambda dest: dest.write(json.dumps(chunks).encode('utf-8')))
+    _write_atomic(vector_path, lambda dest: np.save(dest, vectors))
+
+    with _loaded_lock:
+        _loaded[vector_path] = (vectors, chunks)
+    logger.info(f"Embedded {len(chunks)} chunks of {content_hash[:12]}")
+
+
+def _run_worker():
+    while True:
+        content_hash, text = _queue.get()
+        try:
+            if not is_embedded(content_hash):
+                embed_document(content_hash, text() if callable(text) else text)
+        except Exception as e:
+            logger.warning(f"Could not embed {content_hash[:12]}: {str(e)[:200]}")
+        finally:
+            with _worker_lock:
+                _queued.discard(content_hash)
+            connection.close()
+
+
+def queue_embedding(content_hash, text):
+    """
+    Embed a document in the background unless it is embedded or queued
+    already. text is the cleaned text or a function returning it.
+    """
+    global _worker
+
+    if not BACKGROUND_EMBEDDING or not text or is_embedded(content_hash):
+        return
+
+    with _worker_lock:
+        if content_hash in _queued:
+            return
+        _queued.add(content_hash)
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run_worker, name='embedding', daemon=True)
+            _worker.start()
+    _queue.put((content_hash, text))
+
+
+def embedding_stats():
+    with _worker_lock:
+        return {"queued": len(_queued)}
+
+
+def _load(content_hash):
+    vector_path, chunks_path = _paths(content_hash)
+    with _loaded_lock:
+        if vector_path in _loaded:
+            return _loaded[vector_path]
+
+    try:
+        vectors = np.load(vector_path)
+        with open(chunks_path, encoding='utf-8') as source:
+            chunks = json.load(source)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not load embeddings of {content_hash[:12]}: {e}")
+        return None
+
+    with _loaded_lock:
+        _loaded[vector_path] = (vectors, chunks)
+    return vectors, chunks
+
+
+def drop_embeddings(content_hash):
+    """
+    Forget a deleted document's vectors, in memory and on disk
+    """
+    with _loaded_lock:
+        _loaded.pop(_paths(content_hash)[0], None)
+    for path in _paths(content_hash):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def rank_documents(query, content_hashes, top_k=10):
+    """
+    Documents most similar to query by cosine similarity of their best
+    chunk; documents not embedded yet are left out. Returns
+    [(content_hash, score, chunk)], best first.
+    """
+    loaded = [(h, _load(h)) for h in content_hashes if is_embedded(h)]
+    loaded = [(h, entry) for h, entry in loaded if entry is not None]
+    if not loaded:
+        return []
+
+    offsets = np.cumsum([0] + [len(vectors) for _, (vectors, _) in loaded])
+    matrix = np.vstack([vectors for _, (vectors, _) in loaded])
+    scores = matrix @ _normalize(get_embedder().embed_query(query))
+
+    # A document scores as its best chunk
+    best = np.maximum.reduceat(scores, offsets[:-1])
+    top_k = min(top_k, len(loaded))
+    top = np.argpartition(-best, top_k - 1)[:top_k]
+    top = top[np.argsort(-best[top])]
+
+    results = []
+    for document in top:
+        content_hash, (_, chunks) = loaded[document]
+        start, stop = offsets[document], offsets[document + 1]
+        chunk = chunks[int(np.argmax(scores[start:stop]))]
+        results.append((content_hash, round(float(best[document]), 4), chunk))
+    return results
@@ -0,0 +1,270 @@
+import os
+import re
+import logging
+import importlib
+
+# PyMuPDF and the LangChain loaders are imported on first use so the server
+# starts without them (see startup.py)
+
+logger = logging.getLogger(__name__)
+
+def import_pymupdf():
+    """
+    Import PyMuPDF ahead of the first PDF, e.g. in a fresh extraction worker
+    """
+    importlib.import_module('fitz')
+
+def open_pdf(file_path, data=None):
+    """
+    Open a PDF with PyMuPDF, straight from the upload buffer when data is given
+    """
+    import fitz  # PyMuPDF
+
+    if data is not None:
+        return fitz.open(stream=data, filetype="pdf")
+    return fitz.open(file_path)
+
+def iter_pages_pymupdf(file_path, start=0, stop=None, data=None):
+    """
+    Lazily yield (page_number, page_text) for pages in [start, stop).
+    One layout pass per page: text blocks are joined to keep the document structure.
+    """
+    doc = open_pdf(file_path, data)
+    try:
+        stop = len(doc) if stop is None else min(stop, len(doc))
+
+        for page_num in range(start, stop):
+            blocks = doc[page_num].get_text("blocks")
+            page_text = "\n".join(
+                block[4].strip() for block in blocks
+                if len(block) >= 5 and block[4].strip()  # Check if block contains text
+            )
+
+            if page_text:
+                yield page_num, page_text
+    finally:
+        doc.close()
+
+def extract_text_pymupdf(file_path, start=0, stop=None, max_chars=None, data=None):
+    """
+    Enhanced PDF text extraction using PyMuPDF (fitz)
+    Better for complex layouts and preserves formatting.
+    Stops reading pages once max_chars characters have been collected.
+    """
+    try:
+        text_content = []
+        collected = 0
+
+        for page_num, page_text in iter_pages_pymupdf(file_path, start, stop, data):
+            text_content.append(f"--- Page {page_num + 1} ---\n{page_text}")
+            collected += len(page_text)
+            if max_chars is not None and collected >= max_chars:
+                break
+
+        return "\n\n".join(text_content)
+        
+    except Exception as e:
+        logger.error(f"PyMuPDF extraction failed: {e}")
+        return None
+
+def count_pages(file_path, data=None):
+    """
+    Page count without extracting anything; 0 if the file cannot be opened
+    """
+    try:
+        with open_pdf(file_path, data) as doc:
+            return len(doc)
+    except Exception as e:
+        logger.error(f"Could not open {os.path.basename(file_path)}: {e}")
+        return 0
+
+def extract_text_pypdf(file_path):
+    """
+    Extraction using LangChain's pypdf loader, which decodes some font
+    encodings PyMuPDF cannot
+    """
+    try:
+        from langchain_community.document_loaders import PyPDFLoader
+
+        loader = PyPDFLoader(file_path)
+        documents = loader.load()
+        
+        if documents:
+            return "\n".join([doc.page_content for doc in documents])
+            
+    except Exception as e:
+        logger.error(f"PyPDF extraction failed: {e}")
+        
+    return None
+
+def extract_text_unstructured(file_path):
+    """
+    Extraction using UnstructuredPDFLoader for scanned pages and complex layouts
+    """
+    try:
+        from langchain_community.document_loaders import UnstructuredPDFLoader
+
+        loader = UnstructuredPDFLoader(file_path)
+        documents = loader.load()
+        
+        if documents:
+            return "\n".join([doc.page_content for doc in documents])
+            
+    except Exception as e:
+        logger.error(f"Unstructured extraction failed: {e}")
+        
+    return None
+
+# Extraction strategies chosen by classify_pdf
+PYMUPDF = 'pymupdf'
+PYPDF = 'pypdf'
+UNSTRUCTURED = 'unstructured'
+
+def classify_pdf(file_path, sample_pages=3, data=None):
+    """
+    Pick one extraction strategy from a cheap look at the first pages:
+    text layer size, fonts, image coverage and how much of the text decodes
+    """
+    import fitz  # PyMuPDF
+
+    try:
+        doc = open_pdf(file_path, data)
+    except Exception as e:
+        logger.warning(f"PyMuPDF cannot open {os.path.basename(file_path)}: {e}")
+        return PYPDF
+
+    try:
+        pages = min(len(doc), sample_pages)
+        if pages == 0:
+            return PYPDF
+
+        chars = 0
+        garbled = 0
+        fonts = 0
+        image_coverage = 0.0
+
+        for page_num in range(pages):
+            page = doc[page_num]
+            text = page.get_text("text")
+            stripped = [c for c in text if not c.isspace()]
+            chars += len(stripped)
+            # Undecodable glyphs come out as U+FFFD or control characters
+            garbled += sum(1 for c in stripped if c == '\ufffd' or (ord(c) < 32))
+            fonts += len(page.get_fonts())
+
+            page_area = abs(page.rect) or 1
+            image_area = sum(abs(fitz.Rect(image["bbox"]) & page.rect) for image in page.get_image_info())
+            image_coverage += min(image_area / page_area, 1.0)
+
+        chars_per_page = chars / pages
+        image_coverage /= pages
+
+    except Exception as e:
+        logger.warning(f"Could not classify {os.path.basename(file_path)}: {e}")
+        return PYMUPDF
+
+    finally:
+        doc.close()
+
+    if chars and garbled / chars > 0.3:
+        strategy = PYPDF
+    elif chars_per_page < 20 and (image_coverage > 0.5 or fonts == 0):
+        strategy = UNSTRUCTURED
+    else:
+        strategy = PYMUPDF
+
+    logger.info(
+        f"Classified {os.path.basename(file_path)} as {strategy}: "
+        f"{chars_per_page:.0f} chars/page, {fonts} fonts, {image_coverage:.0%} images"
+    )
+    return strategy
+
+def clean_extracted_text(text):
+    """
+    Enhanced cleaning specifically for BHEL biodata documents
+    Preserves staff numbers and other important numeric data
+    """
+    if not text:
+        return ""
+
+    # Remove page markers but preserve structure
+    text = re.sub(r'--- Page \d+ ---', '\n', text)
+    
+    # Normalize BHEL-specific section headers
+    text = re.sub(r'([A-Z][a-z]+ Particulars:)', r'\n\1\n', text)
+    text = re.sub(r'(Qualification:|Experience [^:]+:)', r'\n\1\n', text)
+    text = re.sub(r'(Experience in BHEL [^:]+:)', r'\n\1\n', text)
+    
+    # Clean up spacing around colons (important for key-value extraction)
+    text = re.sub(r'\s*:\s*', ': ', text)
+    
+    # Normalize date formats for better LLM understanding
+    text = re.sub(r'(\d{2})\.(\d{2})\.(\d{4})', r'\1.\2.\3', text)
+    
+    # Remove excessive whitespace and normalize line breaks
+    text = re.sub(r'\n\s*\n\s*\n', '\n\n', text)
+    text = re.sub(r'[ \t]+', ' ', text)
+    
+    # Remove common PDF artifacts - BUT PRESERVE STAFF NUMBERS
+    text = re.sub(r'Page \d+ of \d+', '', text)
+    # REMOVED: text = re.sub(r'^\s*\d+\s*$', '', text, flags=re.MULTILINE)  # This was removing staff numbers!
+    
+    # More specific page number removal - only remove isolated single/double digits at line start
+    text = re.sub(r'^\s*[1-9]\s*$', '', text, flags=re.MULTILINE)  # Only remove 1-9 (typical page numbers)
+    text = re.sub(r'^\s*[1-2][0-9]\s*$', '', text, flags=re.MULTILINE)  # Only remove 10-29 (common page ranges)
+    
+    # Fix common encoding issues
+    text = text.replace('â€™', "'")
+    text = text.replace('â€œ', '"')
+    text = text.replace('â€\x9d', '"')
+    text = text.replace('â€"', '-')
+    
+    # Normalize BHEL-specific terms for consistent extraction
+    text = re.sub(r'Dy\.\s*Engineer', 'Deputy Engineer', text)
+    text = re.sub(r'Asst\.\s*Engineer', 'Assistant Engineer', text)
+    
+    # Final cleanup
+    text = re.sub(r'\s+', ' ', text)
+    text = text.strip()
+    
+    return text
+
+# Bump whenever extraction or cleaning changes so stale cached text is ignored
+EXTRACTOR_VERSION = 2
+
+def extract_pdf(file_path, max_chars=None, strategy=None, data=None):
+    """
+    Classify the PDF (unless a strategy is given) and extract it with exactly
+    one method. Returns (cleaned text or None, method used).
+    With max_chars, PyMuPDF stops once enough text has been read. PyMuPDF
+    parses from data when given; the LangChain loaders always read file_path.
+    """
+    logger.info(f"Extracting content from: {os.path.basename(file_path)}")
+
+    strategy = strategy or classify_pdf(file_path, data=data)
+
+    if strategy == PYMUPDF:
+        content = extract_text_pymupdf(file_path, max_chars=max_chars, data=data)
+    elif strategy == PYPDF:
+        content = extract_text_pypdf(file_path)
+    else:
+        content = extract_text_unstructured(file_path)
+
+    if content and content.strip():
+        logger.info(f"Successfully extracted using {strategy}")
+        return clean_extracted_text(content), strategy
+
+    # A text PDF with no usable text layer was misclassified; OCR it instead
+    if strategy == PYMUPDF:
+        logger.warning(f"No text layer in {os.path.basename(file_path)}, retrying as {UNSTRUCTURED}")
+        return extract_pdf(file_path, max_chars, UNSTRUCTURED, data)
+
+    logger.error("All extraction methods failed")
+    return None, strategy
+
+def extract_pdf_content(file_path, max_chars=None, data=None):
+    """
+    Cleaned text of a PDF, or None if extraction failed
+    """
+    content, _ = extract_pdf(file_path, max_chars, data=data)
+    return content
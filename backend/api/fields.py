@@ -0,0 +1,65 @@
+import logging
+from collections import defaultdict
+
+from .models import ExtractedField
+from .rules import LLM, RULES
+
+logger = logging.getLogger(__name__)
+
+
+def get_fields(content_hash, model_name):
+    """
+    Fields already extracted from a document for a model, {field: value or None}
+    """
+    return get_fields_for([content_hash], model_name).get(content_hash, {})
+
+
+def get_fields_for(content_hashes, model_name):
+    """
+    Stored fields of many documents in one query, {content_hash: {field: value}}
+    """
+    fields = defaultdict(dict)
+    try:
+        rows = ExtractedField.objects.filter(
+            content_hash__in=list(content_hashes),
+            model_name=model_name,
+        ).values_list('content_hash', 'field', 'value')
+        for content_hash, field, value in rows:
+            fields[content_hash][field] = value
+    except Exception as e:
+        logger.warning(f"Extracted field lookup failed: {e}")
+    return dict(fields)
+
+
+def store_fields(content_hash, model_name, result):
+    """
+    Persist the criteria fields a result answered by rules or the LLM,
+    including null for fields the document does not state
+    """
+    if not content_hash or result.get("error"):
+        return
+
+    fields = result.get("fields") or {}
+    rows = [
+        ExtractedField(
+            content_hash=content_hash,
+            model_name=model_name,
+            field=field,
+            value=fields.get(field),
+            source=source,
+        )
+        for field, source in (result.get("field_sources") or {}).items()
+        if source in (RULES, LLM)
+    ]
+    if not rows:
+        return
+
+    try:
+        ExtractedField.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['content_hash', 'model_name', 'field'],
+            update_fields=['value', 'source'],
+        )
+    except Exception as e:
+        logger.warning(f"Could not store extracted fields for {content_hash[:12]}: {e}")
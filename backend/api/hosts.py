@@ -0,0 +1,313 @@
+import time
+import threading
+import logging
+import httpx
+from urllib.parse import urlsplit
+from django.conf import settings
+
+from .metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_BASE_URL = getattr(settings, 'OLLAMA_BASE_URL', 'http://localhost:11434')
+
+# Ollama servers LLM calls are spread over; by default just OLLAMA_BASE_URL
+OLLAMA_HOSTS = getattr(settings, 'OLLAMA_HOSTS', None) or [OLLAMA_BASE_URL]
+
+# Seconds between health probes (GET /api/tags) of every host, and the
+# timeout of one probe
+OLLAMA_HEALTH_INTERVAL_SECONDS = getattr(settings, 'OLLAMA_HEALTH_INTERVAL_SECONDS', 30)
+OLLAMA_HEALTH_TIMEOUT_SECONDS = getattr(settings, 'OLLAMA_HEALTH_TIMEOUT_SECONDS', 5)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _model_names(models):
+    """
+    Names a model list from /api/tags answers to, with and without ':latest'
+    """
+    names = set()
+    for model in models:
+        name = model.get('name') or model.get('model')
+        if name:
+            names.add(name)
+            names.add(name.removesuffix(':latest'))
+    return names
+
+
+class OllamaHost:
+    """
+    One Ollama server and what the pool knows about it
+    """
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.name = urlsplit(self.url).netloc or self.url
+        # Hosts count as healthy and serving every model until probed
+        self.healthy = True
+        self.models = None
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.last_probe = None
+        self.last_error = None
+
+    def serves(self, model_name):
+        return self.models is None or model_name in self.models
+
+    def stats(self):
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "models": sorted(self.models) if self.models is not None else None,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_probe": self.last_probe,
+            "last_error": self.last_error,
+        }
+
+
+class HostPool:
+    """
+    Ollama hosts LLM calls are routed over. Each call goes to the healthy
+    host serving the model with the fewest calls outstanding; a background
+    thread probes every host so failed ones come back once they answer.
+    """
+
+    def __init__(self, urls):
+        self.hosts = [OllamaHost(url) for url in dict.fromkeys(urls)]
+        self._lock = threading.Lock()
+        self._thread = None
+        self._wake = threading.Event()
+        self._stopped = False
+
+    def choose(self, model_name, exclude=()):
+        """
+        Reserve the best host for a call to a model, skipping the urls in
+        exclude. Unhealthy hosts or hosts without the model are only used
+        when nothing else is left, since their last probe may be stale.
+        Every chosen host must be given back with release().
+        """
+        with self._lock:
+            candidates = [host for host in self.hosts if host.url not in exclude]
+            if not candidates:
+                return None
+            host = min(candidates, key=lambda host: (
+                not host.healthy, not host.serves(model_name), host.outstanding, host.requests,
+            ))
+            host.outstanding += 1
+            host.requests += 1
+            return host
+
+    def release(self, host):
+        with self._lock:
+            host.outstanding -= 1
+
+    def record_failure(self, host, model_name, error):
+        """
+        Note a failed call. Returns whether the call is worth retrying on
+        another host: the host was unreachable, failed or lacks the model.
+        """
+        from ollama import ResponseError
+
+        if isinstance(error, ResponseError) and error.status_code == 404:
+            with self._lock:
+                host.failures += 1
+                host.last_error = str(error)[:200]
+                host.models = (host.models or set()) - {model_name}
+            logger.warning(f"{host.name} does not serve {model_name}")
+            return True
+
+        if not (isinstance(error, (ConnectionError, httpx.TransportError))
+                or (isinstance(error, ResponseError) and error.status_code >= 500)):
+            return False
+
+        with self._lock:
+            host.failures += 1
+            host.last_error = str(error)[:200]
+            was_healthy, host.healthy = host.healthy, False
+        if was_healthy:
+            logger.warning(f"Ollama host {host.name} marked unhealthy: {error}")
+        return True
+
+    def probe(self):
+        """
+        Ask every host which models it serves; hosts that answer are healthy
+        """
+        for host in self.hosts:
+            try:
+                response = httpx.get(f"{host.url}/api/tags", timeout=OLLAMA_HEALTH_TIMEOUT_SECONDS)
+                response.raise_for_status()
+                models, error = _model_names(response.json().get('models', [])), None
+            except (httpx.HTTPError, ValueError) as e:
+                models, error = None, str(e)[:200]
+
+            with self._lock:
+                was_healthy = host.healthy
+                host.last_probe = time.time()
+                host.healthy = error is None
+                if error is None:
+                    host.models = models
+                else:
+                    host.last_error = error
+
+            if was_healthy and error is not None:
+                logger.warning(f"Ollama host {host.name} failed its health check: {error}")
+            elif not was_healthy and error is None:
+                logger.info(f"Ollama host {host.name} is healthy again")
+
+    def _run(self):
+        while not self._stopped:
+            try:
+                self.probe()
+            except Exception as e:
+                logger.error(f"Ollama health check failed: {e}")
+            self._wake.wait(OLLAMA_HEALTH_INTERVAL_SECONDS)
+            self._wake.clear()
+
+    def start(self):
+        """
+        Start the pool's health check thread if it is not running yet
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='ollama-health', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def stats(self):
+        with self._lock:
+            return [host.stats() for host in self.hosts]
+
+
+def get_pool():
+    """
+    Process-wide pool of OLLAMA_HOSTS, health-checked in the background
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = HostPool(OLLAMA_HOSTS)
+        pool = _pool
+    pool.start()
+    return pool
+
+
+def configure_hosts(urls):
+    """
+    Route LLM calls over other Ollama hosts from now on (e.g. local fake
+    servers in the benchmark)
+    """
+    global _pool
+
+    with _pool_lock:
+        old, _pool = _pool, HostPool(urls)
+    if old is not None:
+        old.stop()
+
+
+def qualified_name(model_name, host):
+    """
+    Model name with the host appended when there are several hosts, so
+    per-host state such as concurrency limits gets its own key
+    """
+    with _pool_lock:
+        several = _pool is not None and len(_pool.hosts) > 1
+    return f"{model_name}@{host.name}" if several else model_name
+
+
+def host_stats():
+    with _pool_lock:
+        pool = _pool
+    return pool.stats() if pool is not None else []
+
+
+def _host_metrics():
+    stats = host_stats()
+    return [
+        ('biodata_ollama_host_up', 'gauge', 'Whether the last health check or call to an Ollama host succeeded',
+         [({"host": s["url"]}, int(s["healthy"])) for s in stats]),
+        ('biodata_ollama_host_outstanding', 'gauge', 'LLM calls routed to an Ollama host and not finished',
+         [({"host": s["url"]}, s["outstanding"]) for s in stats]),
+        ('biodata_ollama_host_failures_total', 'counter', 'Calls to an Ollama host that failed and were retried elsewhere or raised',
+         [({"host": s["url"]}, s["failures"]) for s in stats]),
+    ]
+
+
+register_collector(_host_metrics)
+
+
+class PooledLLM:
+    """
+    LLM spread over the host pool. Each call goes to the least loaded host
+    and is retried on the next one when its host is down, fails or lacks
+    the model. build(host) makes the client that calls one host.
+    """
+
+    def __init__(self, model_name, build):
+        self.model_name = model_name
+        self.build = build
+        self._llms = {}
+        self._lock = threading.Lock()
+
+    def _llm(self, host):
+        with self._lock:
+            llm = self._llms.get(host.url)
+            if llm is None:
+                llm = self._llms[host.url] = self.build(host)
+            return llm
+
+    def invoke(self, prompt, **kwargs):
+        return self.call('invoke', prompt, **kwargs)
+
+    def call(self, method, *args, **kwargs):
+        """
+        Call a method of the chosen host's client, retrying on other hosts
+        """
+        pool = get_pool()
+        tried = set()
+        while True:
+            host = pool.choose(self.model_name, tried)
+            try:
+                return getattr(self._llm(host), method)(*args, **kwargs)
+            except Exception as e:
+                self._give_up_or_retry(pool, host, tried, e)
+            finally:
+                pool.release(host)
+
+    async def ainvoke(self, prompt, **kwargs):
+        pool = get_pool()
+        tried = set()
+        while True:
+            host = pool.choose(self.model_name, tried)
+            try:
+                return await self._llm(host).ainvoke(prompt, **kwargs)
+            except Exception as e:
+                self._give_up_or_retry(pool, host, tried, e)
+            finally:
+                pool.release(host)
+
+    def _give_up_or_retry(self, pool, host, tried, error):
+        tried.add(host.url)
+        if not pool.record_failure(host, self.model_name, error) or len(tried) >= len(pool.hosts):
+            raise error
+        logger.warning(f"{self.model_name} call to {host.name} failed, retrying on another host: {error}")
+
+
+class PooledEmbeddings(PooledLLM):
+    """
+    Embedding model spread over the host pool like PooledLLM
+    """
+
+    def embed_documents(self, texts):
+        return self.call('embed_documents', texts)
+
+    def embed_query(self, text):
+        return self.call('embed_query', text)
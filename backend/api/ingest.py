@@ -0,0 +1,192 @@
+import os
+import hashlib
+import zipfile
+import logging
+from concurrent.futures import FIRST_COMPLETED, wait
+from django.conf import settings
+from django.utils import timezone
+
+from .cache import store_text
+from .extraction import EXTRACTOR_VERSION
+from .janitor import start_janitor, store_pinned, unpin
+from .models import Document, ExtractedText
+from .pipeline import EXTRACTION_WORKERS, index_document, submit_extraction
+from .storage import pdf_path
+
+logger = logging.getLogger(__name__)
+
+# Server-side directories /api/ingest/ may read from. Any web page can reach
+# the API, so none by default; manage.py ingest_pdfs reads any directory.
+INGEST_DIRECTORY_ROOTS = getattr(settings, 'INGEST_DIRECTORY_ROOTS', None) or []
+
+# Larger PDFs (or archive members claiming to be larger) are not ingested
+INGEST_MAX_FILE_BYTES = getattr(settings, 'INGEST_MAX_FILE_BYTES', 200 * 1024 * 1024)
+
+INGESTED = 'ingested'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+
+class PdfSource:
+    """
+    A PDF to ingest: its name, size and how to read its bytes
+    """
+
+    def __init__(self, name, size, read):
+        self.name = name
+        self.size = size
+        self.read = read
+
+
+def _is_pdf_name(path):
+    name = os.path.basename(path)
+    # Skip the resource forks macOS adds to archives
+    return name.lower().endswith('.pdf') and not name.startswith('._') and '__MACOSX/' not in path
+
+
+def zip_sources(archive):
+    """
+    PDF members of a ZIP archive (a path or a file object), read one at a
+    time when ingested
+    """
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or not _is_pdf_name(info.filename):
+                continue
+            yield PdfSource(os.path.basename(info.filename), info.file_size, lambda info=info: zf.read(info))
+
+
+def _read_file(path):
+    with open(path, 'rb') as source:
+        return source.read()
+
+
+def directory_sources(directory):
+    """
+    PDFs under a directory, recursively and in name order
+    """
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if _is_pdf_name(path) and os.path.isfile(path):
+                yield PdfSource(name, os.path.getsize(path), lambda path=path: _read_file(path))
+
+
+def path_sources(path):
+    """
+    Sources for a server-side ZIP archive or directory
+    """
+    if os.path.isdir(path):
+        return directory_sources(path)
+    if zipfile.is_zipfile(path):
+        return zip_sources(path)
+    raise ValueError(f"{path} is neither a directory nor a ZIP archive")
+
+
+def directory_allowed(directory):
+    """
+    Whether /api/ingest/ may read a directory: it must lie under one of
+    INGEST_DIRECTORY_ROOTS
+    """
+    directory = os.path.realpath(directory)
+    return any(
+        os.path.commonpath([directory, os.path.realpath(root)]) == os.path.realpath(root)
+        for root in INGEST_DIRECTORY_ROOTS
+    )
+
+
+def is_ingested(content_hash):
+    """
+    Whether a PDF is stored with its text extracted by the current extractor
+    """
+    return (
+        os.path.exists(pdf_path(content_hash))
+        and ExtractedText.objects.filter(content_hash=content_hash, extractor_version=str(EXTRACTOR_VERSION)).exists()
+    )
+
+
+def _result(filename, content_hash, status, method=None, error=None):
+    return {
+        "filename": filename,
+        "content_hash": content_hash,
+        "status": status,
+        "extraction_method": method,
+        "error": error,
+    }
+
+
+def ingest(sources):
+    """
+    Store, extract and index PDFs so /api/query/ and the searches can use
+    them. Ingested PDFs are persistent: the janitor's TTL and byte quota do
+    not apply to them. Sources are read one at a time and only while fewer
+    than two PDFs per extraction worker are in flight, so memory stays
+    bounded however many there are. PDFs already ingested, or seen earlier
+    in the same run, are skipped. Yields a result dict per PDF as it
+    finishes.
+    """
+    start_janitor()
+
+    max_in_flight = max(EXTRACTION_WORKERS, 1) * 2
+    pending = {}
+    seen = set()
+    sources = iter(sources)
+    exhausted = False
+
+    try:
+        while True:
+            while not exhausted and len(pending) < max_in_flight:
+                source = next(sources, None)
+                if source is None:
+                    exhausted = True
+                    break
+
+                if source.size > INGEST_MAX_FILE_BYTES:
+                    yield _result(source.name, None, FAILED, error=f"Larger than {INGEST_MAX_FILE_BYTES} bytes")
+                    continue
+
+                try:
+                    data = source.read()
+                    content_hash = hashlib.sha256(data).hexdigest()
+                    if content_hash in seen or is_ingested(content_hash):
+                        # A PDF first stored by an upload joins the document store
+                        Document.objects.filter(content_hash=content_hash).update(
+                            last_accessed=timezone.now(), persistent=True,
+                        )
+                        yield _result(source.name, content_hash, SKIPPED)
+                        continue
+
+                    file_path, content_hash = store_pinned(data, source.name, persistent=True)
+                    seen.add(content_hash)
+                except Exception as e:
+                    logger.error(f"Error storing {source.name}: {str(e)[:200]}")
+                    yield _result(source.name, None, FAILED, error=str(e)[:200])
+                    continue
+
+                pending[submit_extraction(file_path, None, data)] = (source.name, content_hash)
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                filename, content_hash = pending.pop(future)
+                unpin([content_hash])
+                try:
+                    content_str, method = future.result()
+                    if not content_str:
+                        raise ValueError("Failed to extract content")
+                    store_text(content_hash, EXTRACTOR_VERSION, content_str, method)
+                    index_document(content_hash, content_str)
+                except Exception as e:
+                    logger.error(f"Error extracting {filename}: {str(e)[:200]}")
+                    yield _result(filename, content_hash, FAILED, error=str(e)[:200])
+                    continue
+                yield _result(filename, content_hash, INGESTED, method)
+
+    finally:
+        # The consumer may stop early (e.g. a client disconnecting)
+        for future, (_, content_hash) in pending.items():
+            future.cancel()
+            unpin([content_hash])
@@ -0,0 +1,264 @@
+import os
+import time
+import hashlib
+import threading
+import logging
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+
+from .embeddings import drop_embeddings
+from .models import Document, Job, JobFile
+from .search import unindex
+from .storage import pdf_dir, pdf_path, store_pdf
+
+logger = logging.getLogger(__name__)
+
+# Stored PDFs not accessed for this long are deleted (persistent, i.e. bulk
+# ingested, documents are kept and do not count towards the quota)
+STORAGE_TTL_SECONDS = getattr(settings, 'STORAGE_TTL_SECONDS', 60 * 60)
+
+# Above this many bytes the least recently used PDFs are deleted first
+STORAGE_MAX_BYTES = getattr(settings, 'STORAGE_MAX_BYTES', 1024 * 1024 * 1024)
+
+JANITOR_INTERVAL_SECONDS = getattr(settings, 'JANITOR_INTERVAL_SECONDS', 60)
+
+_lock = threading.Lock()
+_pins = Counter()
+_thread = None
+_suspended = False
+_wake = threading.Event()
+_stats = {
+    "sweeps": 0,
+    "expired": 0,
+    "evicted": 0,
+    "orphans": 0,
+    "last_sweep": None,
+    "last_sweep_seconds": None,
+}
+
+
+def pin(content_hashes):
+    """
+    Protect PDFs used by an in-flight batch from deletion
+    """
+    with _lock:
+        _pins.update(content_hashes)
+
+
+def unpin(content_hashes):
+    with _lock:
+        _pins.subtract(content_hashes)
+        for content_hash in [h for h, count in _pins.items() if count <= 0]:
+            del _pins[content_hash]
+
+
+def store_pinned(data, filename, persistent=False):
+    """
+    store_pdf with the PDF pinned before it looks for an existing copy, so
+    a sweep cannot delete that copy in between. The caller unpins it.
+    Returns (file_path, content_hash).
+    """
+    content_hash = hashlib.sha256(data).hexdigest()
+    pin([content_hash])
+    try:
+        return store_pdf(data, filename, persistent)
+    except Exception:
+        unpin([content_hash])
+        raise
+
+
+def pinned_hashes():
+    """
+    Hashes pinned by running batches plus those referenced by unfinished jobs
+    """
+    with _lock:
+        pinned = set(_pins)
+
+    pinned.update(
+        JobFile.objects.exclude(job__status=Job.COMPLETED).values_list('content_hash', flat=True)
+    )
+    return pinned
+
+
+def _total_bytes(documents=None):
+    documents = Document.objects.all() if documents is None else documents
+    return documents.aggregate(total=Sum('size'))['total'] or 0
+
+
+def _delete(documents):
+    """
+    Delete documents and their files. Documents pinned or touched since they
+    were selected are kept; pins wait for the deletion, so a PDF pinned
+    before store_pdf looks for it is either kept or written again.
+    """
+    deleted = 0
+    for document in documents:
+        try:
+            with _lock:
+                if _pins[document.content_hash] > 0:
+                    continue
+                rows = Document.objects.filter(
+                    pk=document.pk, persistent=False, last_accessed__lte=document.last_accessed,
+                )
+                if not rows.delete()[0]:
+                    continue
+                file_path = pdf_path(document.content_hash)
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+
+            unindex([document.pk])
+            drop_embeddings(document.content_hash)
+            deleted += 1
+        except Exception as e:
+            logger.warning(f"Could not delete {document}: {e}")
+    return deleted
+
+
+def _remove_orphan(name, file_path):
+    """
+    Remove a file of the PDF dir unless it was pinned, stored as a Document
+    or taken by a job since the sweep listed the known hashes
+    """
+    content_hash = name[:-len('.pdf')] if name.endswith('.pdf') else None
+    with _lock:
+        if content_hash is not None and (
+            _pins[content_hash] > 0
+            or Document.objects.filter(content_hash=content_hash).exists()
+            or JobFile.objects.filter(content_hash=content_hash).exclude(job__status=Job.COMPLETED).exists()
+        ):
+            return 0
+        os.remove(file_path)
+    return 1
+
+
+def sweep():
+    """
+    One janitor pass: expire uploaded PDFs past the TTL, evict least recently
+    used ones while over the byte quota and remove untracked files in the
+    PDF dir. Persistent documents are left alone.
+    """
+    started = time.perf_counter()
+    pinned = pinned_hashes()
+    cutoff = timezone.now() - timedelta(seconds=STORAGE_TTL_SECONDS)
+    uploads = Document.objects.filter(persistent=False)
+
+    expired = _delete(list(uploads.filter(last_accessed__lt=cutoff).exclude(content_hash__in=pinned)))
+
+    evicted = 0
+    total = _total_bytes(uploads)
+    if total > STORAGE_MAX_BYTES:
+        victims = []
+        for document in uploads.exclude(content_hash__in=pinned).order_by('last_accessed'):
+            if total <= STORAGE_MAX_BYTES:
+                break
+            victims.append(document)
+            total -= document.size
+        evicted = _delete(victims)
+
+    # Files without a Document row: pre-content-addressing uploads and
+    # temp files left by interrupted writes
+    orphans = 0
+    directory = pdf_dir()
+    if os.path.isdir(directory):
+        known = {f"{h}.pdf" for h in Document.objects.values_list('content_hash', flat=True)}
+        known.update(f"{h}.pdf" for h in pinned)
+        oldest = time.time() - STORAGE_TTL_SECONDS
+        for name in os.listdir(directory):
+            file_path = os.path.join(directory, name)
+            try:
+                if name not in known and os.path.getmtime(file_path) < oldest:
+                    orphans += _remove_orphan(name, file_path)
+            except OSError as e:
+                logger.warning(f"Could not remove {name}: {e}")
+
+    with _lock:
+        _stats["sweeps"] += 1
+        _stats["expired"] += expired
+        _stats["evicted"] += evicted
+        _stats["orphans"] += orphans
+        _stats["last_sweep"] = timezone.now()
+        _stats["last_sweep_seconds"] = round(time.perf_counter() - started, 4)
+
+    if expired or evicted or orphans:
+        logger.info(f"Janitor removed {expired} expired, {evicted} evicted and {orphans} orphaned PDFs")
+
+
+def _run():
+    while True:
+        _wake.wait(JANITOR_INTERVAL_SECONDS)
+        _wake.clear()
+        if _suspended:
+            return
+        try:
+            sweep()
+        except Exception as e:
+            logger.error(f"Janitor sweep failed: {e}")
+        finally:
+            connection.close()
+
+
+def start_janitor():
+    """
+    Start the single background janitor thread if it is not running yet
+    """
+    global _thread
+
+    with _lock:
+        if _suspended or (_thread is not None and _thread.is_alive()):
+            return
+        _thread = threading.Thread(target=_run, name='storage-janitor', daemon=True)
+        _thread.start()
+
+
+def suspend_janitor():
+    """
+    Stop the janitor thread, waiting for a running sweep, and keep it from
+    starting again until resume_janitor() (e.g. while the benchmark swaps
+    databases)
+    """
+    global _suspended
+
+    with _lock:
+        _suspended = True
+        thread = _thread
+    if thread is not None:
+        _wake.set()
+        thread.join()
+
+
+def resume_janitor():
+    global _suspended
+
+    with _lock:
+        _suspended = False
+
+
+def wake_janitor():
+    """
+    Run a sweep now instead of waiting for the next interval
+    """
+    _wake.set()
+
+
+def janitor_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["pinned"] = len(_pins)
+        stats["running"] = _thread is not None and _thread.is_alive()
+
+    try:
+        stats["files"] = Document.objects.count()
+        stats["bytes"] = _total_bytes()
+        stats["persistent_files"] = Document.objects.filter(persistent=True).count()
+    except Exception:
+        stats["files"] = None
+        stats["bytes"] = None
+        stats["persistent_files"] = None
+
+    stats["max_bytes"] = STORAGE_MAX_BYTES
+    stats["ttl_seconds"] = STORAGE_TTL_SECONDS
+    return stats
@@ -0,0 +1,196 @@
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import Job, JobFile
+from .pipeline import analyze_pdf
+from .janitor import start_janitor, store_pinned, unpin
+from .storage import read_upload
+
+logger = logging.getLogger(__name__)
+
+# Number of background workers shared by all jobs
+JOB_WORKERS = getattr(settings, 'JOB_WORKERS', 2)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_job_executor():
+    """
+    Return the shared job worker pool, creating it on first use.
+    Creating the pool also resumes jobs interrupted by a server restart.
+    """
+    global _executor
+
+    with _executor_lock:
+        if _executor is not None:
+            return _executor
+        _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job-worker')
+
+    resume_pending_jobs()
+    return _executor
+
+
+def create_job(files, criteria, extra_prompt, model_name):
+    """
+    Save the uploaded files, persist a pending job for them and queue it
+    """
+    # Start the pool first so resuming old jobs cannot queue this one twice
+    get_job_executor()
+    start_janitor()
+
+    job = Job.objects.create(
+        criteria=criteria,
+        extra_prompt=extra_prompt,
+        model_name=model_name,
+    )
+
+    stored_hashes = []
+    try:
+        for file in files:
+            file_path, content_hash = store_pinned(read_upload(file), file.name)
+            stored_hashes.append(content_hash)
+            JobFile.objects.create(
+                job=job,
+                filename=file.name,
+                file_path=file_path,
+                content_hash=content_hash,
+            )
+    finally:
+        # From here on the unfinished job keeps its files
+        unpin(stored_hashes)
+
+    submit_job(job)
+    return job
+
+
+def submit_job(job):
+    """
+    Queue every pending file of a job on the worker pool
+    """
+    executor = get_job_executor()
+    for job_file_id in job.files.filter(status=JobFile.PENDING).values_list('id', flat=True):
+        executor.submit(_run_job_file, job_file_id)
+
+
+def resume_pending_jobs():
+    """
+    Requeue files of unfinished jobs. Files left running belonged to a worker
+    that died with the previous server process and are started again.
+    """
+    try:
+        unfinished = Job.objects.exclude(status=Job.COMPLETED)
+        JobFile.objects.filter(job__in=unfinished, status=JobFile.RUNNING).update(
+            status=JobFile.PENDING,
+            started_at=None,
+        )
+        for job in unfinished:
+            logger.info(f"Resuming job {job.id}")
+            submit_job(job)
+            _complete_if_finished(job)
+    except Exception as e:
+        logger.error(f"Failed to resume pending jobs: {e}")
+
+
+def _run_job_file(job_file_id):
+    try:
+        # Claim the file atomically so a file queued twice only runs once
+        now = timezone.now()
+        claimed = JobFile.objects.filter(id=job_file_id, status=JobFile.PENDING).update(
+            status=JobFile.RUNNING,
+            started_at=now,
+        )
+        if not claimed:
+            return
+
+        job_file = JobFile.objects.select_related('job').get(id=job_file_id)
+        job = job_file.job
+        Job.objects.filter(id=job.id, status=Job.PENDING).update(status=Job.RUNNING, started_at=now)
+
+        result = analyze_pdf(
+            job_file.file_path,
+            job_file.filename,
+            job_file.content_hash,
+            job.criteria,
+            job.extra_prompt,
+            job.model_name,
+        )
+
+        if result["error"]:
+            job_file.status = JobFile.FAILED
+            job_file.error = result["error"]
+        elif result["matched"]:
+            job_file.status = JobFile.MATCHED
+        else:
+            job_file.status = JobFile.NOT_MATCHED
+        job_file.fields = result["fields"]
+        job_file.finished_at = timezone.now()
+        job_file.save(update_fields=['status', 'error', 'fields', 'finished_at'])
+
+        _complete_if_finished(job)
+
+    except Exception as e:
+        logger.error(f"Error running job file {job_file_id}: {e}")
+
+    finally:
+        # Worker threads outlive the task, so release their DB connection
+        connection.close()
+
+
+def _complete_if_finished(job):
+    if job.files.exclude(status__in=JobFile.FINISHED_STATUSES).exists():
+        return
+
+    completed = Job.objects.filter(id=job.id).exclude(status=Job.COMPLETED).update(
+        status=Job.COMPLETED,
+        finished_at=timezone.now(),
+    )
+    if not completed:
+        return
+
+    logger.info(f"Job {job.id} completed")
+
+
+def job_progress(job):
+    """
+    Per-file status, partial matches and an ETA for a job
+    """
+    files = list(job.files.all())
+    finished = [f for f in files if f.status in JobFile.FINISHED_STATUSES]
+    remaining = len(files) - len(finished)
+
+    durations = [f.duration for f in finished if f.duration is not None]
+    eta_seconds = None
+    if remaining == 0:
+        eta_seconds = 0
+    elif durations:
+        average = sum(durations) / len(durations)
+        eta_seconds = round(average * remaining / min(JOB_WORKERS, remaining), 1)
+
+    return {
+        "job_id": str(job.id),
+        "status": job.status,
+        "model_name": job.model_name,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "total_files": len(files),
+        "processed_files": len(finished),
+        "matching_files": sum(1 for f in files if f.status == JobFile.MATCHED),
+        "failed_files": sum(1 for f in files if f.status == JobFile.FAILED),
+        "eta_seconds": eta_seconds,
+        "files": [
+            {
+                "filename": f.filename,
+                "content_hash": f.content_hash,
+                "status": f.status,
+                "fields": f.fields,
+                "error": f.error or None,
+                "duration": f.duration,
+            } for f in files
+        ],
+    }
@@ -0,0 +1,229 @@
+import time
+import asyncio
+import threading
+import logging
+from django.conf import settings
+
+from .metrics import LLM_FAILURES, LLM_SECONDS, STAGE_SECONDS, register_collector
+
+logger = logging.getLogger(__name__)
+
+# Concurrent LLM calls per model across all requests; the limit starts at
+# the initial value and adapts between 1 and the maximum
+LLM_INITIAL_CONCURRENCY = getattr(settings, 'LLM_INITIAL_CONCURRENCY', 2)
+LLM_MAX_CONCURRENCY = getattr(settings, 'LLM_MAX_CONCURRENCY', 8)
+
+# A call slower than this multiple of the usual latency signals overload
+LLM_LATENCY_TOLERANCE = getattr(settings, 'LLM_LATENCY_TOLERANCE', 2.0)
+
+# Factor applied to the limit on overload or errors
+LLM_BACKOFF = getattr(settings, 'LLM_BACKOFF', 0.5)
+
+# Weight of each new sample in the usual-latency average
+_LATENCY_ALPHA = 0.1
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for one model. Each normal call raises the limit
+    by 1/limit, so it grows by about one per round of calls; an error or a
+    call much slower than usual multiplies it by LLM_BACKOFF. Latency is
+    compared per 1000 characters of prompt and response so long documents
+    are not mistaken for overload.
+    """
+
+    def __init__(self, name, initial=LLM_INITIAL_CONCURRENCY, maximum=LLM_MAX_CONCURRENCY):
+        self.name = name
+        self.maximum = max(maximum, 1)
+        self.limit = float(min(max(initial, 1), self.maximum))
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.calls = 0
+        self.errors = 0
+        self.slow_calls = 0
+        self.decreases = 0
+        self.wait_seconds = 0.0
+        self.usual_latency = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        # (loop, future) of coroutines waiting in aacquire()
+        self._async_waiters = []
+
+    def acquire(self):
+        """
+        Block until a slot is free under the current limit
+        """
+        start = time.perf_counter()
+        with self._cond:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.waiting -= 1
+            self.in_flight += 1
+            waited = time.perf_counter() - start
+            self.wait_seconds += waited
+        STAGE_SECONDS.observe(waited, stage='llm_queue')
+
+    async def aacquire(self):
+        """
+        Wait for a free slot without blocking a thread
+        """
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        with self._cond:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            while True:
+                with self._cond:
+                    if self.in_flight < int(self.limit):
+                        self.in_flight += 1
+                        waited = time.perf_counter() - start
+                        self.wait_seconds += waited
+                        break
+                    waiter = loop.create_future()
+                    self._async_waiters.append((loop, waiter))
+                await waiter
+        finally:
+            with self._cond:
+                self.waiting -= 1
+        STAGE_SECONDS.observe(waited, stage='llm_queue')
+
+    def release(self, seconds, chars, failed=False):
+        """
+        Free a slot and adapt the limit from how the call went
+        """
+        with self._cond:
+            self.in_flight -= 1
+            self.calls += 1
+
+            if failed:
+                self.errors += 1
+                self._decrease(seconds)
+            else:
+                latency = seconds * 1000 / max(chars, 1)
+                if self.usual_latency is None:
+                    self.usual_latency = latency
+                elif latency > self.usual_latency * LLM_LATENCY_TOLERANCE:
+                    self.slow_calls += 1
+                    self._decrease(seconds)
+                else:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                self.usual_latency += _LATENCY_ALPHA * (latency - self.usual_latency)
+
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+
+        # Waiters re-check the limit, so waking all of them is safe
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+    def _decrease(self, seconds):
+        # Calls finishing together usually saw the same overload, so back
+        # off at most once per call duration
+        now = time.monotonic()
+        if now - self._last_decrease < seconds:
+            return
+        self._last_decrease = now
+
+        limit = max(1.0, self.limit * LLM_BACKOFF)
+        if int(limit) < int(self.limit):
+            logger.info(f"Reducing {self.name} concurrency to {int(limit)}")
+        self.limit = limit
+        self.decreases += 1
+
+    def stats(self):
+        with self._cond:
+            return {
+                "limit": int(self.limit),
+                "max_limit": self.maximum,
+                "in_flight": self.in_flight,
+                "queue_depth": self.waiting,
+                "max_queue_depth": self.max_waiting,
+                "calls": self.calls,
+                "errors": self.errors,
+                "slow_calls": self.slow_calls,
+                "decreases": self.decreases,
+                "avg_wait_seconds": round(self.wait_seconds / self.calls, 4) if self.calls else 0.0,
+                "usual_seconds_per_1k_chars": round(self.usual_latency, 4) if self.usual_latency else None,
+            }
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def get_limiter(model_name):
+    """
+    Process-wide limiter for a model, shared by every request
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(model_name)
+        if limiter is None:
+            limiter = _limiters[model_name] = AdaptiveLimiter(model_name)
+        return limiter
+
+
+def limiter_stats():
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {name: limiter.stats() for name, limiter in limiters.items()}
+
+
+def _limiter_metrics():
+    stats = limiter_stats()
+    return [
+        (f"biodata_llm_{key}", 'gauge', documentation, [({"model": model}, s[key]) for model, s in stats.items()])
+        for key, documentation in (
+            ("limit", "Current adaptive concurrency limit per model"),
+            ("in_flight", "LLM calls running per model"),
+            ("queue_depth", "LLM calls waiting for a concurrency slot per model"),
+        )
+    ]
+
+
+register_collector(_limiter_metrics)
+
+
+class LimitedLLM:
+    """
+    Wrapper around an LLM that runs invoke() / ainvoke() under the model's
+    adaptive limit
+    """
+
+    def __init__(self, llm, limiter):
+        self.llm = llm
+        self.limiter = limiter
+
+    def invoke(self, prompt, **kwargs):
+        self.limiter.acquire()
+        start = time.perf_counter()
+        response = None
+        try:
+            response = self.llm.invoke(prompt, **kwargs)
+            return response
+        finally:
+            self._done(prompt, response, time.perf_counter() - start)
+
+    async def ainvoke(self, prompt, **kwargs):
+        await self.limiter.aacquire()
+        start = time.perf_counter()
+        response = None
+        try:
+            response = await self.llm.ainvoke(prompt, **kwargs)
+            return response
+        finally:
+            self._done(prompt, response, time.perf_counter() - start)
+
+    def _done(self, prompt, response, seconds):
+        self.limiter.release(seconds, len(prompt) + len(response or ''), failed=response is None)
+        if response is None:
+            LLM_FAILURES.inc(model=self.limiter.name)
+        else:
+            LLM_SECONDS.observe(seconds, model=self.limiter.name)
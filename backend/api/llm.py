@@ -0,0 +1,179 @@
+import time
+import asyncio
+import weakref
+import functools
+import threading
+import logging
+import httpx
+from django.conf import settings
+
+from .cache import CachedLLM
+from .hosts import PooledLLM, get_pool, host_stats, qualified_name
+from .limiter import LimitedLLM, get_limiter
+from .metrics import LLM_TOKENS, METRICS_ENABLED
+
+logger = logging.getLogger(__name__)
+
+# How long Ollama keeps a model loaded after the last request (e.g. '30m', -1 = forever)
+OLLAMA_KEEP_ALIVE = getattr(settings, 'OLLAMA_KEEP_ALIVE', '30m')
+
+# Pooled HTTP connections shared by all requests to a model on one host
+OLLAMA_MAX_CONNECTIONS = getattr(settings, 'OLLAMA_MAX_CONNECTIONS', 8)
+
+# Models loaded into Ollama when the server starts
+OLLAMA_WARMUP_MODELS = getattr(settings, 'OLLAMA_WARMUP_MODELS', ['phi4'])
+
+# Generation parameters; they are part of the LLM cache key, which does not
+# depend on the host that answered
+LLM_PARAMS = {
+    "temperature": 0.1,
+    "num_predict": 2048,  # Limit response length for efficiency
+    "top_k": 10,          # Reduce randomness
+    "top_p": 0.9,
+}
+
+# Options sent to Ollama when a call overrides some of them
+_OPTION_NAMES = ("temperature", "num_predict", "top_k", "top_p")
+
+_llms = {}
+_llms_lock = threading.Lock()
+# Async clients are bound to the event loop they were created on
+_async_llms = weakref.WeakKeyDictionary()
+_warmed = {}
+
+
+@functools.cache
+def _token_usage_class():
+    # LangChain is imported with the first model client, not at start-up
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class TokenUsage(BaseCallbackHandler):
+        """
+        Count the prompt and completion tokens Ollama reports for each call
+        """
+
+        def __init__(self, model_name):
+            self.model_name = model_name
+
+        def on_llm_end(self, response, **kwargs):
+            for generations in response.generations:
+                for generation in generations:
+                    info = generation.generation_info or {}
+                    LLM_TOKENS.inc(info.get('prompt_eval_count') or 0, model=self.model_name, kind='prompt')
+                    LLM_TOKENS.inc(info.get('eval_count') or 0, model=self.model_name, kind='completion')
+
+    return TokenUsage
+
+
+def _client_kwargs():
+    return {
+        "limits": httpx.Limits(
+            max_connections=OLLAMA_MAX_CONNECTIONS,
+            max_keepalive_connections=OLLAMA_MAX_CONNECTIONS,
+        ),
+    }
+
+
+def get_llm(model_name):
+    """
+    Shared, cached LLM for a model. Calls that miss the cache are routed to
+    the least loaded Ollama host (see hosts.py). One client per model and
+    host is reused by every request so HTTP connections stay open between
+    documents, and each runs under its own adaptive concurrency limit.
+    """
+    with _llms_lock:
+        llm = _llms.get(model_name)
+        if llm is None:
+            llm = _llms[model_name] = _build_llm(model_name)
+        return llm
+
+
+def get_async_llm(model_name):
+    """
+    Like get_llm, for ainvoke() on the running event loop. Its HTTP client
+    is async (httpx.AsyncClient) and it shares the model's concurrency limit
+    and response cache with the sync one.
+    """
+    loop = asyncio.get_running_loop()
+    with _llms_lock:
+        llms = _async_llms.setdefault(loop, {})
+        llm = llms.get(model_name)
+        if llm is None:
+            llm = llms[model_name] = _build_llm(model_name)
+        return llm
+
+
+def _build_llm(model_name):
+    from langchain.globals import set_verbose
+    from langchain_ollama import OllamaLLM
+
+    set_verbose(False)
+
+    def build(host):
+        return LimitedLLM(
+            OllamaLLM(
+                model=model_name,
+                base_url=host.url,
+                keep_alive=OLLAMA_KEEP_ALIVE,
+                client_kwargs=_client_kwargs(),
+                callbacks=[_token_usage_class()(model_name)] if METRICS_ENABLED else None,
+                **LLM_PARAMS,
+            ),
+            get_limiter(qualified_name(model_name, host)),
+        )
+
+    return CachedLLM(PooledLLM(model_name, build), model_name, LLM_PARAMS)
+
+
+def generation_options(**overrides):
+    """
+    Ollama options for a call that changes some generation parameters,
+    e.g. invoke(prompt, options=generation_options(num_predict=256))
+    """
+    options = {name: LLM_PARAMS[name] for name in _OPTION_NAMES}
+    options.update(overrides)
+    return options
+
+
+def warm_up(model_names=None):
+    """
+    Load models into every Ollama host ahead of the first batch. An empty
+    prompt makes Ollama load the model and return without generating anything.
+    """
+    from ollama import Client
+
+    model_names = OLLAMA_WARMUP_MODELS if model_names is None else model_names
+
+    for host in get_pool().hosts:
+        client = Client(host=host.url)
+        for model_name in model_names:
+            name = qualified_name(model_name, host)
+            try:
+                start = time.perf_counter()
+                client.generate(model=model_name, prompt='', keep_alive=OLLAMA_KEEP_ALIVE)
+                elapsed = round(time.perf_counter() - start, 2)
+                _warmed[name] = elapsed
+                logger.info(f"Warmed up {name} in {elapsed}s")
+            except Exception as e:
+                logger.warning(f"Could not warm up {name}: {e}")
+
+
+def start_warm_up(model_names=None):
+    """
+    Warm models up in the background so server start-up is not delayed
+    """
+    if model_names is None and not OLLAMA_WARMUP_MODELS:
+        return
+    threading.Thread(target=warm_up, args=(model_names,), name='ollama-warm-up', daemon=True).start()
+
+
+def llm_stats():
+    with _llms_lock:
+        clients = sorted(_llms)
+
+    return {
+        "hosts": host_stats(),
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "clients": clients,
+        "warmed_up": dict(_warmed),
+    }
@@ -0,0 +1,132 @@
+import os
+import time
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand
+
+import fitz  # PyMuPDF
+
+from api.extraction import extract_text_pymupdf
+from api.pipeline import PAGES_PER_TASK
+
+
+def build_synthetic_pdf(file_path, pages):
+    """
+    Write a multi-page PDF laid out like a BHEL biodata, several text blocks per page
+    """
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        y = 60
+        sections = [
+            "Personal Particulars:",
+            f"Name : Employee {page_num}    Staff No : {1000000 + page_num}",
+            "Date of Birth : 12.05.1970    Category : GEN    PWD Status : NA",
+            "Qualification:",
+            "B.E. Mechanical Engineering, 1992, with First Class",
+            "Experience in BHEL (Present Unit):",
+        ] + [
+            f"{year}-{year + 2}: Dy. Engineer, Turbine Engineering, commissioning at site {year}"
+            for year in range(1992, 2020, 2)
+        ]
+        for line in sections:
+            page.insert_text((50, y), line, fontsize=10)
+            y += 16
+        page.insert_text((280, 820), f"Page {page_num + 1} of {pages}", fontsize=8)
+    doc.save(file_path)
+    doc.close()
+
+
+def extract_two_pass(file_path):
+    """
+    The previous extractor: plain text and text blocks for every page
+    """
+    doc = fitz.open(file_path)
+    text_content = []
+    for page_num in range(len(doc)):
+        page = doc[page_num]
+        text = page.get_text("text")
+        blocks = page.get_text("blocks")
+        structured_text = [block[4].strip() for block in blocks if len(block) >= 5 and block[4].strip()]
+        page_text = "\n".join(structured_text) if structured_text else text
+        if page_text.strip():
+            text_content.append(f"--- Page {page_num + 1} ---\n{page_text}")
+    doc.close()
+    return "\n\n".join(text_content)
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks PDF text extraction throughput in pages/sec'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pdf', help='PDF to benchmark (default: a synthetic biodata)')
+        parser.add_argument('--pages', type=int, default=64, help='Pages in the synthetic PDF')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per method, best is reported')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes for the page-parallel run')
+        parser.add_argument('--budget', type=int, default=6000,
+                            help='Character budget for the early-stop run')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = options['pdf']
+            if not file_path:
+                file_path = os.path.join(tmp_dir, 'synthetic.pdf')
+                build_synthetic_pdf(file_path, options['pages'])
+
+            with fitz.open(file_path) as doc:
+                pages = len(doc)
+            self.stdout.write(f"{os.path.basename(file_path)}: {pages} pages, best of {options['repeat']}")
+
+            def timed(fn):
+                best = None
+                result = None
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    result = fn()
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                return best, result
+
+            baseline, reference = timed(lambda: extract_two_pass(file_path))
+            self.report("two-pass (previous)", pages, baseline, baseline)
+
+            elapsed, text = timed(lambda: extract_text_pymupdf(file_path))
+            self.report("single-pass", pages, elapsed, baseline)
+            if text != reference:
+                self.stdout.write(self.style.WARNING("  single-pass output differs from two-pass"))
+
+            budget = options['budget']
+            elapsed, text = timed(lambda: extract_text_pymupdf(file_path, max_chars=budget))
+            read_pages = text.count('--- Page ')
+            self.stdout.write(
+                f"{'single-pass, ' + str(budget) + ' char budget':<36} {elapsed * 1000:9.1f} ms"
+                f"   stopped after {read_pages}/{pages} pages"
+                f"   {baseline / elapsed:5.1f}x"
+            )
+
+            ranges = [
+                (start, min(start + PAGES_PER_TASK, pages))
+                for start in range(0, pages, PAGES_PER_TASK)
+            ]
+            with ProcessPoolExecutor(
+                max_workers=options['workers'],
+                mp_context=multiprocessing.get_context('spawn'),
+            ) as pool:
+                # Warm the workers so process start-up is not measured
+                list(pool.map(extract_text_pymupdf, [file_path] * options['workers'], [0] * options['workers'], [1] * options['workers']))
+
+                def page_parallel():
+                    futures = [pool.submit(extract_text_pymupdf, file_path, start, stop) for start, stop in ranges]
+                    return "\n\n".join(part for part in (f.result() for f in futures) if part)
+
+                elapsed, text = timed(page_parallel)
+                self.report(f"page-parallel ({options['workers']} processes)", pages, elapsed, baseline)
+                if text != reference:
+                    self.stdout.write(self.style.WARNING("  page-parallel output differs from two-pass"))
+
+    def report(self, label, pages, elapsed, baseline):
+        self.stdout.write(
+            f"{label:<36} {elapsed * 1000:9.1f} ms   {pages / elapsed:9.1f} pages/sec   {baseline / elapsed:5.1f}x"
+        )
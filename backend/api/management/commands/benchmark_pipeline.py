@@ -0,0 +1,330 @@
+import os
+import re
+import json
+import time
+import random
+import tempfile
+import threading
+import functools
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import fitz  # PyMuPDF
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory
+
+from api import embeddings, llm, pipeline, processing
+from api.extraction import clean_extracted_text, extract_text_pymupdf
+from api.hosts import OLLAMA_HOSTS, configure_hosts, host_stats
+from api.janitor import resume_janitor, suspend_janitor
+from api.limiter import limiter_stats
+from api.startup import preload
+from api.views import PDFProcessView
+
+DEPARTMENTS = ["Turbine Engineering", "Boiler Engineering", "Quality Assurance", "Finance", "Electrical Machines"]
+DESIGNATIONS = ["Deputy Engineer", "Engineer", "Senior Engineer", "Deputy Manager", "Manager"]
+QUALIFICATIONS = ["B.E. Mechanical Engineering", "B.Tech Electrical Engineering", "MBA Finance", "M.Tech Thermal Engineering"]
+NAMES = ["Ravi Kumar", "Sita Devi", "Amit Sharma", "Priya Nair", "Suresh Rao", "Anita Das"]
+
+
+def build_biodata_pdf(file_path, index, pages, rng):
+    """
+    Write a BHEL-style biodata: particulars and qualifications on the first
+    page, then experience entries filling the requested number of pages
+    """
+    doc = fitz.open()
+    lines = [
+        "Personal Particulars:",
+        f"Name : {rng.choice(NAMES)} {index}",
+        f"Staff No : {1000000 + index}",
+        f"Date of Birth : {rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(1962, 1995)}",
+        f"Department : {rng.choice(DEPARTMENTS)}",
+        f"Designation : {rng.choice(DESIGNATIONS)}",
+        "Category : GEN    PWD Status : NA",
+        "Qualification:",
+        f"{rng.choice(QUALIFICATIONS)}, {rng.randint(1985, 2015)}, with First Class",
+        "Experience in BHEL (Present Unit):",
+    ]
+    year = 1990
+    for page_num in range(pages):
+        page = doc.new_page()
+        y = 60
+        while y < 780:
+            line = lines.pop(0) if lines else (
+                f"{year}-{year + 1}: {rng.choice(DESIGNATIONS)}, {rng.choice(DEPARTMENTS)}, "
+                f"commissioning of unit {rng.randint(1, 9)} at site {rng.randint(100, 999)}"
+            )
+            if not lines:
+                year += 1
+            page.insert_text((50, y), line, fontsize=10)
+            y += 16
+        page.insert_text((280, 820), f"Page {page_num + 1} of {pages}", fontsize=8)
+    doc.save(file_path)
+    doc.close()
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for the Ollama endpoints the app calls, answering after the
+    server's configured latency
+    """
+    def log_message(self, *args):
+        pass
+
+    def _send(self, payload):
+        body = (json.dumps(payload) + "\n").encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._send({"models": [{"name": f"{name}:latest", "model": f"{name}:latest"} for name in ("phi4", "phi3", "mistral")]})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        server = self.server
+        time.sleep(max(server.latency + random.uniform(-server.jitter, server.jitter), 0))
+
+        prompt = request.get('prompt', '')
+        schema = request.get('format')
+        if isinstance(schema, dict) and schema.get("type") == "array":
+            item = schema["items"]["properties"]
+            fields = item["fields"]["properties"]
+            text = json.dumps([
+                {"id": document_id, "fields": {key: "Synthetic" for key in fields}}
+                for document_id in item["id"]["enum"]
+            ])
+        elif isinstance(schema, dict):
+            fields = schema["properties"]["fields"]["properties"]
+            text = json.dumps({"fields": {key: "Synthetic" for key in fields}, "decision": "YES"})
+        elif 'FINAL ANSWER' in prompt:
+            text = "The document states the required experience.\nFINAL ANSWER: YES"
+        else:
+            match = re.search(r'REQUIRED FIELDS TO EXTRACT:\s*(\[.*?\])', prompt, re.DOTALL)
+            fields = json.loads(match.group(1)) if match else []
+            text = json.dumps({key: "Synthetic" for key in fields})
+
+        self._send({
+            "model": request.get('model'),
+            "response": text,
+            "done": True,
+            "done_reason": "stop",
+            "prompt_eval_count": len(prompt) // 4,
+            "eval_count": len(text) // 4,
+        })
+
+
+class StageTimer:
+    """
+    Wall time of pipeline stages, collected from every thread
+    """
+    def __init__(self):
+        self.times = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self.lock:
+            self.times[stage].append(seconds)
+
+    def wrap(self, stage, fn):
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+
+class TimedLLM:
+    def __init__(self, llm, timer):
+        self.llm = llm
+        self.timer = timer
+
+    def invoke(self, prompt, **kwargs):
+        return self.timer.wrap('llm', self.llm.invoke)(prompt, **kwargs)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks PDFProcessView end to end on synthetic BHEL biodatas against '
+            'local fake Ollama servers: docs/sec, p50/p95 latency and per-stage time')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=40, help='Synthetic biodatas to process')
+        parser.add_argument('--batch-size', type=int, default=10, help='PDFs per request')
+        parser.add_argument('--concurrency', type=int, default=1, help='Requests in flight at once')
+        parser.add_argument('--min-pages', type=int, default=1)
+        parser.add_argument('--max-pages', type=int, default=6)
+        parser.add_argument('--latency', type=float, default=0.2, help='Fake Ollama seconds per call')
+        parser.add_argument('--jitter', type=float, default=0.05, help='Random +/- seconds per call')
+        parser.add_argument('--hosts', type=int, default=1, help='Fake Ollama servers to balance calls over')
+        parser.add_argument('--batched-prompts', action='store_true',
+                            help='Extract the fields of several short documents per call')
+        parser.add_argument('--criteria', default='{"department": "Engineering", "qualification": "Engineering"}',
+                            help='Criteria JSON sent with every request')
+        parser.add_argument('--extra-prompt', default='', help='Extra prompt sent with every request')
+        parser.add_argument('--model', default='phi4')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['min_pages'] < 1 or options['max_pages'] < options['min_pages']:
+            raise CommandError("Need 1 <= --min-pages <= --max-pages")
+        if options['hosts'] < 1:
+            raise CommandError("Need at least one --hosts")
+
+        servers = []
+        for _ in range(options['hosts']):
+            server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOllamaHandler)
+            server.latency = options['latency']
+            server.jitter = options['jitter']
+            threading.Thread(target=server.serve_forever, name='fake-ollama', daemon=True).start()
+            servers.append(server)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            rng = random.Random(options['seed'])
+            pdfs = []
+            for index in range(options['documents']):
+                file_path = os.path.join(tmp_dir, f"biodata_{index:04d}.pdf")
+                build_biodata_pdf(file_path, index, rng.randint(options['min_pages'], options['max_pages']), rng)
+                pdfs.append(file_path)
+            warmup = os.path.join(tmp_dir, 'warmup.pdf')
+            build_biodata_pdf(warmup, options['documents'], 1, rng)
+
+            # Nothing is deleted or embedded during the run (the fake servers
+            # only generate), and no background thread is left to reopen the
+            # real database once the throwaway one is gone
+            suspend_janitor()
+            saved_embedding = embeddings.BACKGROUND_EMBEDDING
+            embeddings.BACKGROUND_EMBEDDING = False
+
+            # A throwaway database and media root keep the real ones (and
+            # their caches) out of the measurement
+            old_name = connection.settings_dict['NAME']
+            if connection.vendor == 'sqlite':
+                connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmp_dir, 'benchmark.sqlite3')
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+            timer = StageTimer()
+            saved = (dict(llm._llms), processing.get_llm, processing.match_criteria, processing.extract_fields,
+                     pipeline.BATCHED_PROMPTS)
+            configure_hosts([f"http://127.0.0.1:{server.server_address[1]}" for server in servers])
+            llm._llms.clear()
+            processing.get_llm = lambda model_name: TimedLLM(saved[1](model_name), timer)
+            processing.match_criteria = timer.wrap('matching', saved[2])
+            processing.extract_fields = timer.wrap('rules', saved[3])
+            pipeline.BATCHED_PROMPTS = options['batched_prompts']
+
+            try:
+                with override_settings(MEDIA_ROOT=os.path.join(tmp_dir, 'media')):
+                    # Imports the lazily loaded libraries as a running server
+                    # has and starts the extraction workers, then opens the
+                    # Ollama client
+                    preload()
+                    pipeline.warm_extraction_pool()
+                    self.run_batch([warmup], options)
+                    timer.times.clear()
+                    self.benchmark(pdfs, options, timer)
+            finally:
+                (llms, processing.get_llm, processing.match_criteria, processing.extract_fields,
+                 pipeline.BATCHED_PROMPTS) = saved
+                configure_hosts(OLLAMA_HOSTS)
+                llm._llms.clear()
+                llm._llms.update(llms)
+                for server in servers:
+                    server.shutdown()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                embeddings.BACKGROUND_EMBEDDING = saved_embedding
+                resume_janitor()
+
+    def run_batch(self, paths, options):
+        """
+        POST one batch to the real view in streaming mode. Returns the
+        seconds until each file's result arrived.
+        """
+        request = APIRequestFactory().post(
+            '/api/process/?stream=ndjson',
+            {
+                'files': [
+                    SimpleUploadedFile(os.path.basename(path), open(path, 'rb').read(), content_type='application/pdf')
+                    for path in paths
+                ],
+                'description': options['criteria'],
+                'extra_prompt': options['extra_prompt'],
+                'model_name': options['model'],
+            },
+            format='multipart',
+            SERVER_NAME='localhost',
+        )
+
+        start = time.perf_counter()
+        response = PDFProcessView.as_view()(request)
+        if response.status_code != 200:
+            raise CommandError(f"View returned {response.status_code}: {response.data}")
+
+        latencies = []
+        for line in response.streaming_content:
+            event = json.loads(line)
+            if event["event"] == "result":
+                latencies.append(time.perf_counter() - start)
+                if event["error"]:
+                    self.stderr.write(f"{event['filename']}: {event['error']}")
+        connection.close()
+        return latencies
+
+    def benchmark(self, pdfs, options, timer):
+        size = options['batch_size']
+        batches = [pdfs[i:i + size] for i in range(0, len(pdfs), size)]
+        self.stdout.write(
+            f"{len(pdfs)} biodatas ({options['min_pages']}-{options['max_pages']} pages) in {len(batches)} "
+            f"requests, {options['concurrency']} at a time, {options['hosts']} fake Ollama host(s) "
+            f"with latency {options['latency'] * 1000:.0f} ms"
+        )
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            latencies = [
+                latency
+                for batch in executor.map(lambda batch: self.run_batch(batch, options), batches)
+                for latency in batch
+            ]
+        elapsed = time.perf_counter() - start
+
+        # Extraction and cleaning run in the worker processes, so they are
+        # timed again here one document at a time
+        for file_path in pdfs:
+            raw = timer.wrap('extraction', extract_text_pymupdf)(file_path)
+            timer.wrap('cleaning', clean_extracted_text)(raw)
+
+        self.stdout.write(f"{'throughput':<12} {len(latencies) / elapsed:9.2f} docs/sec   {elapsed:.2f} s total")
+        self.stdout.write(
+            f"{'latency':<12} p50 {percentile(latencies, 0.5) * 1000:9.1f} ms   "
+            f"p95 {percentile(latencies, 0.95) * 1000:9.1f} ms   (per document, from request start)"
+        )
+        for stage in ('extraction', 'cleaning', 'rules', 'llm', 'matching'):
+            times = timer.times.get(stage)
+            if not times:
+                self.stdout.write(f"{stage:<12} not run")
+                continue
+            self.stdout.write(
+                f"{stage:<12} {sum(times):9.3f} s total   {len(times):5d} calls   "
+                f"{sum(times) / len(times) * 1000:9.2f} ms mean   p95 {percentile(times, 0.95) * 1000:9.2f} ms"
+            )
+
+        for name, limiter in sorted(limiter_stats().items()):
+            if name.split('@')[0] == options['model']:
+                self.stdout.write(f"{'limiter':<12} {name} {json.dumps(limiter)}")
+        for host in host_stats():
+            self.stdout.write(f"{'host':<12} {host['url']} {host['requests']} calls, {host['failures']} failures")
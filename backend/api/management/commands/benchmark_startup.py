@@ -0,0 +1,92 @@
+import os
+import sys
+import json
+import time
+import socket
+import subprocess
+import urllib.request
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.startup import HEAVY_MODULES
+
+# Run in a fresh interpreter: seconds to set Django up, import the URLconf
+# (what the first request waits for) and then the libraries loaded lazily
+IMPORT_SCRIPT = """
+import os, sys, json, time, importlib
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+import api.urls
+urls = time.perf_counter()
+for name in sys.argv[1:]:
+    try:
+        importlib.import_module(name)
+    except Exception:
+        pass
+print(json.dumps({"setup": setup - start, "urls": urls - setup, "heavy": time.perf_counter() - urls}))
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = ('Measures backend start-up: import times in a fresh interpreter and the seconds '
+            'from launching runserver until /api/health/ answers')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3)
+        parser.add_argument('--timeout', type=float, default=60, help='Seconds to wait for the health check')
+
+    def handle(self, *args, **options):
+        base_dir = str(settings.BASE_DIR)
+
+        imports = []
+        for _ in range(options['runs']):
+            output = subprocess.run(
+                [sys.executable, '-c', IMPORT_SCRIPT, *HEAVY_MODULES],
+                cwd=base_dir, capture_output=True, text=True, check=True,
+            ).stdout
+            imports.append(json.loads(output.strip().splitlines()[-1]))
+        for key, label in (("setup", "django setup"), ("urls", "api urlconf"), ("heavy", "lazy libraries")):
+            times = sorted(run[key] for run in imports)
+            self.stdout.write(f"{label:<16} {times[len(times) // 2] * 1000:8.0f} ms median")
+
+        ready = []
+        for _ in range(options['runs']):
+            ready.append(self.time_to_health(base_dir, options['timeout']))
+        ready.sort()
+        self.stdout.write(
+            f"{'health check':<16} {ready[len(ready) // 2] * 1000:8.0f} ms median   "
+            f"{ready[0] * 1000:.0f}-{ready[-1] * 1000:.0f} ms   (runserver launch to first 200)"
+        )
+
+    def time_to_health(self, base_dir, timeout):
+        port = free_port()
+        url = f"http://127.0.0.1:{port}/api/health/"
+        start = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}', '--noreload'],
+            cwd=base_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            env={**os.environ, 'PYTHONUNBUFFERED': '1'},
+        )
+        try:
+            while time.perf_counter() - start < timeout:
+                if server.poll() is not None:
+                    raise CommandError(f"runserver exited with status {server.returncode}")
+                try:
+                    with urllib.request.urlopen(url, timeout=1) as response:
+                        if response.status == 200:
+                            return time.perf_counter() - start
+                except OSError:
+                    time.sleep(0.02)
+            raise CommandError(f"No health check answer within {timeout}s")
+        finally:
+            server.terminate()
+            server.wait()
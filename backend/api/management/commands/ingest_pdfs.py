@@ -0,0 +1,33 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.ingest import FAILED, ingest, path_sources
+
+
+class Command(BaseCommand):
+    help = ('Stores, extracts and indexes the PDFs of ZIP archives or directories, '
+            'skipping PDFs already ingested')
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='ZIP archives or directories of PDFs')
+
+    def handle(self, *args, **options):
+        for path in options['paths']:
+            try:
+                sources = path_sources(path)
+            except (OSError, ValueError) as e:
+                raise CommandError(str(e))
+
+            counts = Counter()
+            for result in ingest(sources):
+                counts[result["status"]] += 1
+                if result["status"] == FAILED:
+                    self.stderr.write(f"{result['filename']}: {result['error']}")
+                elif options['verbosity'] > 1:
+                    self.stdout.write(f"{result['status']:<9} {result['filename']}")
+
+            self.stdout.write(
+                f"{path}: {sum(counts.values())} PDFs, {counts['ingested']} ingested, "
+                f"{counts['skipped']} skipped, {counts['failed']} failed"
+            )
@@ -0,0 +1,200 @@
+import time
+import threading
+import contextlib
+from django.conf import settings
+
+# Record hot-path metrics for /api/metrics; when off every call below
+# returns after one flag check
+METRICS_ENABLED = getattr(settings, 'METRICS_ENABLED', True)
+
+# Histogram buckets in seconds, from a cache hit to a slow CPU-only LLM call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_registry = []
+_collectors = []
+_disabled = contextlib.nullcontext()
+
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic count per label combination
+    """
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Unlabeled metrics are exported from the start
+        self._values = {} if self.labelnames else {(): 0}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, _label_text(self.labelnames, key), value
+
+
+class Gauge(Counter):
+    """
+    Value that goes up and down, e.g. documents waiting in a queue
+    """
+    kind = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    """
+    Distribution of observed values (seconds) per label combination
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [[0] * len(self.buckets), 0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[0][index] += 1
+                    break
+            counts[1] += value
+
+    def time(self, **labels):
+        """
+        Context manager observing the seconds its block took
+        """
+        if not METRICS_ENABLED:
+            return _disabled
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _label_text(self.labelnames + ('le',), key + (_number(bound),))
+                yield f"{self.name}_bucket", labels, cumulative
+            labels = _label_text(self.labelnames, key)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def register_collector(collect):
+    """
+    Add metrics computed when scraped. collect() returns
+    [(name, kind, documentation, [({label: value}, value)])].
+    """
+    _collectors.append(collect)
+
+
+def render():
+    """
+    All metrics in the Prometheus text exposition format
+    """
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {_number(value)}")
+
+    for collect in _collectors:
+        for name, kind, documentation, samples in collect():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                names = tuple(labels)
+                lines.append(f"{name}{_label_text(names, [labels[n] for n in names])} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    'biodata_stage_seconds',
+    'Time per document in each processing stage',
+    ['stage'],
+)
+EXTRACTIONS = Counter(
+    'biodata_extractions_total',
+    'Documents whose text was obtained by each extraction method (cache = extraction cache hit)',
+    ['method'],
+)
+LLM_SECONDS = Histogram(
+    'biodata_llm_request_seconds',
+    'Duration of LLM calls that reached Ollama, excluding time queued for a concurrency slot',
+    ['model'],
+)
+LLM_FAILURES = Counter(
+    'biodata_llm_failures_total',
+    'LLM calls that raised an error',
+    ['model'],
+)
+LLM_TOKENS = Counter(
+    'biodata_llm_tokens_total',
+    'Tokens Ollama reported per model, by prompt and completion',
+    ['model', 'kind'],
+)
+DOCUMENTS = Counter(
+    'biodata_documents_total',
+    'Analyzed documents by outcome',
+    ['outcome'],
+)
+QUEUE_DEPTH = Gauge(
+    'biodata_pipeline_queue_depth',
+    'Extracted documents waiting for an LLM worker across running batches',
+)
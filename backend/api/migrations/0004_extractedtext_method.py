@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractedtext',
+            name='method',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtractedField',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('model_name', models.CharField(max_length=100)),
+                ('field', models.CharField(max_length=100)),
+                ('value', models.TextField(blank=True, null=True)),
+                ('source', models.CharField(max_length=16)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model_name', 'field'], name='extracted_field_lookup')],
+                'constraints': [models.UniqueConstraint(fields=('content_hash', 'model_name', 'field'), name='unique_extracted_field')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+import logging
+
+from django.db import migrations
+
+logger = logging.getLogger(__name__)
+
+
+def create_fts_table(apps, schema_editor):
+    # The full-text index is SQLite FTS5 only; elsewhere search falls back to
+    # sending every document through the normal checks
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS api_document_fts "
+            "USING fts5(text, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    except Exception as e:
+        logger.warning(f"SQLite FTS5 unavailable, full-text index disabled: {e}")
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS api_document_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_extractedfield'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_document_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='persistent',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,3 +1,158 @@
+import uuid
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class ExtractedText(models.Model):
+    """
+    Cleaned text extracted from an uploaded PDF, keyed by the SHA-256 of the
+    file bytes and the version of the extraction pipeline that produced it
+    """
+    content_hash = models.CharField(max_length=64)
+    extractor_version = models.CharField(max_length=16)
+    method = models.CharField(max_length=32, blank=True, default='')
+    text = models.TextField()
+    size = models.PositiveIntegerField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_accessed = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['content_hash', 'extractor_version'],
+                name='unique_extracted_text_version',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} (v{self.extractor_version})"
+
+
+class LLMResponse(models.Model):
+    """
+    Memoized LLM completion keyed by a hash of the model name, generation
+    parameters and prompt
+    """
+    key = models.CharField(max_length=64, unique=True)
+    model_name = models.CharField(max_length=100)
+    response = models.TextField()
+    size = models.PositiveIntegerField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    last_accessed = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.model_name}: {self.key[:12]}"
+
+
+class Job(models.Model):
+    """
+    A batch of uploaded PDFs processed in the background against one set of criteria
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (COMPLETED, 'Completed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    criteria = models.JSONField(default=dict)
+    extra_prompt = models.TextField(blank=True, default='')
+    model_name = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Job {self.id} ({self.status})"
+
+
+class JobFile(models.Model):
+    """
+    One PDF of a job together with its processing state and outcome
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    MATCHED = 'matched'
+    NOT_MATCHED = 'not_matched'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (MATCHED, 'Matched'),
+        (NOT_MATCHED, 'Not matched'),
+        (FAILED, 'Failed'),
+    ]
+    FINISHED_STATUSES = (MATCHED, NOT_MATCHED, FAILED)
+
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='files')
+    filename = models.CharField(max_length=255)
+    file_path = models.CharField(max_length=1024)
+    content_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    fields = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.filename} ({self.status})"
+
+    @property
+    def duration(self):
+        if self.started_at and self.finished_at:
+            return (self.finished_at - self.started_at).total_seconds()
+        return None
+
+
+class Document(models.Model):
+    """
+    A stored PDF, saved once under its content hash no matter how often or
+    under which names it is uploaded. Persistent documents (bulk ingested
+    into the document store) are never removed by the storage janitor.
+    """
+    content_hash = models.CharField(max_length=64, unique=True)
+    filename = models.CharField(max_length=255, db_index=True)
+    size = models.PositiveIntegerField()
+    persistent = models.BooleanField(default=False)
+    uploaded_at = models.DateTimeField(auto_now_add=True)
+    last_accessed = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.content_hash[:12]})"
+
+
+class ExtractedField(models.Model):
+    """
+    A criteria field read from a document by rules or a model, so later
+    queries on the same field need no inference. A null value records that
+    the document does not state the field.
+    """
+    content_hash = models.CharField(max_length=64)
+    model_name = models.CharField(max_length=100)
+    field = models.CharField(max_length=100)
+    value = models.TextField(null=True, blank=True)
+    source = models.CharField(max_length=16)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['content_hash', 'model_name', 'field'],
+                name='unique_extracted_field',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['model_name', 'field'], name='extracted_field_lookup'),
+        ]
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} {self.field}={self.value!r} ({self.model_name})"
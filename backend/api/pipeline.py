@@ -0,0 +1,578 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+import logging
+import functools
+import multiprocessing
+from concurrent.futures import (
+    FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+)
+from concurrent.futures.process import BrokenProcessPool
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+
+from .cache import get_cached_text, store_text
+from .extraction import (
+    EXTRACTOR_VERSION, PYMUPDF, classify_pdf, clean_extracted_text, count_pages,
+    extract_pdf, extract_text_pymupdf, import_pymupdf
+)
+from .fields import get_fields, store_fields
+from .hosts import get_pool
+from .janitor import start_janitor, store_pinned, unpin, wake_janitor
+from .metrics import DOCUMENTS, EXTRACTIONS, METRICS_ENABLED, QUEUE_DEPTH, STAGE_SECONDS
+from .context import SECTION_CONTEXT
+from .embeddings import queue_embedding
+from .processing import (
+    BATCHED_PROMPT_MAX_DOCUMENTS, BATCHED_PROMPTS, EXTRA_PROMPT_CHARS, aanalyze_content, analyze_content,
+    analyze_contents
+)
+from .search import index_text
+from .storage import read_upload
+
+logger = logging.getLogger(__name__)
+
+# Stage 1: PDF parsing is CPU bound, so it runs in worker processes (0 = threads)
+EXTRACTION_WORKERS = getattr(settings, 'EXTRACTION_WORKERS', os.cpu_count() or 1)
+
+# Stage 2: threads per batch and Ollama host waiting on the LLM; the shared
+# adaptive limiters decide how many of them actually call the model at once
+LLM_WORKERS = getattr(settings, 'LLM_WORKERS', 8)
+
+# Extracted documents waiting for an LLM worker; parsing pauses when it is full
+LLM_QUEUE_SIZE = getattr(settings, 'LLM_QUEUE_SIZE', 8)
+
+# PDFs with at least this many pages are parsed as page ranges across the pool
+PAGE_SPLIT_MIN_PAGES = getattr(settings, 'PAGE_SPLIT_MIN_PAGES', 16)
+PAGES_PER_TASK = getattr(settings, 'PAGES_PER_TASK', 8)
+
+_extraction_pool = None
+_extraction_pool_lock = threading.Lock()
+
+_DONE = object()
+
+# Extraction method reported for documents served from the extraction cache
+CACHE = 'cache'
+
+
+def get_extraction_pool():
+    """
+    Shared pool for PDF parsing. Worker processes are spawned rather than
+    forked so they never inherit the server's threads or DB connections.
+    """
+    global _extraction_pool
+
+    with _extraction_pool_lock:
+        if _extraction_pool is None:
+            if EXTRACTION_WORKERS > 0:
+                _extraction_pool = ProcessPoolExecutor(
+                    max_workers=EXTRACTION_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            else:
+                _extraction_pool = ThreadPoolExecutor(
+                    max_workers=2,
+                    thread_name_prefix='extraction',
+                )
+        return _extraction_pool
+
+
+def _reset_extraction_pool():
+    global _extraction_pool
+
+    with _extraction_pool_lock:
+        if _extraction_pool is not None:
+            _extraction_pool.shutdown(wait=False, cancel_futures=True)
+        _extraction_pool = None
+
+
+def _submit(fn, *args, **kwargs):
+    """
+    Submit to the extraction pool, replacing the pool if a worker process died
+    """
+    try:
+        return get_extraction_pool().submit(fn, *args, **kwargs)
+    except BrokenProcessPool:
+        logger.warning("Extraction pool broken, starting a new one")
+        _reset_extraction_pool()
+        return get_extraction_pool().submit(fn, *args, **kwargs)
+
+
+def warm_extraction_pool():
+    """
+    Start the extraction workers and have them import PyMuPDF before the
+    first upload needs them
+    """
+    futures = [_submit(import_pymupdf) for _ in range(max(EXTRACTION_WORKERS, 1))]
+    for future in futures:
+        future.result()
+
+
+def _chain(source, target):
+    source.add_done_callback(
+        lambda f: target.set_exception(f.exception()) if f.exception() else target.set_result(f.result())
+    )
+
+
+def _submit_page_ranges(file_path, page_count):
+    """
+    Parse a long text PDF as page ranges spread over the pool. The returned
+    future resolves to (cleaned text, method), falling back to extract_pdf
+    when the text layer turns out to be too thin.
+    """
+    combined = Future()
+    ranges = [
+        (start, min(start + PAGES_PER_TASK, page_count))
+        for start in range(0, page_count, PAGES_PER_TASK)
+    ]
+    parts = [None] * len(ranges)
+    remaining = [len(ranges)]
+    lock = threading.Lock()
+
+    def on_done(index, future):
+        try:
+            parts[index] = future.result() or ''
+        except Exception as e:
+            logger.error(f"Page range extraction failed: {e}")
+            parts[index] = ''
+
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+
+        content = "\n\n".join(part for part in parts if part)
+        if len(content.strip()) > 100:
+            logger.info(f"Extracted {page_count} pages in {len(ranges)} ranges using PyMuPDF")
+            combined.set_result((clean_extracted_text(content), PYMUPDF))
+        else:
+            try:
+                _chain(_submit(extract_pdf, file_path), combined)
+            except Exception as e:
+                combined.set_exception(e)
+
+    for index, (start, stop) in enumerate(ranges):
+        _submit(extract_text_pymupdf, file_path, start, stop).add_done_callback(
+            functools.partial(on_done, index)
+        )
+
+    return combined
+
+
+def _observe_extraction(start, future):
+    try:
+        _, method = future.result()
+    except Exception:
+        method = 'failed'
+    STAGE_SECONDS.observe(time.perf_counter() - start, stage='extraction')
+    EXTRACTIONS.inc(method=method)
+
+
+def submit_extraction(file_path, max_chars=None, data=None):
+    """
+    Queue a PDF for parsing; the future resolves to (cleaned text, method).
+    With data, thread workers parse the upload buffer instead of re-reading
+    the file; worker processes always read the stored file. Long text PDFs
+    fan out by page range unless only the first max_chars characters are
+    needed.
+    """
+    future = _submit_extraction(file_path, max_chars, data)
+    if METRICS_ENABLED:
+        # Parsing and cleaning happen in the pool, so the stage is timed
+        # from submission, including time queued for a worker
+        future.add_done_callback(functools.partial(_observe_extraction, time.perf_counter()))
+    return future
+
+
+def _submit_extraction(file_path, max_chars, data):
+    # Worker processes open the stored file; only threads share the buffer
+    # without copying it
+    pool_data = data if EXTRACTION_WORKERS <= 0 else None
+
+    if max_chars is None and PAGE_SPLIT_MIN_PAGES:
+        page_count = count_pages(file_path, data)
+        if page_count >= PAGE_SPLIT_MIN_PAGES:
+            strategy = classify_pdf(file_path, data=data)
+            if strategy == PYMUPDF:
+                return _submit_page_ranges(file_path, page_count)
+            return _submit(extract_pdf, file_path, None, strategy, pool_data)
+
+    return _submit(extract_pdf, file_path, max_chars, None, pool_data)
+
+
+def text_budget(criteria, extra_prompt):
+    """
+    Characters of raw text a batch needs: only the start of each document is
+    sent when there is an extra prompt but no criteria and section-aware
+    context is off, otherwise everything
+    """
+    if extra_prompt and not criteria and not SECTION_CONTEXT:
+        # Cleaning collapses whitespace, so read ahead of the prompt window
+        return EXTRA_PROMPT_CHARS * 2
+    return None
+
+
+def index_document(content_hash, content_str):
+    """
+    Add a document's full text to the keyword index and queue it for the
+    embedding index
+    """
+    index_text(content_hash, content_str)
+    queue_embedding(content_hash, content_str)
+
+
+def get_document_text(file_path, content_hash, filename, max_chars=None, data=None):
+    """
+    Cleaned text for a saved PDF and how it was obtained, from the extraction
+    cache or the extraction pool. Partial (max_chars) extractions are not cached.
+    """
+    content_str = get_cached_text(content_hash, EXTRACTOR_VERSION)
+    if content_str is not None:
+        logger.info(f"Extraction cache hit for {filename}")
+        EXTRACTIONS.inc(method=CACHE)
+        index_document(content_hash, content_str)
+        return content_str, CACHE
+
+    content_str, method = submit_extraction(file_path, max_chars, data).result()
+    if max_chars is None:
+        store_text(content_hash, EXTRACTOR_VERSION, content_str, method)
+        index_document(content_hash, content_str)
+    return content_str, method
+
+
+def analyze_pdf(file_path, filename, content_hash, criteria, extra_prompt, MODEL_NAME):
+    """
+    Extract a saved PDF and run the extra prompt / criteria checks on it
+    """
+    try:
+        content_str, method = get_document_text(
+            file_path, content_hash, filename, text_budget(criteria, extra_prompt)
+        )
+    except Exception as e:
+        logger.error(f"Error extracting {filename}: {str(e)[:200]}")
+        return _failed_result(filename, content_hash, str(e)[:200])
+
+    return analyze_document(content_str, filename, content_hash, method, criteria, extra_prompt, MODEL_NAME)
+
+
+def analyze_document(content_str, filename, content_hash, method, criteria, extra_prompt, MODEL_NAME):
+    """
+    Run the checks on extracted text, reusing fields stored for the document
+    and storing the ones newly extracted
+    """
+    with STAGE_SECONDS.time(stage='analysis'):
+        known_fields = get_fields(content_hash, MODEL_NAME) if criteria else None
+        result = analyze_content(content_str, filename, criteria, extra_prompt, MODEL_NAME, known_fields)
+        result["content_hash"] = content_hash
+        result["extraction_method"] = method
+        store_fields(content_hash, MODEL_NAME, result)
+    DOCUMENTS.inc(outcome=_outcome(result))
+    return result
+
+
+def analyze_documents(documents, criteria, extra_prompt, MODEL_NAME):
+    """
+    analyze_document for several extracted documents ([(content_str,
+    filename, content_hash, method)]) so short ones can share field
+    extraction calls
+    """
+    start = time.perf_counter()
+    results = analyze_contents(
+        [
+            (content_str, filename, get_fields(content_hash, MODEL_NAME) if criteria else None)
+            for content_str, filename, content_hash, _ in documents
+        ],
+        criteria, extra_prompt, MODEL_NAME,
+    )
+    # Documents sharing calls each get their share of the batch's time
+    elapsed = (time.perf_counter() - start) / len(documents)
+
+    for (_, _, content_hash, method), result in zip(documents, results):
+        result["content_hash"] = content_hash
+        result["extraction_method"] = method
+        store_fields(content_hash, MODEL_NAME, result)
+        STAGE_SECONDS.observe(elapsed, stage='analysis')
+        DOCUMENTS.inc(outcome=_outcome(result))
+    return results
+
+
+def _outcome(result):
+    if result.get("error"):
+        return 'failed'
+    if result.get("pruned"):
+        return 'pruned'
+    return 'matched' if result["matched"] else 'not_matched'
+
+
+def _hand_off(work, item):
+    work.put(item)
+    QUEUE_DEPTH.inc()
+
+
+def _failed_result(filename, content_hash, error):
+    DOCUMENTS.inc(outcome='failed')
+    return {
+        "filename": filename,
+        "content_hash": content_hash,
+        "matched": False,
+        "fields": None,
+        "error": error,
+        "extraction_method": None,
+    }
+
+
+def _extract_stage(files, work, stored_hashes, max_chars, llm_workers):
+    """
+    Store uploads content-addressed, resolve cached text and keep the
+    extraction pool busy parsing the stored files, handing each parsed
+    document to the LLM stage through the bounded queue
+    """
+    max_in_flight = max(EXTRACTION_WORKERS, 1) * 2
+    pending = {}
+    remaining = iter(files)
+    exhausted = False
+
+    try:
+        while True:
+            while not exhausted and len(pending) < max_in_flight:
+                file = next(remaining, None)
+                if file is None:
+                    exhausted = True
+                    break
+
+                try:
+                    with STAGE_SECONDS.time(stage='save'):
+                        data = read_upload(file)
+                        file_path, content_hash = store_pinned(data, file.name)
+                    stored_hashes.append(content_hash)
+                except Exception as e:
+                    logger.error(f"Error saving {file.name}: {str(e)[:200]}")
+                    _hand_off(work, (file.name, None, None, None, str(e)[:200]))
+                    continue
+
+                content_str = get_cached_text(content_hash, EXTRACTOR_VERSION)
+                if content_str is not None:
+                    logger.info(f"Extraction cache hit for {file.name}")
+                    EXTRACTIONS.inc(method=CACHE)
+                    index_document(content_hash, content_str)
+                    _hand_off(work, (file.name, content_hash, content_str, CACHE, None))
+                    continue
+
+                pending[submit_extraction(file_path, max_chars, data)] = (file.name, content_hash)
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                filename, content_hash = pending.pop(future)
+                try:
+                    content_str, method = future.result()
+                except Exception as e:
+                    logger.error(f"Error extracting {filename}: {str(e)[:200]}")
+                    _hand_off(work, (filename, content_hash, None, None, str(e)[:200]))
+                    continue
+
+                if max_chars is None:
+                    store_text(content_hash, EXTRACTOR_VERSION, content_str, method)
+                    index_document(content_hash, content_str)
+                _hand_off(work, (filename, content_hash, content_str, method, None))
+
+    except Exception as e:
+        logger.error(f"Extraction stage failed: {e}")
+
+    finally:
+        for _ in range(llm_workers):
+            work.put(_DONE)
+        connection.close()
+
+
+def _llm_stage(work, results, criteria, extra_prompt, MODEL_NAME):
+    """
+    Consume extracted documents and run the LLM checks on them. With
+    batched prompts, documents already waiting in the queue are taken
+    along so their field extraction can share calls.
+    """
+    # Only field extraction is batched, and with an extra prompt it is not
+    # the first call
+    batching = BATCHED_PROMPTS and criteria and not extra_prompt
+    finished = False
+    try:
+        while not finished:
+            items = [work.get()]
+            if items[0] is _DONE:
+                break
+            while batching and len(items) < BATCHED_PROMPT_MAX_DOCUMENTS:
+                try:
+                    item = work.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _DONE:
+                    finished = True
+                    break
+                items.append(item)
+            QUEUE_DEPTH.dec(len(items))
+
+            documents = []
+            for filename, content_hash, content_str, method, error in items:
+                if error:
+                    results.put(_failed_result(filename, content_hash, error))
+                else:
+                    documents.append((content_str, filename, content_hash, method))
+
+            if len(documents) > 1:
+                for result in analyze_documents(documents, criteria, extra_prompt, MODEL_NAME):
+                    results.put(result)
+            elif documents:
+                content_str, filename, content_hash, method = documents[0]
+                results.put(analyze_document(
+                    content_str, filename, content_hash, method, criteria, extra_prompt, MODEL_NAME
+                ))
+
+    finally:
+        results.put(_DONE)
+        connection.close()
+
+
+def process_batch(files, criteria, extra_prompt, MODEL_NAME):
+    """
+    Two-stage pipeline over uploaded PDFs: parsing runs in the extraction pool
+    and feeds a bounded queue drained by LLM_WORKERS threads per Ollama
+    host. Yields each result dict as soon as its file is done. Stored PDFs
+    stay pinned until the batch ends and are then left to the storage janitor.
+    """
+    start_janitor()
+
+    work = queue.Queue(maxsize=LLM_QUEUE_SIZE)
+    results = queue.Queue()
+    stored_hashes = []
+    llm_workers = LLM_WORKERS * len(get_pool().hosts)
+
+    threading.Thread(
+        target=_extract_stage,
+        args=(files, work, stored_hashes, text_budget(criteria, extra_prompt), llm_workers),
+        name='pipeline-extract',
+        daemon=True
+    ).start()
+
+    for i in range(llm_workers):
+        threading.Thread(
+            target=_llm_stage,
+            args=(work, results, criteria, extra_prompt, MODEL_NAME),
+            name=f'pipeline-llm-{i}',
+            daemon=True
+        ).start()
+
+    try:
+        finished_workers = 0
+        while finished_workers < llm_workers:
+            result = results.get()
+            if result is _DONE:
+                finished_workers += 1
+                continue
+            yield result
+
+    finally:
+        unpin(stored_hashes)
+        wake_janitor()
+
+
+async def _aget_document_text(file_path, content_hash, filename, max_chars, data):
+    """
+    get_document_text for the async pipeline: cache and index access run in
+    Django's sync thread, parsing in the extraction pool, and the event loop
+    only waits on their futures
+    """
+    content_str = await sync_to_async(get_cached_text)(content_hash, EXTRACTOR_VERSION)
+    if content_str is not None:
+        logger.info(f"Extraction cache hit for {filename}")
+        EXTRACTIONS.inc(method=CACHE)
+        await sync_to_async(index_document)(content_hash, content_str)
+        return content_str, CACHE
+
+    # Page counting and classification open the PDF, so even submitting
+    # stays off the event loop
+    loop = asyncio.get_running_loop()
+    future = await loop.run_in_executor(None, submit_extraction, file_path, max_chars, data)
+    content_str, method = await asyncio.wrap_future(future)
+
+    if max_chars is None:
+        await sync_to_async(store_text)(content_hash, EXTRACTOR_VERSION, content_str, method)
+        await sync_to_async(index_document)(content_hash, content_str)
+    return content_str, method
+
+
+async def aanalyze_document(content_str, filename, content_hash, method, criteria, extra_prompt, MODEL_NAME):
+    """
+    analyze_document with non-blocking LLM calls
+    """
+    with STAGE_SECONDS.time(stage='analysis'):
+        known_fields = await sync_to_async(get_fields)(content_hash, MODEL_NAME) if criteria else None
+        result = await aanalyze_content(content_str, filename, criteria, extra_prompt, MODEL_NAME, known_fields)
+        result["content_hash"] = content_hash
+        result["extraction_method"] = method
+        await sync_to_async(store_fields)(content_hash, MODEL_NAME, result)
+    DOCUMENTS.inc(outcome=_outcome(result))
+    return result
+
+
+async def _aprocess_file(file, criteria, extra_prompt, MODEL_NAME, max_chars, stored_hashes, extraction_slots):
+    # The upload is read into memory only once a slot is free and its buffer
+    # is dropped when parsing is done, so memory does not grow with the batch
+    async with extraction_slots:
+        try:
+            with STAGE_SECONDS.time(stage='save'):
+                data = await sync_to_async(read_upload)(file)
+                file_path, content_hash = await sync_to_async(store_pinned)(data, file.name)
+            stored_hashes.append(content_hash)
+        except Exception as e:
+            logger.error(f"Error saving {file.name}: {str(e)[:200]}")
+            return _failed_result(file.name, None, str(e)[:200])
+
+        try:
+            content_str, method = await _aget_document_text(
+                file_path, content_hash, file.name, max_chars, data
+            )
+        except Exception as e:
+            logger.error(f"Error extracting {file.name}: {str(e)[:200]}")
+            return _failed_result(file.name, content_hash, str(e)[:200])
+        finally:
+            del data
+
+    return await aanalyze_document(
+        content_str, file.name, content_hash, method, criteria, extra_prompt, MODEL_NAME
+    )
+
+
+async def aprocess_batch(files, criteria, extra_prompt, MODEL_NAME):
+    """
+    process_batch for ASGI: every file is a task on the event loop instead
+    of a thread, parsing runs in the extraction pool and Ollama is called
+    through its async client, so waiting documents hold no threads. Yields
+    each result dict as soon as its file is done.
+    """
+    start_janitor()
+
+    stored_hashes = []
+    max_chars = text_budget(criteria, extra_prompt)
+    # Like the sync pipeline, keep at most two PDFs per worker read into
+    # memory and queued for parsing
+    extraction_slots = asyncio.Semaphore(max(EXTRACTION_WORKERS, 1) * 2)
+    tasks = [
+        asyncio.ensure_future(_aprocess_file(
+            file, criteria, extra_prompt, MODEL_NAME, max_chars, stored_hashes, extraction_slots
+        ))
+        for file in files
+    ]
+
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+
+    finally:
+        for task in tasks:
+            task.cancel()
+        unpin(stored_hashes)
+        wake_janitor()
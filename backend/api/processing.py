@@ -0,0 +1,528 @@
+import json
+import re
+import logging
+from django.conf import settings
+
+from .context import SECTION_CONTEXT, build_context, context_budget
+from .criteria import match_records, normalize_fields
+from .llm import generation_options, get_async_llm, get_llm
+from .metrics import STAGE_SECONDS
+from .rules import LLM, RULES, STORED, extract_fields
+from .search import TEXT_PREFILTER, could_match
+
+logger = logging.getLogger(__name__)
+
+# Leading characters of a document sent with the extra prompt when
+# section-aware context is off
+EXTRA_PROMPT_CHARS = 3000
+
+# Read structured BHEL fields with rules before asking the LLM
+RULE_EXTRACTION = getattr(settings, 'RULE_EXTRACTION', True)
+
+# Answer the extra prompt and extract the criteria fields in one JSON call
+COMBINED_LLM_CALL = getattr(settings, 'COMBINED_LLM_CALL', True)
+
+# Pack the field extraction of several short documents into one call (within
+# the model's context budget) instead of one call per document
+BATCHED_PROMPTS = getattr(settings, 'BATCHED_PROMPTS', False)
+BATCHED_PROMPT_MAX_DOCUMENTS = getattr(settings, 'BATCHED_PROMPT_MAX_DOCUMENTS', 4)
+
+# Output tokens for a combined call: the decision plus each requested field
+COMBINED_BASE_TOKENS = 32
+COMBINED_TOKENS_PER_FIELD = 48
+
+
+class LLMRequest:
+    """
+    A model call an analysis step needs: the prompt and invoke() keyword
+    arguments (format, options). Field extraction requests also carry the
+    document text and the fields, so they can be packed with other documents.
+    """
+
+    def __init__(self, prompt, kwargs=None, document=None, fields=None):
+        self.prompt = prompt
+        self.kwargs = kwargs or {}
+        self.document = document
+        self.fields = fields
+
+
+def evaluate_extra_prompt_response(response_text, filename):
+    """
+    Enhanced evaluation that looks for final decision after reasoning
+    """
+    if not response_text:
+        logger.warning(f"Empty response for {filename}")
+        return False
+    
+    response_clean = response_text.strip().upper()
+    logger.info(f"Extra prompt response for {filename}: {response_clean}")
+    
+    # Look for final decision patterns (after reasoning)
+    final_patterns = [
+        r'FINAL ANSWER:\s*(YES|NO)',
+        r'DECISION:\s*(YES|NO)',
+        r'CONCLUSION:\s*(YES|NO)',
+        r'ANSWER:\s*(YES|NO)'
+    ]
+    
+    for pattern in final_patterns:
+        match = re.search(pattern, response_clean)
+        if match:
+            return match.group(1) == 'YES'
+    
+    # Fallback to end-of-response YES/NO
+    lines = response_clean.split('\n')
+    for line in reversed(lines[-3:]):  # Check last 3 lines
+        if re.search(r'\bYES\b', line) and not re.search(r'\bNO\b', line):
+            return True
+        if re.search(r'\bNO\b', line) and not re.search(r'\bYES\b', line):
+            return False
+    
+    logger.warning(f"Could not determine clear decision for {filename}: {response_clean}")
+    return False
+
+
+def combined_schema(criteria):
+    """
+    JSON schema for a combined call: the criteria fields, then the decision
+    so the model has read out the relevant values before deciding
+    """
+    return {
+        "type": "object",
+        "properties": {
+            "fields": {
+                "type": "object",
+                "properties": {key: {"type": ["string", "null"]} for key in criteria},
+                "required": list(criteria),
+            },
+            "decision": {"type": "string", "enum": ["YES", "NO"]},
+        },
+        "required": ["fields", "decision"],
+    }
+
+
+def combined_call(content_str, filename, criteria, extra_prompt):
+    """
+    One schema-constrained call for the extra prompt decision and the
+    criteria fields, as an analysis step (see LLMRequest). Returns
+    (decision, fields) or None if the response is not usable, in which case
+    the caller falls back to separate calls.
+    """
+    prompt = f"""
+    You are a strict bio-data analyzer for BHEL.
+
+    DOCUMENT CONTENT:
+    {content_str}
+
+    CRITERIA: {extra_prompt}
+
+    REQUIRED FIELDS TO EXTRACT:
+    {json.dumps(list(criteria.keys()), indent=2)}
+
+    INSTRUCTIONS:
+    - In "fields", extract ONLY the exact values present in the document
+    - Use the exact field names provided above
+    - If a field is missing, set its value to null
+    - Set "decision" to YES if the document meets the CRITERIA, otherwise NO
+    - Return valid JSON only
+
+    JSON OUTPUT:"""
+
+    num_predict = COMBINED_BASE_TOKENS + COMBINED_TOKENS_PER_FIELD * len(criteria)
+    response = yield LLMRequest(prompt, {
+        "format": combined_schema(criteria),
+        "options": generation_options(num_predict=num_predict),
+    })
+
+    try:
+        with STAGE_SECONDS.time(stage='json_parse'):
+            data = json.loads(response)
+        decision = str(data["decision"]).strip().upper()
+        fields = data.get("fields") or {}
+        if decision not in ("YES", "NO") or not isinstance(fields, dict):
+            raise ValueError(f"unexpected response {response[:100]}")
+    except (ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Combined call for {filename} unusable, using separate calls: {str(e)[:200]}")
+        return None
+
+    logger.info(f"Combined decision for {filename}: {decision}")
+    return decision == "YES", fields
+
+
+def batch_schema(document_ids, fields):
+    """
+    JSON schema for a batched field extraction: an array with the fields of
+    each document, keyed by its id
+    """
+    return {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {
+                "id": {"type": "string", "enum": document_ids},
+                "fields": {
+                    "type": "object",
+                    "properties": {key: {"type": ["string", "null"]} for key in fields},
+                    "required": fields,
+                },
+            },
+            "required": ["id", "fields"],
+        },
+    }
+
+
+def batched_request(documents, fields):
+    """
+    One field extraction call for several documents ({id: text})
+    """
+    sections = "\n\n".join(f"DOCUMENT {document_id}:\n{text}" for document_id, text in documents.items())
+    prompt = f"""
+    Extract structured data from each of these BHEL employee biodata documents.
+
+    {sections}
+
+    REQUIRED FIELDS TO EXTRACT FROM EACH DOCUMENT:
+    {json.dumps(fields, indent=2)}
+
+    INSTRUCTIONS:
+    - Return a JSON array with one object per document: {{"id": "<document id>", "fields": {{...}}}}
+    - Extract ONLY the exact values present in that document; never take a value from another document
+    - Use the exact field names provided above
+    - If a field is missing from a document, set its value to null
+    - Return valid JSON only
+
+    JSON OUTPUT:"""
+
+    num_predict = (COMBINED_BASE_TOKENS + COMBINED_TOKENS_PER_FIELD * len(fields)) * len(documents)
+    return LLMRequest(prompt, {
+        "format": batch_schema(list(documents), fields),
+        "options": generation_options(num_predict=num_predict),
+    })
+
+
+def parse_batched_response(response, document_ids):
+    """
+    {id: fields} of the documents a batched response answers for. Raises
+    ValueError or TypeError when it is not a JSON array.
+    """
+    with STAGE_SECONDS.time(stage='json_parse'):
+        data = json.loads(response)
+    if not isinstance(data, list):
+        raise ValueError(f"expected an array, got {response[:100]}")
+
+    extracted = {}
+    for entry in data:
+        if isinstance(entry, dict) and entry.get("id") in document_ids and isinstance(entry.get("fields"), dict):
+            extracted[entry["id"]] = entry["fields"]
+    return extracted
+
+
+def match_criteria(extracted_data, criteria):
+    """
+    Normalize extracted fields and check that they satisfy every criterion.
+    Returns (normalized fields, matched).
+    """
+    with STAGE_SECONDS.time(stage='matching'):
+        fields = normalize_fields(extracted_data)
+        return fields, bool(match_records([fields], criteria)[0])
+
+
+def add_llm_fields(result, extracted_data, criteria):
+    """
+    Add the fields the LLM extracted to result. Returns whether they satisfy
+    the criteria sent to the LLM.
+    """
+    fields, match = match_criteria(extracted_data, criteria)
+    result["fields"] = {**(result["fields"] or {}), **fields}
+    result["field_sources"].update({k.lower(): LLM for k in criteria})
+    return match
+
+
+def apply_criteria(result, extracted_data, criteria, filename):
+    """
+    Add the fields the LLM extracted to result and mark it matched when they
+    satisfy the criteria sent to the LLM
+    """
+    if add_llm_fields(result, extracted_data, criteria):
+        logger.info(f"Match found: {filename}")
+        result["matched"] = True
+    return result
+
+
+def analyze_content(content_str, filename, criteria, extra_prompt, MODEL_NAME, known_fields=None):
+    """
+    Run the extra prompt / criteria checks on a document's cleaned text.
+    known_fields ({field: value}) are fields already extracted for this
+    document and model; they are reused instead of being extracted again.
+    Returns a result dict with the match decision, the extracted fields and any error
+    """
+    steps = analysis_steps(content_str, filename, criteria, extra_prompt, MODEL_NAME, known_fields)
+    return _run_steps(steps, MODEL_NAME, lambda: next(steps))
+
+
+def _run_steps(steps, MODEL_NAME, advance):
+    """
+    Run analysis steps to the end with sync LLM calls, starting with the
+    request advance() returns. Returns the result dict.
+    """
+    try:
+        request = advance()
+        while True:
+            try:
+                # Shared Ollama client for the model, kept alive between documents
+                response = get_llm(MODEL_NAME).invoke(request.prompt, **request.kwargs)
+            except Exception as e:
+                request = steps.throw(e)
+            else:
+                request = steps.send(response)
+    except StopIteration as done:
+        return done.value
+
+
+def analyze_contents(documents, criteria, extra_prompt, MODEL_NAME):
+    """
+    analyze_content for several documents ([(content_str, filename,
+    known_fields)]), packing the field extraction of short ones into shared
+    calls up to the model's context budget. Documents a batched response
+    does not answer for, or all of them if it cannot be parsed, fall back
+    to their own call. Returns the result dicts in document order.
+    """
+    results = [None] * len(documents)
+    pending = []
+    for index, (content_str, filename, known_fields) in enumerate(documents):
+        steps = analysis_steps(content_str, filename, criteria, extra_prompt, MODEL_NAME, known_fields)
+        try:
+            pending.append((index, steps, next(steps)))
+        except StopIteration as done:
+            results[index] = done.value
+
+    # Greedy packing in document order; long documents keep their own call
+    budget = context_budget(MODEL_NAME)
+    batches = [[]]
+    singles = []
+    for entry in pending:
+        request = entry[2]
+        if request.fields is None or len(request.document) > budget // 2:
+            singles.append(entry)
+            continue
+        batch = batches[-1]
+        if (len(batch) >= BATCHED_PROMPT_MAX_DOCUMENTS
+                or sum(len(other.document) for _, _, other in batch) + len(request.document) > budget):
+            batch = []
+            batches.append(batch)
+        batch.append(entry)
+
+    for batch in batches:
+        if len(batch) < 2:
+            singles.extend(batch)
+            continue
+
+        ids = {f"D{number}": entry for number, entry in enumerate(batch, 1)}
+        fields = list(dict.fromkeys(key for _, _, request in batch for key in request.fields))
+        batch_request = batched_request({document_id: entry[2].document for document_id, entry in ids.items()}, fields)
+        try:
+            response = get_llm(MODEL_NAME).invoke(batch_request.prompt, **batch_request.kwargs)
+            extracted = parse_batched_response(response, ids)
+            logger.info(f"Batched call answered for {len(extracted)} of {len(batch)} documents")
+        except Exception as e:
+            logger.warning(f"Batched call for {len(batch)} documents unusable, using single calls: {str(e)[:200]}")
+            extracted = {}
+
+        for document_id, (index, steps, request) in ids.items():
+            if document_id not in extracted:
+                singles.append((index, steps, request))
+                continue
+            # Only the document's own fields, as its single call would return
+            response = json.dumps({key: extracted[document_id].get(key) for key in request.fields})
+            results[index] = _run_steps(steps, MODEL_NAME, lambda: steps.send(response))
+
+    for index, steps, request in singles:
+        results[index] = _run_steps(steps, MODEL_NAME, lambda: request)
+    return results
+
+
+async def aanalyze_content(content_str, filename, criteria, extra_prompt, MODEL_NAME, known_fields=None):
+    """
+    analyze_content with non-blocking LLM calls, for the async pipeline
+    """
+    steps = analysis_steps(content_str, filename, criteria, extra_prompt, MODEL_NAME, known_fields)
+    try:
+        request = next(steps)
+        while True:
+            try:
+                response = await get_async_llm(MODEL_NAME).ainvoke(request.prompt, **request.kwargs)
+            except Exception as e:
+                request = steps.throw(e)
+            else:
+                request = steps.send(response)
+    except StopIteration as done:
+        return done.value
+
+
+def analysis_steps(content_str, filename, criteria, extra_prompt, MODEL_NAME, known_fields=None):
+    """
+    The checks behind analyze_content as a generator: it yields an
+    LLMRequest for every model call and is sent the response text (or thrown
+    the error), so the same logic runs with sync or async LLM calls.
+    Returns the result dict.
+    """
+    result = {"filename": filename, "matched": False, "fields": None, "error": None, "field_sources": {}}
+
+    try:
+        if not content_str:
+            logger.error(f"Failed to extract content from {filename}")
+            result["error"] = "Failed to extract content"
+            return result
+
+        logger.info(f"Extracted {len(content_str)} characters from {filename}")
+
+        # Criteria values that appear nowhere in the text cannot match
+        if criteria and TEXT_PREFILTER and not could_match(content_str, criteria):
+            logger.info(f"{filename} pruned: criteria values not in text")
+            result["pruned"] = True
+            return result
+
+        # Fields extracted before and structured BHEL fields stated
+        # unambiguously in the text need no inference; only the remaining
+        # criteria go to the LLM
+        if criteria:
+            known_fields = known_fields or {}
+            resolved = {k: known_fields[k.lower()] for k in criteria if k.lower() in known_fields}
+            sources = {k.lower(): STORED for k in resolved}
+            if RULE_EXTRACTION:
+                with STAGE_SECONDS.time(stage='rules'):
+                    ruled = extract_fields(content_str, {k: v for k, v in criteria.items() if k not in resolved})
+                resolved.update(ruled)
+                sources.update({k.lower(): RULES for k in ruled})
+
+            if resolved:
+                fields, match = match_criteria(resolved, {k: criteria[k] for k in resolved})
+                result["fields"] = fields
+                result["field_sources"] = sources
+                if not match:
+                    logger.info(f"{filename} ruled out without the LLM")
+                    return result
+                criteria = {k: v for k, v in criteria.items() if k not in resolved}
+
+                if not criteria and not extra_prompt:
+                    logger.info(f"Match found without the LLM: {filename}")
+                    result["matched"] = True
+                    return result
+
+        if extra_prompt and criteria and COMBINED_LLM_CALL:
+            document = build_context(content_str, MODEL_NAME, criteria, extra_prompt)
+            combined = yield from combined_call(document, filename, criteria, extra_prompt)
+            if combined is not None:
+                decision, extracted_data = combined
+                if not decision:
+                    add_llm_fields(result, extracted_data, criteria)
+                    return result
+                return apply_criteria(result, extracted_data, criteria, filename)
+
+        # Process extra prompt if provided
+        extra_prompt_flag = True
+        if extra_prompt:
+            # Sections relevant to the extra prompt, or the start of the document
+            if SECTION_CONTEXT:
+                document = build_context(content_str, MODEL_NAME, extra_prompt=extra_prompt)
+            else:
+                document = content_str[:EXTRA_PROMPT_CHARS]
+
+            # Enhanced prompt for better accuracy
+            if MODEL_NAME in ['phi4', 'phi3']:
+                prompt = f"""
+                You are a strict bio-data analyzer for BHEL.
+
+                DOCUMENT: {document}
+                CRITERIA: {extra_prompt}
+
+                First, analyze the document step by step:
+                1. What relevant information do you find in the document?
+                2. How does this information relate to the criteria?
+                3. Based on your analysis, does the document meet the criteria?
+
+                Provide your reasoning first, then conclude with:
+                FINAL ANSWER: YES or NO
+
+                ANALYSIS:"""
+
+            elif MODEL_NAME == 'mistral':
+                prompt = f"""
+                You are a strict bio-data analyzer for BHEL.
+
+                DOCUMENT: {document}
+                CRITERIA: {extra_prompt}
+
+                First, analyze the document step by step:
+                1. What relevant information do you find in the document?
+                2. How does this information relate to the criteria?
+                3. Based on your analysis, does the document meet the criteria?
+
+                Provide your reasoning first, then conclude with:
+                FINAL ANSWER: YES or NO
+
+                ANALYSIS:"""
+
+            
+            response_text = (yield LLMRequest(prompt)).strip()
+            extra_prompt_flag = evaluate_extra_prompt_response(response_text, filename)
+
+        # If extra_prompt check failed, return early
+        if not extra_prompt_flag:
+            return result
+
+        # If criteria is empty, it is a match since extra_prompt check passed
+        if not criteria:
+            result["matched"] = True
+            return result
+
+        # Enhanced criteria processing with better prompt engineering
+        document = build_context(content_str, MODEL_NAME, criteria)
+        prompt = f"""
+        Extract structured data from this BHEL employee biodata document.
+
+        DOCUMENT CONTENT:
+        {document}
+
+        REQUIRED FIELDS TO EXTRACT:
+        {json.dumps(list(criteria.keys()), indent=2)}
+
+        INSTRUCTIONS:
+        - Extract ONLY the exact values present in the document
+        - Use the exact field names provided above
+        - Return valid JSON format only
+        - If a field is missing, set its value to null
+        - Do not add explanations or extra text
+
+        EXAMPLE OUTPUT FORMAT:
+        {{"name": "extracted name", "dateofbirth": "DD-MM-YYYY", "department": "department name"}}
+
+        JSON OUTPUT:"""
+
+        llm_response = (yield LLMRequest(prompt, document=document, fields=list(criteria))).strip()
+
+        try:
+            with STAGE_SECONDS.time(stage='json_parse'):
+                # Clean response to extract JSON
+                if llm_response.startswith("```"):
+                    llm_response = re.sub(r"```(?:json)?\n?|```", "", llm_response)
+
+                # Find JSON in response
+                json_match = re.search(r'\{.*\}', llm_response, re.DOTALL)
+                if json_match:
+                    llm_response = json_match.group()
+
+                extracted_data = json.loads(llm_response)
+            return apply_criteria(result, extracted_data, criteria, filename)
+
+        except (json.JSONDecodeError, Exception) as e:
+            logger.error(f"Error processing {filename}: {str(e)[:200]}")
+            result["error"] = str(e)[:200]
+            return result
+
+    except Exception as e:
+        logger.error(f"Error processing {filename}: {str(e)[:200]}")
+        result["error"] = str(e)[:200]
+        return result
+
+    return result
@@ -0,0 +1,190 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .criteria import evaluate, normalize_fields
+from .embeddings import embedding_stats, is_embedded, queue_embedding, rank_documents
+from .fields import get_fields_for
+from .janitor import STORAGE_TTL_SECONDS
+from .models import Document
+from .pipeline import analyze_pdf, get_document_text
+from .rules import STORED
+from .search import prune_documents
+from .storage import pdf_path
+
+logger = logging.getLogger(__name__)
+
+# Documents analyzed at once for fields not stored yet; LLM calls are
+# additionally bounded by the adaptive limiter
+QUERY_WORKERS = getattr(settings, 'QUERY_WORKERS', 4)
+
+
+def retention(documents):
+    """
+    What the stored documents cover: uploads are queried and searched only
+    until the janitor expires them (with their index rows and embeddings),
+    ingested PDFs until they are deleted by hand
+    """
+    persistent = sum(1 for document in documents if document.persistent)
+    return {
+        "persistent_documents": persistent,
+        "upload_documents": len(documents) - persistent,
+        "upload_ttl_seconds": STORAGE_TTL_SECONDS,
+    }
+
+
+def _analyze_missing(document, criteria, model_name):
+    try:
+        return analyze_pdf(
+            pdf_path(document.content_hash),
+            document.filename,
+            document.content_hash,
+            criteria,
+            '',
+            model_name,
+        )
+    finally:
+        connection.close()
+
+
+def query_documents(criteria, model_name, content_hashes=None):
+    """
+    Answer criteria over the stored documents. Documents whose stored fields
+    already decide the criteria need no inference; the others are analyzed
+    and only their missing fields are extracted. Returns (results, stats).
+    """
+    documents = Document.objects.order_by('uploaded_at')
+    if content_hashes is not None:
+        documents = documents.filter(content_hash__in=content_hashes)
+    documents = list(documents)
+
+    # Queried documents are in use, so the storage janitor keeps them
+    Document.objects.filter(id__in=[d.id for d in documents]).update(last_accessed=timezone.now())
+
+    known = get_fields_for([d.content_hash for d in documents], model_name)
+    records = [known.get(d.content_hash, {}) for d in documents]
+
+    # All stored records are checked against the criteria at once: a record
+    # is decided when some stored field fails or every field is stored
+    answered, passed = evaluate(records, criteria)
+    failed = (answered & ~passed).any(axis=0)
+    complete = answered.all(axis=0)
+
+    results = []
+    missing = []
+    for document, fields, is_failed, is_complete in zip(documents, records, failed, complete):
+        if not is_failed and not is_complete:
+            missing.append(document)
+            continue
+
+        answered_keys = [k for k in criteria if k.lower() in fields]
+        results.append({
+            "filename": document.filename,
+            "content_hash": document.content_hash,
+            "matched": bool(is_complete and not is_failed),
+            "fields": normalize_fields({k.lower(): fields[k.lower()] for k in answered_keys}),
+            "error": None,
+            "field_sources": {k.lower(): STORED for k in answered_keys},
+        })
+
+    # Documents whose indexed text lacks a criterion value cannot match
+    missing, pruned = prune_documents(missing, criteria)
+    for document in pruned:
+        results.append({
+            "filename": document.filename,
+            "content_hash": document.content_hash,
+            "matched": False,
+            "fields": None,
+            "error": None,
+            "field_sources": {},
+            "pruned": True,
+        })
+
+    decided = len(results) - len(pruned)
+    if missing:
+        logger.info(f"Query needs {len(missing)} of {len(documents)} documents analyzed")
+        with ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix='query') as executor:
+            results.extend(executor.map(lambda d: _analyze_missing(d, criteria, model_name), missing))
+
+    return results, {
+        "documents": len(documents),
+        "decided_from_store": decided,
+        "pruned_files": len(pruned),
+        "analyzed_documents": len(missing),
+        **retention(documents),
+    }
+
+
+def _queue_missing_embeddings(documents):
+    """
+    Queue stored documents that are not in the vector index yet (e.g.
+    stored before it existed); their text is read or extracted by the
+    embedding worker, not the request. Returns how many are missing.
+    """
+    missing = 0
+    for document in documents:
+        if is_embedded(document.content_hash):
+            continue
+        missing += 1
+        queue_embedding(document.content_hash, lambda document=document: get_document_text(
+            pdf_path(document.content_hash), document.content_hash, document.filename
+        )[0])
+    return missing
+
+
+def _verify(document, question, model_name):
+    try:
+        return analyze_pdf(
+            pdf_path(document.content_hash),
+            document.filename,
+            document.content_hash,
+            {},
+            question,
+            model_name,
+        )
+    finally:
+        connection.close()
+
+
+def semantic_search(text, top_k, model_name, verify=True):
+    """
+    Stored documents most similar in meaning to text. Only the query is
+    embedded here; documents still waiting for the embedding worker are
+    left out. With verify, only the top_k candidates get the yes/no LLM
+    check of text as an extra prompt. Returns (hits, stats).
+    """
+    documents = list(Document.objects.order_by('uploaded_at'))
+    not_embedded = _queue_missing_embeddings(documents)
+
+    by_hash = {d.content_hash: d for d in documents}
+    ranked = rank_documents(text, list(by_hash), top_k)
+    candidates = [by_hash[content_hash] for content_hash, _, _ in ranked]
+    Document.objects.filter(id__in=[d.id for d in candidates]).update(last_accessed=timezone.now())
+
+    hits = [
+        {
+            "filename": by_hash[content_hash].filename,
+            "content_hash": content_hash,
+            "score": score,
+            "chunk": chunk,
+        }
+        for content_hash, score, chunk in ranked
+    ]
+
+    if verify and candidates:
+        with ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix='verify') as executor:
+            checks = executor.map(lambda d: _verify(d, text, model_name), candidates)
+            for hit, check in zip(hits, checks):
+                hit["matched"] = check["matched"]
+                hit["error"] = check["error"]
+
+    return hits, {
+        "documents": len(documents),
+        "not_embedded_documents": not_embedded,
+        "queued_embeddings": embedding_stats()["queued"],
+        "candidates": len(candidates),
+        "verified_documents": len(candidates) if verify else 0,
+        **retention(documents),
+    }
@@ -0,0 +1,122 @@
+import re
+
+# Field sources reported per criteria key
+RULES = 'rules'
+LLM = 'llm'
+STORED = 'stored'
+
+_DATE = r'\d{1,2}[./-]\d{1,2}[./-]\d{2,4}'
+_TEXT = r"[A-Za-z][A-Za-z0-9 .,'&()/-]{0,59}"
+
+# Criteria field -> (labels the BHEL biodata uses for it, accepted value).
+# Keys are the frontend field names lower-cased. Value alternatives list
+# longer words first: the first alternative that matches is kept.
+FIELD_RULES = {
+    "name": ([r"Name of (?:the )?Employee", r"Employee Name", r"Name"], r"[A-Za-z][A-Za-z .']{1,59}"),
+    "staffno": ([r"Staff\s*(?:No|Number)\.?"], r"\d{4,8}"),
+    "designation": ([r"Designation"], _TEXT),
+    "presentgrade": ([r"Present Grade", r"Grade"], r"[A-Za-z0-9/-]{1,10}(?: [A-Za-z0-9/-]{1,10}){0,2}"),
+    "dateofgrade": ([r"Date of (?:Present )?Grade", r"Grade Date"], _DATE),
+    "category": ([r"Category"], r"(?i:GENERAL|GEN|UR|SC|ST|OBC|EWS)"),
+    "pwdstatus": ([r"PWD Status", r"PwD Status", r"PWD", r"PwD"], r"(?i:YES|NO|NA|N\.A\.?|NIL)"),
+    "dateofbirth": ([r"Date of Birth", r"D\.?O\.?B\.?"], _DATE),
+    "division": ([r"Division"], _TEXT),
+    "employeegroup": ([r"Employee Group", r"Group"], r"[A-Za-z0-9/-]{1,10}(?: [A-Za-z0-9/-]{1,10}){0,2}"),
+    "placeofposting": ([r"Place of Posting", r"Posting Place"], _TEXT),
+    "postingwef": ([r"Posting W\.?E\.?F\.?", r"W\.?E\.?F\.?"], _DATE),
+    "department": ([r"Department", r"Deptt?\."], _TEXT),
+}
+
+# Other labels and section headers that end a value without answering a field
+_STOP_LABELS = [
+    r"Father'?s Name", r"Husband'?s Name", r"Spouse'?s Name", r"Mother'?s Name",
+    r"Date of Joining(?: BHEL)?", r"Date of Retirement", r"Date of Superannuation",
+    r"Unit", r"Sex", r"Gender", r"Mobile(?: No\.?)?", r"Phone(?: No\.?)?", r"E-?mail",
+    r"Address", r"Religion", r"Marital Status", r"Blood Group",
+    r"[A-Z][a-z]+ Particulars", r"Qualifications?", r"Experience\b[^:]{0,60}",
+]
+
+
+def _build_label_pattern():
+    # Longer labels first so e.g. "Date of Grade" wins over "Grade" and
+    # "Father's Name" is not read as "Name"
+    labels = [(label, key) for key, (field_labels, _) in FIELD_RULES.items() for label in field_labels]
+    labels += [(label, None) for label in _STOP_LABELS]
+    labels.sort(key=lambda item: len(item[0]), reverse=True)
+
+    groups = {}
+    alternatives = []
+    for index, (label, key) in enumerate(labels):
+        group = f"l{index}"
+        groups[group] = key
+        alternatives.append(f"(?P<{group}>{label})")
+    pattern = re.compile(r"(?<![A-Za-z])(?:" + "|".join(alternatives) + r")\s*:\s*", re.IGNORECASE)
+    return pattern, groups
+
+
+_LABEL_PATTERN, _LABEL_GROUPS = _build_label_pattern()
+_VALUE_PATTERNS = {key: re.compile(value) for key, (_, value) in FIELD_RULES.items()}
+
+# Fields whose value is free text: it must span exactly up to the next known
+# label. Other fields have a fixed format and only need to start the value.
+_FREE_TEXT = {"name", "designation", "presentgrade", "division", "employeegroup", "placeofposting", "department"}
+
+# Any other "Label:" inside a value means it may have swallowed an unknown field
+_UNKNOWN_LABEL = re.compile(r":\s")
+
+
+def normalize_key(key):
+    return re.sub(r'[^a-z]', '', key.lower())
+
+
+def extract_rule_fields(text):
+    """
+    Read the structured BHEL fields from cleaned biodata text. A field is
+    returned only when its label is followed by a well-formed value, free
+    text values end at another known label, and every occurrence agrees.
+    Returns {normalized field key: value}.
+    """
+    if not text:
+        return {}
+
+    labels = list(_LABEL_PATTERN.finditer(text))
+    found = {}
+    ambiguous = set()
+
+    for index, label in enumerate(labels):
+        key = _LABEL_GROUPS[label.lastgroup]
+        if key is None:
+            continue
+
+        followed = index + 1 < len(labels)
+        value = text[label.end():labels[index + 1].start() if followed else len(text)].strip(" ,;")
+
+        if key in _FREE_TEXT:
+            # Text running to the end of the document has no reliable end
+            if not followed or _UNKNOWN_LABEL.search(value) or not _VALUE_PATTERNS[key].fullmatch(value):
+                continue
+        else:
+            match = _VALUE_PATTERNS[key].match(value)
+            if not match or re.match(r'[A-Za-z0-9]', value[match.end():match.end() + 1]):
+                continue
+            value = match.group()
+
+        if key in found and found[key].lower() != value.lower():
+            ambiguous.add(key)
+        found.setdefault(key, value)
+
+    return {key: value for key, value in found.items() if key not in ambiguous}
+
+
+def extract_fields(text, criteria):
+    """
+    Rule-extracted values for the criteria keys this extractor can answer
+    confidently, keyed by the original criteria keys
+    """
+    rule_fields = extract_rule_fields(text)
+    resolved = {}
+    for key in criteria:
+        value = rule_fields.get(normalize_key(key))
+        if value is not None:
+            resolved[key] = value
+    return resolved
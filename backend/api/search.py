@@ -0,0 +1,182 @@
+import re
+import bisect
+import logging
+from django.conf import settings
+from django.db import connection
+
+from .criteria import CONTAINS, EQUALS, IN, parse_criterion, search_text
+from .models import Document
+
+logger = logging.getLogger(__name__)
+
+# Skip the LLM for documents whose text cannot contain a criterion value
+TEXT_PREFILTER = getattr(settings, 'TEXT_PREFILTER', True)
+
+# Criterion words shorter than this (NA, SC, E3, ...) are too loosely matched
+# by the criteria check to rule a document out
+MIN_TOKEN_LENGTH = 3
+
+# Operators whose matching values contain the criterion's words. A plain
+# value's loose match also passes values contained in the criterion ("Hyd"
+# for "Hyderabad"), and ranges compare numbers, so neither can prune.
+PRUNING_OPERATORS = {EQUALS, CONTAINS, IN}
+
+# FTS5 table keyed by Document id (see migration 0007)
+FTS_TABLE = 'api_document_fts'
+
+_TOKEN = re.compile(r'[0-9a-z]+')
+_available = None
+
+
+def tokens(text):
+    return _TOKEN.findall(str(text).lower())
+
+
+def criterion_tokens(value):
+    """
+    Words of a criterion value long enough to prune on, none unless its
+    operator is one of PRUNING_OPERATORS
+    """
+    if parse_criterion(value)[0] not in PRUNING_OPERATORS:
+        return []
+    return sorted({token for token in tokens(search_text(value)) if len(token) >= MIN_TOKEN_LENGTH})
+
+
+def could_match(text, criteria):
+    """
+    False when some criterion shares no word (by prefix) with the text, so
+    no field extracted from it could match that criterion
+    """
+    words = sorted(set(tokens(text)))
+    for value in criteria.values():
+        needed = criterion_tokens(value)
+        if not needed:
+            continue
+        if not any(_has_prefix(words, token) for token in needed):
+            return False
+    return True
+
+
+def _has_prefix(words, prefix):
+    index = bisect.bisect_left(words, prefix)
+    return index < len(words) and words[index].startswith(prefix)
+
+
+def criteria_match_query(criteria):
+    """
+    FTS5 query equivalent to could_match, or None when no criterion can prune
+    """
+    clauses = []
+    for value in criteria.values():
+        needed = criterion_tokens(value)
+        if needed:
+            clauses.append("(" + " OR ".join(f'"{token}"*' for token in needed) + ")")
+    return " AND ".join(clauses) or None
+
+
+def search_available():
+    """
+    Whether the FTS5 index exists in this database
+    """
+    global _available
+
+    if _available is None:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+                )
+                _available = cursor.fetchone() is not None
+        except Exception:
+            _available = False
+    return _available
+
+
+def index_text(content_hash, text):
+    """
+    Add a stored document's cleaned text to the full-text index unless it
+    is indexed already
+    """
+    if not text or not search_available():
+        return
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}(rowid, text) "
+                f"SELECT id, %s FROM api_document WHERE content_hash = %s "
+                f"AND NOT EXISTS (SELECT 1 FROM {FTS_TABLE} WHERE rowid = api_document.id)",
+                [text, content_hash],
+            )
+    except Exception as e:
+        logger.warning(f"Could not index text of {content_hash[:12]}: {e}")
+
+
+def unindex(document_ids):
+    """
+    Drop deleted documents from the full-text index
+    """
+    if not document_ids or not search_available():
+        return
+
+    try:
+        with connection.cursor() as cursor:
+            placeholders = ", ".join(["%s"] * len(document_ids))
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", list(document_ids))
+    except Exception as e:
+        logger.warning(f"Could not remove documents from the text index: {e}")
+
+
+def prune_documents(documents, criteria):
+    """
+    Keep documents whose indexed text could satisfy the criteria, plus any
+    not indexed yet. Returns (kept, pruned).
+    """
+    query = criteria_match_query(criteria)
+    if not TEXT_PREFILTER or query is None or not documents or not search_available():
+        return documents, []
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [query])
+            matching = {row[0] for row in cursor.fetchall()}
+            cursor.execute(f"SELECT rowid FROM {FTS_TABLE}")
+            indexed = {row[0] for row in cursor.fetchall()}
+    except Exception as e:
+        logger.warning(f"Text index pre-filter failed: {e}")
+        return documents, []
+
+    kept = [d for d in documents if d.id in matching or d.id not in indexed]
+    pruned = [d for d in documents if d.id not in matching and d.id in indexed]
+    return kept, pruned
+
+
+def keyword_search(text, limit=20):
+    """
+    Stored documents ranked by BM25 for the words of text, no inference.
+    Documents matching more of the words rank higher.
+    """
+    words = sorted(set(tokens(text)))
+    if not words or not search_available():
+        return []
+
+    query = " OR ".join(f'"{word}"*' for word in words)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT d.id, bm25({FTS_TABLE}), snippet({FTS_TABLE}, 0, '[', ']', '...', 16) "
+            f"FROM {FTS_TABLE} JOIN api_document d ON d.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s ORDER BY bm25({FTS_TABLE}) LIMIT %s",
+            [query, limit],
+        )
+        rows = cursor.fetchall()
+
+    documents = Document.objects.in_bulk([row[0] for row in rows])
+    return [
+        {
+            "filename": documents[document_id].filename,
+            "content_hash": documents[document_id].content_hash,
+            "score": round(-score, 6),
+            "snippet": snippet,
+        }
+        for document_id, score, snippet in rows if document_id in documents
+    ]
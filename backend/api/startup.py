@@ -0,0 +1,117 @@
+import os
+import time
+import threading
+import importlib
+import logging
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# After start-up, import the PDF and LLM libraries in the background so the
+# first batch does not wait for them. The extraction worker processes are
+# left to start with the first batch.
+PRELOAD_IMPORTS = getattr(settings, 'PRELOAD_IMPORTS', True)
+
+# Seconds to leave the CPU to the server starting before preloading
+PRELOAD_DELAY_SECONDS = getattr(settings, 'PRELOAD_DELAY_SECONDS', 1.0)
+
+# Imported on first use by extraction.py, context.py, embeddings.py and llm.py
+HEAVY_MODULES = [
+    'fitz',
+    'langchain.text_splitter',
+    'langchain_core.callbacks',
+    'langchain_ollama',
+    'ollama',
+    'langchain_community.document_loaders',
+]
+
+# Import of this module stands in for process start where /proc is missing
+_imported_at = time.time()
+_lock = threading.Lock()
+_stats = {
+    "first_health_check_seconds": None,
+    "preloaded": False,
+    "preload_seconds": None,
+    "preload_failed": {},
+}
+
+
+def process_started_at():
+    """
+    Wall-clock time the process started
+    """
+    try:
+        with open('/proc/self/stat') as stat:
+            # Field 22, counted after the parenthesised command name
+            start_ticks = int(stat.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/stat') as stat:
+            boot_time = next(int(line.split()[1]) for line in stat if line.startswith('btime'))
+        return boot_time + start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, StopIteration):
+        return _imported_at
+
+
+def preload():
+    """
+    Import the heavy libraries now
+    """
+    start = time.perf_counter()
+    failed = {}
+    for name in HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            failed[name] = str(e)[:200]
+            logger.warning(f"Could not preload {name}: {e}")
+
+    elapsed = round(time.perf_counter() - start, 2)
+    with _lock:
+        _stats.update(preloaded=True, preload_seconds=elapsed, preload_failed=failed)
+    logger.info(f"Preloaded PDF and LLM libraries in {elapsed}s")
+
+
+def resume_jobs():
+    """
+    Start the job workers, which picks up batches interrupted by a restart
+    without waiting for a client to poll them
+    """
+    try:
+        from .jobs import get_job_executor
+        get_job_executor()
+    except Exception as e:
+        logger.error(f"Could not resume jobs: {e}")
+    finally:
+        connection.close()
+
+
+def _after_start():
+    time.sleep(PRELOAD_DELAY_SECONDS)
+    resume_jobs()
+    if PRELOAD_IMPORTS:
+        preload()
+
+
+def start_preload():
+    """
+    Resume jobs and preload in the background after a short delay so the
+    server starts first
+    """
+    threading.Thread(target=_after_start, name='preload', daemon=True).start()
+
+
+def record_health_check():
+    """
+    Note when the first health check was answered, the moment the desktop
+    app sees the backend as up
+    """
+    with _lock:
+        if _stats["first_health_check_seconds"] is None:
+            _stats["first_health_check_seconds"] = round(time.time() - process_started_at(), 2)
+
+
+def startup_stats():
+    with _lock:
+        stats = dict(_stats)
+    stats["uptime_seconds"] = round(time.time() - process_started_at(), 1)
+    return stats
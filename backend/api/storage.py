@@ -0,0 +1,91 @@
+import os
+import hashlib
+import logging
+import tempfile
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+
+from .models import Document
+
+logger = logging.getLogger(__name__)
+
+
+def pdf_dir():
+    return os.path.join(settings.MEDIA_ROOT, 'pdfs')
+
+
+def pdf_path(content_hash):
+    """
+    Content-addressed location of a stored PDF
+    """
+    return os.path.join(pdf_dir(), f"{content_hash}.pdf")
+
+
+def read_upload(file):
+    """
+    Bytes of an uploaded file, read once so they can be hashed and parsed in memory
+    """
+    file.seek(0)
+    return file.read()
+
+
+def store_pdf(data, filename, persistent=False):
+    """
+    Persist PDF bytes under their SHA-256, skipping the write when the same
+    content is already stored. Persistent PDFs are kept by the janitor; a
+    later plain upload does not make them expire again. Returns (file_path,
+    content_hash).
+    """
+    content_hash = hashlib.sha256(data).hexdigest()
+    file_path = pdf_path(content_hash)
+
+    if not os.path.exists(file_path):
+        os.makedirs(pdf_dir(), exist_ok=True)
+        # Write to a temp file and rename so concurrent uploads never see a partial PDF
+        fd, tmp_path = tempfile.mkstemp(dir=pdf_dir(), suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as dest:
+                dest.write(data)
+            os.replace(tmp_path, file_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    else:
+        logger.info(f"{filename} already stored as {content_hash[:12]}")
+
+    # Plain UPDATE then INSERT: update_or_create's locking read inside a
+    # transaction fails straight away on SQLite when another writer is active
+    fields = {"filename": filename, "size": len(data), "last_accessed": timezone.now()}
+    if persistent:
+        fields["persistent"] = True
+    try:
+        if not Document.objects.filter(content_hash=content_hash).update(**fields):
+            try:
+                Document.objects.create(content_hash=content_hash, **fields)
+            except IntegrityError:
+                Document.objects.filter(content_hash=content_hash).update(**fields)
+    except Exception as e:
+        logger.warning(f"Could not record document {filename}: {e}")
+
+    return file_path, content_hash
+
+
+def find_pdf(filename, content_hash=None):
+    """
+    Path of a stored PDF by content hash, or by the name it was last uploaded under
+    """
+    if content_hash is None:
+        document = Document.objects.filter(filename=filename).order_by('-last_accessed').first()
+        if document is None:
+            return None
+        content_hash = document.content_hash
+
+    file_path = pdf_path(content_hash)
+    if not os.path.exists(file_path):
+        return None
+
+    # Downloads keep a PDF alive for another TTL period
+    Document.objects.filter(content_hash=content_hash).update(last_accessed=timezone.now())
+    return file_path
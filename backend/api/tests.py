@@ -1,3 +1,715 @@
-from django.test import TestCase
+import os
+import json
+import time
+import tempfile
+from datetime import timedelta
+from concurrent.futures import Future
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import context, embeddings, ingest, janitor, jobs, pipeline, processing, views
+from .cache import CachedLLM, evict_extraction_cache, evict_llm_cache, get_cached_text, store_text
+from .criteria import evaluate, match_records, normalize_fields, parse_criterion, validate_criteria
+from .extraction import EXTRACTOR_VERSION
+from .hosts import HostPool, PooledLLM
+from .limiter import AdaptiveLimiter
+from .models import Document, Job, JobFile, LLMResponse
+from .rules import extract_fields, extract_rule_fields
+from .search import could_match, criteria_match_query
+from .storage import pdf_dir, pdf_path, store_pdf
+
+BIODATA = (
+    "Name of the Employee: Ravi Kumar Father's Name: Shyam Lal "
+    "Staff No.: 1234567 Designation: Senior Engineer Department: Turbine Engineering "
+    "Date of Birth: 12.05.1975 Category: GENERAL PWD Status: NO "
+    "Present Grade: E4 Date of Grade: 01-07-2018 Place of Posting: Haridwar Unit: HEEP"
+)
+
+
+def use_temp_media_root(test):
+    """
+    Store PDFs, vectors and other media of a test in a temporary directory
+    """
+    media_root = tempfile.TemporaryDirectory()
+    test.addCleanup(media_root.cleanup)
+    settings = override_settings(MEDIA_ROOT=media_root.name)
+    settings.enable()
+    test.addCleanup(settings.disable)
+    return media_root.name
+
+
+class CriteriaTests(TestCase):
+    records = [
+        normalize_fields({"Name": "Ravi Kumar", "DateOfBirth": "12/05/1975", "PresentGrade": "E4", "Category": "GENERAL"}),
+        normalize_fields({"Name": "Sita Devi", "DateOfBirth": "1982-11-03", "PresentGrade": "E6", "Category": "OBC"}),
+        # Stored fields keep None for a field the document does not state
+        {"name": "amit singh", "dateofbirth": None, "presentgrade": "e2"},
+    ]
+
+    def matches(self, criteria):
+        return match_records(self.records, criteria).tolist()
+
+    def test_plain_value_is_a_loose_word_match(self):
+        self.assertEqual(self.matches({"name": "kumar"}), [True, False, False])
+        self.assertEqual(self.matches({"name": "Devi Sharma"}), [False, True, False])
+
+    def test_eq_compares_whole_values_and_dates_in_any_format(self):
+        self.assertEqual(self.matches({"category": {"op": "eq", "value": "General"}}), [True, False, False])
+        self.assertEqual(self.matches({"category": {"op": "eq", "value": "GEN"}}), [False, False, False])
+        self.assertEqual(self.matches({"dateofbirth": {"op": "eq", "value": "1975-05-12"}}), [True, False, False])
+
+    def test_contains_and_in(self):
+        self.assertEqual(self.matches({"name": {"op": "contains", "value": "it"}}), [False, True, True])
+        self.assertEqual(self.matches({"category": {"op": "in", "value": ["OBC", "SC"]}}), [False, True, False])
+        self.assertEqual(self.matches({"category": {"op": "in", "value": "OBC"}}), [False, True, False])
+
+    def test_date_ranges_treat_a_bare_year_as_the_whole_year(self):
+        self.assertEqual(self.matches({"dateofbirth": {"op": "lt", "value": "1980"}}), [True, False, False])
+        self.assertEqual(self.matches({"dateofbirth": {"op": "lte", "value": "1982"}}), [True, True, False])
+        self.assertEqual(self.matches({"dateofbirth": {"op": "gt", "value": "1975"}}), [False, True, False])
+        self.assertEqual(self.matches({"dateofbirth": {"op": "gte", "value": "1975"}}), [True, True, False])
+        self.assertEqual(
+            self.matches({"dateofbirth": {"op": "between", "value": ["01.01.1975", "31.12.1979"]}}),
+            [True, False, False],
+        )
+
+    def test_numeric_ranges_read_the_number_in_the_value(self):
+        self.assertEqual(self.matches({"presentgrade": {"op": "gte", "value": 4}}), [True, True, False])
+        self.assertEqual(self.matches({"presentgrade": {"op": "between", "value": [1, 4]}}), [True, False, True])
+
+    def test_null_values_are_answered_and_missing_fields_are_not(self):
+        answered, passed = evaluate(self.records, {"dateofbirth": "1975", "category": "obc"})
+        self.assertEqual(answered.tolist(), [[True, True, True], [True, True, False]])
+        self.assertEqual(passed.tolist(), [[True, False, False], [False, True, False]])
+
+    def test_malformed_criteria_are_rejected(self):
+        self.assertEqual(parse_criterion("kumar"), ("match", "kumar"))
+        for value in ({"op": "like", "value": "x"}, {"op": "eq"}, {"op": "between", "value": [1]}):
+            with self.assertRaises(ValueError):
+                validate_criteria({"name": value})
+
+
+class RuleExtractionTests(TestCase):
+    def test_reads_labelled_fields(self):
+        fields = extract_rule_fields(BIODATA)
+        self.assertEqual(fields["name"], "Ravi Kumar")
+        self.assertEqual(fields["staffno"], "1234567")
+        self.assertEqual(fields["designation"], "Senior Engineer")
+        self.assertEqual(fields["department"], "Turbine Engineering")
+        self.assertEqual(fields["dateofbirth"], "12.05.1975")
+        self.assertEqual(fields["category"], "GENERAL")
+        self.assertEqual(fields["pwdstatus"], "NO")
+        self.assertEqual(fields["presentgrade"], "E4")
+        self.assertEqual(fields["dateofgrade"], "01-07-2018")
+        self.assertEqual(fields["placeofposting"], "Haridwar")
+
+    def test_every_category_resolves(self):
+        for category in ("GEN", "GENERAL", "General", "UR", "SC", "ST", "OBC", "EWS"):
+            with self.subTest(category=category):
+                fields = extract_rule_fields(f"Category: {category} PWD Status: NO")
+                self.assertEqual(fields.get("category"), category)
+
+    def test_malformed_values_are_left_to_the_llm(self):
+        fields = extract_rule_fields("Staff No.: 12AB Date of Birth: sometime in 1975 Category: Generalist Sex: M")
+        self.assertNotIn("staffno", fields)
+        self.assertNotIn("dateofbirth", fields)
+        self.assertNotIn("category", fields)
+
+    def test_free_text_needs_a_known_label_after_it(self):
+        self.assertNotIn("department", extract_rule_fields("Staff No.: 1234 Department: Turbine Engineering"))
+        self.assertNotIn("designation", extract_rule_fields("Designation: Engineer Hobbies: Chess Unit: HEEP"))
+
+    def test_conflicting_occurrences_are_ambiguous(self):
+        fields = extract_rule_fields("Staff No.: 1234 Sex: M Staff No.: 5678 Sex: M")
+        self.assertNotIn("staffno", fields)
+        fields = extract_rule_fields("Staff No.: 1234 Sex: M Staff No.: 1234 Sex: M")
+        self.assertEqual(fields["staffno"], "1234")
+
+    def test_related_labels_are_not_read_as_fields(self):
+        fields = extract_rule_fields("Father's Name: Shyam Lal Date of Joining: 01.01.2000 Unit: HEEP")
+        self.assertNotIn("name", fields)
+        self.assertNotIn("dateofgrade", fields)
+
+    def test_extract_fields_keeps_the_criteria_keys(self):
+        resolved = extract_fields(BIODATA, {"StaffNo": "1234567", "Category": "GENERAL", "Qualification": "B.Tech"})
+        self.assertEqual(resolved, {"StaffNo": "1234567", "Category": "GENERAL"})
+
+
+class AdaptiveLimiterTests(TestCase):
+    def call(self, limiter, seconds, chars=1000, failed=False):
+        limiter.acquire()
+        limiter.release(seconds, chars, failed)
+
+    def test_normal_calls_raise_the_limit_up_to_the_maximum(self):
+        limiter = AdaptiveLimiter('test', initial=2, maximum=4)
+        for _ in range(4):
+            self.call(limiter, 1.0)
+        self.assertEqual(int(limiter.limit), 3)
+        for _ in range(20):
+            self.call(limiter, 1.0)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_errors_and_slow_calls_cut_the_limit(self):
+        limiter = AdaptiveLimiter('test', initial=8, maximum=8)
+        self.call(limiter, 1.0, failed=True)
+        self.assertEqual(limiter.limit, 4)
+
+        limiter = AdaptiveLimiter('test', initial=8, maximum=8)
+        self.call(limiter, 1.0)
+        self.call(limiter, 5.0)
+        self.assertEqual(int(limiter.limit), 4)
+        self.assertEqual((limiter.slow_calls, limiter.decreases), (1, 1))
+
+    def test_latency_is_compared_per_character(self):
+        limiter = AdaptiveLimiter('test', initial=2, maximum=8)
+        self.call(limiter, 1.0, chars=1000)
+        self.call(limiter, 4.0, chars=4000)
+        self.assertEqual(limiter.slow_calls, 0)
+        self.assertGreater(limiter.limit, 2)
+
+    def test_failures_finishing_together_back_off_once(self):
+        limiter = AdaptiveLimiter('test', initial=8, maximum=8)
+        for _ in range(3):
+            self.call(limiter, 60.0, failed=True)
+        self.assertEqual((limiter.limit, limiter.errors, limiter.decreases), (4, 3, 1))
+
+    def test_limit_never_drops_below_one(self):
+        limiter = AdaptiveLimiter('test', initial=1, maximum=8)
+        with mock.patch('api.limiter.time.monotonic', side_effect=range(1000, 2000, 100)):
+            for _ in range(5):
+                self.call(limiter, 1.0, failed=True)
+        self.assertEqual(limiter.limit, 1)
+
+
+class FakeClient:
+    def __init__(self, host, calls, error=None):
+        self.host = host
+        self.calls = calls
+        self.error = error
+
+    def invoke(self, prompt, **kwargs):
+        self.calls.append(self.host.url)
+        if self.error is not None:
+            raise self.error
+        return f"{prompt} from {self.host.name}"
+
+
+class HostPoolTests(TestCase):
+    def setUp(self):
+        self.pool = HostPool(['http://a:11434', 'http://b:11434', 'http://c:11434'])
+        self.a, self.b, self.c = self.pool.hosts
+
+    def test_least_outstanding_host_is_chosen(self):
+        chosen = [self.pool.choose('phi4') for _ in range(3)]
+        self.assertEqual(chosen, [self.a, self.b, self.c])
+        self.pool.release(self.b)
+        self.assertIs(self.pool.choose('phi4'), self.b)
+
+    def test_ties_go_to_the_host_with_fewest_requests(self):
+        for _ in range(2):
+            self.pool.release(self.pool.choose('phi4'))
+        self.assertIs(self.pool.choose('phi4'), self.c)
+
+    def test_unhealthy_hosts_and_hosts_without_the_model_come_last(self):
+        self.a.healthy = False
+        self.b.models = {'mistral'}
+        self.assertIs(self.pool.choose('phi4'), self.c)
+        self.assertIs(self.pool.choose('phi4', exclude={self.c.url}), self.b)
+        self.assertIs(self.pool.choose('phi4', exclude={self.b.url, self.c.url}), self.a)
+        self.assertIsNone(self.pool.choose('phi4', exclude={h.url for h in self.pool.hosts}))
+
+    def test_failures_decide_whether_to_retry(self):
+        from ollama import ResponseError
+
+        self.assertTrue(self.pool.record_failure(self.a, 'phi4', ConnectionError("refused")))
+        self.assertFalse(self.a.healthy)
+        self.assertTrue(self.pool.record_failure(self.b, 'phi4', ResponseError("model not found", 404)))
+        self.assertTrue(self.b.healthy)
+        self.assertFalse(self.b.serves('phi4'))
+        self.assertFalse(self.pool.record_failure(self.c, 'phi4', ValueError("bad prompt")))
+        self.assertTrue(self.c.healthy)
+
+    def pooled(self, errors):
+        calls = []
+        llm = PooledLLM('phi4', lambda host: FakeClient(host, calls, errors.get(host.url)))
+        return llm, calls
+
+    def test_failed_calls_are_retried_on_another_host(self):
+        llm, calls = self.pooled({'http://a:11434': ConnectionError("refused")})
+        with mock.patch('api.hosts.get_pool', return_value=self.pool):
+            self.assertEqual(llm.invoke('hi'), 'hi from b:11434')
+            # The failed host is now tried last
+            self.assertEqual(llm.invoke('hi'), 'hi from c:11434')
+        self.assertEqual(calls, ['http://a:11434', 'http://b:11434', 'http://c:11434'])
+        self.assertEqual([h.outstanding for h in self.pool.hosts], [0, 0, 0])
+
+    def test_errors_are_raised_when_no_host_is_left_or_retrying_cannot_help(self):
+        llm, calls = self.pooled({h.url: ConnectionError("refused") for h in self.pool.hosts})
+        with mock.patch('api.hosts.get_pool', return_value=self.pool):
+            with self.assertRaises(ConnectionError):
+                llm.invoke('hi')
+        self.assertEqual(len(calls), 3)
+
+        llm, calls = self.pooled({'http://a:11434': ValueError("bad prompt")})
+        pool = HostPool(['http://a:11434', 'http://b:11434'])
+        with mock.patch('api.hosts.get_pool', return_value=pool):
+            with self.assertRaises(ValueError):
+                llm.invoke('hi')
+        self.assertEqual(calls, ['http://a:11434'])
+
+
+class SemanticRankingTests(TestCase):
+    def setUp(self):
+        use_temp_media_root(self)
+        for name, value in (('EMBEDDING_BACKEND', 'stub'), ('_embedder', None), ('_loaded', {})):
+            patcher = mock.patch.object(embeddings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_documents_rank_by_their_best_chunk(self):
+        embeddings.embed_document('a' * 64, "Department: Turbine Engineering. Experience in steam turbine design")
+        embeddings.embed_document('b' * 64, "Department: Finance. Experience in accounts and audit")
+        self.assertTrue(embeddings.is_embedded('a' * 64))
+
+        ranked = embeddings.rank_documents('audit of accounts', ['a' * 64, 'b' * 64, 'c' * 64], top_k=2)
+        self.assertEqual([content_hash for content_hash, _, _ in ranked], ['b' * 64, 'a' * 64])
+        self.assertIn('audit', ranked[0][2])
+
+        embeddings.drop_embeddings('b' * 64)
+        self.assertEqual([h for h, _, _ in embeddings.rank_documents('audit', ['a' * 64, 'b' * 64])], ['a' * 64])
+
+
+class TextPrefilterTests(TestCase):
+    TEXT = "Name: Ravi Kumar Place of Posting: Hyd Department: Turbine Engineering"
+
+    def test_plain_values_never_prune(self):
+        # The loose match passes "hyd" for "Hyderabad", so no word is required
+        self.assertTrue(could_match(self.TEXT, {"placeofposting": "Hyderabad"}))
+        self.assertIsNone(criteria_match_query({"placeofposting": "Hyderabad"}))
+
+    def test_typed_values_need_one_of_their_words(self):
+        self.assertTrue(could_match(self.TEXT, {"department": {"op": "contains", "value": "turbine"}}))
+        self.assertTrue(could_match(self.TEXT, {"name": {"op": "in", "value": ["Sita", "Ravi Kumar"]}}))
+        self.assertFalse(could_match(self.TEXT, {"department": {"op": "eq", "value": "Finance"}}))
+        self.assertEqual(criteria_match_query({"department": {"op": "eq", "value": "Finance"}}), '("finance"*)')
+
+    def test_ranges_never_prune(self):
+        self.assertTrue(could_match(self.TEXT, {"dateofbirth": {"op": "gte", "value": "1990"}}))
+
+
+class ExtractionCacheTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(pipeline, 'index_document')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def extracted(self, text, method='pymupdf'):
+        future = Future()
+        future.set_result((text, method))
+        return mock.patch.object(pipeline, 'submit_extraction', return_value=future)
+
+    def test_repeat_documents_skip_extraction(self):
+        with self.extracted(BIODATA) as submit:
+            self.assertEqual(pipeline.get_document_text('a.pdf', 'a' * 64, 'a.pdf'), (BIODATA, 'pymupdf'))
+            self.assertEqual(pipeline.get_document_text('a.pdf', 'a' * 64, 'a.pdf'), (BIODATA, pipeline.CACHE))
+        submit.assert_called_once()
+
+    def test_partial_extractions_are_not_cached(self):
+        with self.extracted(BIODATA[:100]) as submit:
+            pipeline.get_document_text('a.pdf', 'a' * 64, 'a.pdf', max_chars=100)
+            pipeline.get_document_text('a.pdf', 'a' * 64, 'a.pdf', max_chars=100)
+        self.assertEqual(submit.call_count, 2)
+
+    def test_a_new_extractor_version_misses(self):
+        store_text('a' * 64, 1, BIODATA)
+        self.assertEqual(get_cached_text('a' * 64, 1), BIODATA)
+        self.assertIsNone(get_cached_text('a' * 64, 2))
+
+    def test_least_recently_used_text_is_evicted_first(self):
+        store_text('a' * 64, 1, 'x' * 100)
+        store_text('b' * 64, 1, 'y' * 100)
+        get_cached_text('a' * 64, 1)
+
+        self.assertEqual(evict_extraction_cache(max_bytes=150), 1)
+        self.assertIsNotNone(get_cached_text('a' * 64, 1))
+        self.assertIsNone(get_cached_text('b' * 64, 1))
+
+
+class LLMCacheTests(TestCase):
+    def setUp(self):
+        self.llm = mock.Mock()
+        self.llm.invoke.side_effect = lambda prompt, **kwargs: f"answer to {prompt}"
+        self.cached = CachedLLM(self.llm, 'phi4', {"temperature": 0})
+
+    def test_repeated_prompts_are_answered_from_the_cache(self):
+        self.assertEqual(self.cached.invoke("Is this a biodata?"), "answer to Is this a biodata?")
+        self.assertEqual(self.cached.invoke("Is this a biodata?"), "answer to Is this a biodata?")
+        self.assertEqual(self.llm.invoke.call_count, 1)
+
+    def test_model_parameters_and_call_options_are_part_of_the_key(self):
+        self.cached.invoke("prompt")
+        self.cached.invoke("prompt", format='json')
+        CachedLLM(self.llm, 'llama3', {"temperature": 0}).invoke("prompt")
+        CachedLLM(self.llm, 'phi4', {"temperature": 0.5}).invoke("prompt")
+        self.assertEqual(self.llm.invoke.call_count, 4)
+
+    def test_expired_responses_are_asked_again(self):
+        self.cached.invoke("prompt")
+        LLMResponse.objects.update(created_at=timezone.now() - timedelta(days=30))
+        self.cached.invoke("prompt")
+        self.assertEqual(self.llm.invoke.call_count, 2)
+
+    def test_least_recently_used_responses_are_evicted_first(self):
+        self.cached.invoke("a" * 100)
+        self.cached.invoke("b" * 100)
+        self.cached.invoke("a" * 100)
+
+        evict_llm_cache(max_bytes=150)
+        self.cached.invoke("a" * 100)
+        self.assertEqual(self.llm.invoke.call_count, 2)
+        self.cached.invoke("b" * 100)
+        self.assertEqual(self.llm.invoke.call_count, 3)
+
+
+class InlineExecutor:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+class JobResumeTests(TestCase):
+    def setUp(self):
+        self.analyze = mock.Mock(side_effect=lambda path, filename, *args: {
+            "matched": filename != 'b.pdf', "fields": {"name": filename}, "error": None,
+        })
+        # Files run inline; the test's connection must stay open
+        for name, value in (('get_job_executor', InlineExecutor), ('connection', mock.Mock()),
+                            ('analyze_pdf', self.analyze)):
+            patcher = mock.patch.object(jobs, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def job(self, status, *files):
+        job = Job.objects.create(status=status, criteria={"name": "ravi"}, model_name='phi4')
+        for filename, file_status in files:
+            JobFile.objects.create(job=job, filename=filename, file_path=filename,
+                                   content_hash=filename[0] * 64, status=file_status)
+        return job
+
+    def test_interrupted_files_run_again_and_the_job_completes(self):
+        job = self.job(Job.RUNNING, ('a.pdf', JobFile.MATCHED), ('b.pdf', JobFile.RUNNING), ('c.pdf', JobFile.PENDING))
+        jobs.resume_pending_jobs()
+
+        self.assertEqual(sorted(call.args[1] for call in self.analyze.call_args_list), ['b.pdf', 'c.pdf'])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.COMPLETED)
+        progress = jobs.job_progress(job)
+        self.assertEqual((progress["processed_files"], progress["matching_files"]), (3, 2))
+
+    def test_jobs_whose_files_all_finished_are_completed(self):
+        job = self.job(Job.RUNNING, ('a.pdf', JobFile.MATCHED))
+        done = self.job(Job.COMPLETED, ('c.pdf', JobFile.PENDING))
+        jobs.resume_pending_jobs()
+
+        self.analyze.assert_not_called()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.COMPLETED)
+        self.assertEqual(done.files.get().status, JobFile.PENDING)
+
+
+class ProcessStreamingTests(TestCase):
+    def setUp(self):
+        self.yielded = []
+
+        def process_batch(files, criteria, extra_prompt, model_name):
+            for file in files:
+                self.yielded.append(file.name)
+                yield {"filename": file.name, "content_hash": file.name[0] * 64, "matched": file.name == 'a.pdf',
+                       "fields": {"name": "ravi kumar"}, "error": None, "extraction_method": 'pymupdf'}
+
+        patcher = mock.patch.object(views, 'process_batch', process_batch)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, stream):
+        return self.client.post(f'/api/process/?stream={stream}', {
+            "files": [SimpleUploadedFile(name, b'%PDF-1.4') for name in ('a.pdf', 'b.pdf')],
+            "description": json.dumps({"name": "ravi"}),
+        })
+
+    def test_ndjson_sends_each_result_before_the_next_file_is_processed(self):
+        response = self.post('ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        content = iter(response.streaming_content)
+        first = json.loads(next(content))
+        self.assertEqual(self.yielded, ['a.pdf'])
+        self.assertEqual((first["event"], first["filename"], first["processed"], first["total"]), ('result', 'a.pdf', 1, 2))
+        self.assertTrue(first["url"].endswith(f"/api/download/{'a' * 64}/a.pdf/"))
+
+        events = [json.loads(line) for line in content]
+        self.assertEqual([event["event"] for event in events], ['result', 'summary'])
+        self.assertEqual((events[1]["processed_files"], events[1]["matching_files"]), (2, 1))
+
+    def test_sse_names_each_event(self):
+        response = self.post('sse')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        events = [chunk.decode().split('\n') for chunk in response.streaming_content]
+        self.assertEqual([event[0] for event in events], ['event: result', 'event: result', 'event: summary'])
+        self.assertEqual(json.loads(events[1][1][len('data: '):])["filename"], 'b.pdf')
+
+
+class JanitorTests(TestCase):
+    def setUp(self):
+        use_temp_media_root(self)
+
+    def store(self, name, size=100, age=0, persistent=False):
+        file_path, content_hash = store_pdf(name.encode() * size, f"{name}.pdf", persistent)
+        Document.objects.filter(content_hash=content_hash).update(
+            last_accessed=timezone.now() - timedelta(seconds=age),
+        )
+        return content_hash
+
+    def stored(self, *content_hashes):
+        return [Document.objects.filter(content_hash=h).exists() and os.path.exists(pdf_path(h))
+                for h in content_hashes]
+
+    def test_uploads_expire_after_the_ttl_unless_pinned_or_persistent(self):
+        ttl = janitor.STORAGE_TTL_SECONDS
+        expired = self.store('a', age=ttl + 60)
+        pinned = self.store('b', age=ttl + 60)
+        persistent = self.store('c', age=ttl + 60, persistent=True)
+        recent = self.store('d')
+
+        janitor.pin([pinned])
+        self.addCleanup(janitor.unpin, [pinned])
+        janitor.sweep()
+
+        self.assertEqual(self.stored(expired, pinned, persistent, recent), [False, True, True, True])
+
+    def test_least_recently_used_uploads_go_first_over_the_quota(self):
+        oldest = self.store('a', age=30)
+        persistent = self.store('b', age=60, persistent=True)
+        newest = self.store('c')
+
+        with mock.patch.object(janitor, 'STORAGE_MAX_BYTES', 150):
+            janitor.sweep()
+
+        self.assertEqual(self.stored(oldest, persistent, newest), [False, True, True])
+
+    def test_old_untracked_files_are_removed_unless_still_needed(self):
+        os.makedirs(pdf_dir(), exist_ok=True)
+        names = {'orphan': 'e' * 64, 'pinned': 'f' * 64, 'job': '1' * 64, 'part': 'tmp123.part'}
+        old = time.time() - janitor.STORAGE_TTL_SECONDS - 60
+        for name in names.values():
+            file_path = os.path.join(pdf_dir(), name if name.endswith('.part') else f"{name}.pdf")
+            open(file_path, 'wb').close()
+            os.utime(file_path, (old, old))
+        job = Job.objects.create(model_name='phi4')
+        JobFile.objects.create(job=job, filename='job.pdf', file_path='', content_hash=names['job'])
+
+        janitor.pin([names['pinned']])
+        self.addCleanup(janitor.unpin, [names['pinned']])
+        janitor.sweep()
+
+        self.assertEqual(sorted(os.listdir(pdf_dir())), [f"{names['job']}.pdf", f"{names['pinned']}.pdf"])
+
+    def test_files_stored_after_the_sweep_started_are_kept(self):
+        content_hash = self.store('a')
+        self.assertEqual(janitor._remove_orphan(f"{content_hash}.pdf", pdf_path(content_hash)), 0)
+        self.assertTrue(os.path.exists(pdf_path(content_hash)))
+
+
+class ScriptedLLM:
+    """
+    Answers each kind of analysis call with a scripted response and records
+    the kinds it was asked for
+    """
+
+    def __init__(self, **responses):
+        self.responses = responses
+        self.calls = []
+
+    def invoke(self, prompt, **kwargs):
+        schema = kwargs.get('format') or {}
+        if schema.get('type') == 'array':
+            kind = 'batched'
+        elif 'decision' in schema.get('properties', {}):
+            kind = 'combined'
+        elif 'FINAL ANSWER' in prompt:
+            kind = 'decision'
+        else:
+            kind = 'fields'
+        self.calls.append(kind)
+        response = self.responses[kind]
+        return response(prompt) if callable(response) else response
+
+
+class CombinedCallTests(TestCase):
+    TEXT = BIODATA + " Hobby: chess and cricket"
+    CRITERIA = {"hobby": "chess"}
+
+    def analyze(self, llm):
+        with mock.patch.object(processing, 'get_llm', return_value=llm):
+            return processing.analyze_content(self.TEXT, 'a.pdf', self.CRITERIA, "Works in engineering", 'phi4')
+
+    def test_decision_and_fields_come_from_one_call(self):
+        llm = ScriptedLLM(combined=json.dumps({"fields": {"hobby": "Chess"}, "decision": "YES"}))
+        result = self.analyze(llm)
+        self.assertEqual(llm.calls, ['combined'])
+        self.assertTrue(result["matched"])
+        self.assertEqual((result["fields"], result["field_sources"]), ({"hobby": "chess"}, {"hobby": "llm"}))
+
+    def test_a_no_decision_keeps_the_fields_but_does_not_match(self):
+        llm = ScriptedLLM(combined=json.dumps({"fields": {"hobby": "chess"}, "decision": "NO"}))
+        result = self.analyze(llm)
+        self.assertEqual(llm.calls, ['combined'])
+        self.assertFalse(result["matched"])
+        self.assertEqual(result["fields"], {"hobby": "chess"})
+
+    def test_an_unusable_response_falls_back_to_separate_calls(self):
+        llm = ScriptedLLM(combined='{"fields": {"hobby": "chess"}, "decision": "MAYBE"}',
+                          decision="The unit is engineering.\nFINAL ANSWER: YES",
+                          fields='```json\n{"hobby": "chess"}\n```')
+        result = self.analyze(llm)
+        self.assertEqual(llm.calls, ['combined', 'decision', 'fields'])
+        self.assertTrue(result["matched"])
+
+    def test_disabled_it_makes_separate_calls(self):
+        llm = ScriptedLLM(decision="FINAL ANSWER: NO")
+        with mock.patch.object(processing, 'COMBINED_LLM_CALL', False):
+            result = self.analyze(llm)
+        self.assertEqual(llm.calls, ['decision'])
+        self.assertFalse(result["matched"])
+
+
+class PromptContextTests(TestCase):
+    QUALIFICATIONS = "Qualifications: B.Tech Mechanical Engineering from IIT Roorkee in 1997"
+    EXPERIENCE = "Experience Details: Designed steam turbine blades for ten years at Haridwar"
+    FAMILY = "Family Particulars: Spouse Sita Devi, two children"
+    TEXT = " ".join([BIODATA, QUALIFICATIONS, EXPERIENCE, FAMILY])
+
+    def context(self, tokens, criteria=None, extra_prompt=''):
+        with mock.patch.object(context, 'MODEL_CONTEXT_TOKENS', {'phi4': tokens}):
+            return context.build_context(self.TEXT, 'phi4', criteria, extra_prompt)
+
+    def test_text_within_the_budget_is_sent_whole(self):
+        self.assertEqual(self.context(1000, extra_prompt="Worked on turbines"), self.TEXT)
+        with mock.patch.object(context, 'SECTION_CONTEXT', False):
+            self.assertEqual(self.context(10, {"name": "ravi"}), self.TEXT)
+
+    def test_fields_of_known_sections_get_only_those_sections(self):
+        self.assertEqual(self.context(1000, {"name": "ravi", "category": "general"}), f"{BIODATA} {self.FAMILY}")
+        self.assertEqual(self.context(1000, {"qualification": "b.tech"}), self.QUALIFICATIONS)
+
+    def test_over_the_budget_the_most_relevant_sections_are_kept_in_order(self):
+        trimmed = self.context(60, {"hobby": "chess"}, "Designed turbine blades after an IIT degree")
+        self.assertLessEqual(len(trimmed), 60 * context.CHARS_PER_TOKEN)
+        self.assertIn(f"{self.QUALIFICATIONS} {self.EXPERIENCE}", trimmed)
+        self.assertNotIn(self.FAMILY, trimmed)
+
+    def test_long_sections_contribute_their_most_relevant_chunks(self):
+        # The particulars are longer than the whole budget
+        trimmed = self.context(len(BIODATA) // 8, extra_prompt="Staff No. and Place of Posting")
+        self.assertLessEqual(len(trimmed), len(BIODATA) // 2)
+        self.assertIn("Place of Posting: Haridwar", trimmed)
+        self.assertNotIn(self.QUALIFICATIONS, trimmed)
+
+
+class BatchedPromptTests(TestCase):
+    CRITERIA = {"hobby": "chess"}
+    DOCUMENTS = [
+        ("Name: Ravi Kumar Hobby: chess", 'a.pdf', None),
+        ("Name: Sita Devi Hobby: painting", 'b.pdf', None),
+        ("Name: Amit Singh Hobby: chess", 'c.pdf', None),
+    ]
+
+    def analyze(self, llm, documents=DOCUMENTS):
+        with mock.patch.object(processing, 'get_llm', return_value=llm):
+            return processing.analyze_contents(documents, self.CRITERIA, '', 'phi4')
+
+    def test_short_documents_share_one_call(self):
+        llm = ScriptedLLM(batched=json.dumps([
+            {"id": "D1", "fields": {"hobby": "chess"}},
+            {"id": "D2", "fields": {"hobby": "painting"}},
+            {"id": "D3", "fields": {"hobby": "Chess"}},
+        ]))
+        results = self.analyze(llm)
+        self.assertEqual(llm.calls, ['batched'])
+        self.assertEqual([result["matched"] for result in results], [True, False, True])
+        self.assertEqual(results[1]["fields"], {"hobby": "painting"})
+
+    def test_documents_left_out_of_the_answer_get_their_own_call(self):
+        llm = ScriptedLLM(batched=json.dumps([{"id": "D2", "fields": {"hobby": "painting"}}]),
+                          fields=lambda prompt: json.dumps({"hobby": "chess" if "Hobby: chess" in prompt else None}))
+        results = self.analyze(llm)
+        self.assertEqual(llm.calls, ['batched', 'fields', 'fields'])
+        self.assertEqual([result["matched"] for result in results], [True, False, True])
+
+    def test_an_unusable_answer_falls_back_to_single_calls(self):
+        llm = ScriptedLLM(batched='{"hobby": "chess"}', fields='{"hobby": "chess"}')
+        results = self.analyze(llm)
+        self.assertEqual(llm.calls, ['batched', 'fields', 'fields', 'fields'])
+        self.assertTrue(all(result["matched"] for result in results))
+
+    def test_long_documents_keep_their_own_call(self):
+        long_text = "Hobby: chess " + "Experience in turbine design. " * 300
+        llm = ScriptedLLM(fields='{"hobby": "chess"}')
+        results = self.analyze(llm, [(long_text, 'a.pdf', None), self.DOCUMENTS[0]])
+        self.assertEqual(llm.calls, ['fields', 'fields'])
+        self.assertEqual(len(results), 2)
+
+
+class IngestTests(TestCase):
+    def setUp(self):
+        use_temp_media_root(self)
+        self.texts = {}
+        for name, value in (('submit_extraction', self.extract), ('index_document', mock.Mock()),
+                            ('start_janitor', mock.Mock())):
+            patcher = mock.patch.object(ingest, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def extract(self, file_path, max_chars, data):
+        future = Future()
+        future.set_result((self.texts.get(data, ''), 'pymupdf'))
+        return future
+
+    def source(self, name, data, text=BIODATA):
+        self.texts[data] = text
+        return ingest.PdfSource(name, len(data), lambda: data)
+
+    def statuses(self, sources):
+        # Results come in the order extractions finish
+        return sorted((result["filename"], result["status"]) for result in ingest.ingest(sources))
+
+    def test_pdfs_are_stored_persistent_and_skipped_once_ingested(self):
+        sources = [self.source('a.pdf', b'%PDF a'), self.source('b.pdf', b'%PDF b'), self.source('copy.pdf', b'%PDF a')]
+        self.assertEqual(self.statuses(sources), [('a.pdf', 'ingested'), ('b.pdf', 'ingested'), ('copy.pdf', 'skipped')])
+        self.assertEqual(Document.objects.filter(persistent=True).count(), 2)
+        self.assertEqual(get_cached_text(Document.objects.get(filename='b.pdf').content_hash, EXTRACTOR_VERSION), BIODATA)
+
+        self.assertEqual(self.statuses([self.source('a.pdf', b'%PDF a')]), [('a.pdf', 'skipped')])
+
+    def test_an_uploaded_pdf_joins_the_document_store(self):
+        file_path, content_hash = store_pdf(b'%PDF a', 'a.pdf')
+        store_text(content_hash, EXTRACTOR_VERSION, BIODATA)
+        self.assertFalse(Document.objects.get(content_hash=content_hash).persistent)
+
+        self.assertEqual(self.statuses([self.source('a.pdf', b'%PDF a')]), [('a.pdf', 'skipped')])
+        self.assertTrue(Document.objects.get(content_hash=content_hash).persistent)
+
+        # A later upload of the same PDF does not make it expire again
+        store_pdf(b'%PDF a', 'a.pdf')
+        self.assertTrue(Document.objects.get(content_hash=content_hash).persistent)
+
+    def test_failures_are_reported_and_retried_next_time(self):
+        too_large = ingest.PdfSource('big.pdf', ingest.INGEST_MAX_FILE_BYTES + 1, lambda: b'')
+        sources = [too_large, self.source('scan.pdf', b'%PDF scan', text='')]
+        self.assertEqual(self.statuses(sources), [('big.pdf', 'failed'), ('scan.pdf', 'failed')])
+
+        self.texts[b'%PDF scan'] = BIODATA
+        self.assertEqual(self.statuses([self.source('scan.pdf', b'%PDF scan')]), [('scan.pdf', 'ingested')])
@@ -1,8 +1,21 @@
 from django.urls import path
-from .views import PDFProcessView, PDFDownloadView, HealthCheckView
+from .views import (
+    PDFProcessView, AsyncPDFProcessView, PDFDownloadView, HealthCheckView, StatsView, MetricsView, JobCreateView, JobStatusView, FieldQueryView,
+    KeywordSearchView, SemanticSearchView, IngestView
+)
 
 urlpatterns = [
     path('health/', HealthCheckView.as_view(), name='health-check'),
+    path('stats/', StatsView.as_view(), name='stats'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('process/', PDFProcessView.as_view(), name='pdf-process'),
-    path('download/<str:filename>/', PDFDownloadView.as_view(), name='pdf-download'),
+    path('process/async/', AsyncPDFProcessView.as_view(), name='pdf-process-async'),
+    path('ingest/', IngestView.as_view(), name='ingest'),
+    path('jobs/', JobCreateView.as_view(), name='job-create'),
+    path('jobs/<uuid:job_id>/', JobStatusView.as_view(), name='job-status'),
+    path('query/', FieldQueryView.as_view(), name='field-query'),
+    path('search/', KeywordSearchView.as_view(), name='keyword-search'),
+    path('semantic-search/', SemanticSearchView.as_view(), name='semantic-search'),
+    path('download/<str:content_hash>/<str:filename>/', PDFDownloadView.as_view(), name='pdf-download'),
+    path('download/<str:filename>/', PDFDownloadView.as_view(), name='pdf-download-by-name'),
 ]
@@ -1,445 +1,450 @@
 import os
-import threading
+import re
 import json
-import fitz  # PyMuPDF
-from django.conf import settings
+import zipfile
+from collections import Counter
+from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.http import FileResponse, Http404
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import re
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 import logging
 from django.views.decorators.clickjacking import xframe_options_exempt
 
-# LangChain imports
-from langchain_community.document_loaders import PyPDFLoader, UnstructuredPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_ollama import OllamaLLM
-from langchain.globals import set_verbose
+from .cache import extraction_cache_stats, llm_cache_stats
+from .criteria import validate_criteria
+from .embeddings import SEMANTIC_TOP_K
+from .ingest import directory_allowed, directory_sources, ingest, zip_sources
+from .janitor import STORAGE_TTL_SECONDS, janitor_stats
+from .jobs import create_job, get_job_executor, job_progress
+from .limiter import limiter_stats
+from .llm import llm_stats
+from .metrics import METRICS_ENABLED, render
+from .models import Job
+from .storage import find_pdf
+from .pipeline import aprocess_batch, process_batch
+from .query import query_documents, semantic_search
+from .search import keyword_search, search_available
+from .startup import record_health_check, startup_stats
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Set verbose mode for langchain
-set_verbose(False)
 
-def extract_text_pymupdf(file_path):
+def parse_process_request(request):
     """
-    Enhanced PDF text extraction using PyMuPDF (fitz)
-    Better for complex layouts and preserves formatting
+    Validate the fields shared by the processing endpoints.
+    Returns (params, None) on success or (None, error Response)
     """
-    try:
-        doc = fitz.open(file_path)
-        text_content = []
-        
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            
-            # Extract text with layout preservation
-            text = page.get_text("text")
-            
-            # Alternative: Extract text blocks for better structure
-            blocks = page.get_text("blocks")
-            structured_text = []
-            
-            for block in blocks:
-                if len(block) >= 5 and block[4].strip():  # Check if block contains text
-                    structured_text.append(block[4].strip())
-            
-            # Use structured text if available, otherwise fall back to simple text
-            page_text = "\n".join(structured_text) if structured_text else text
-            
-            if page_text.strip():
-                text_content.append(f"--- Page {page_num + 1} ---\n{page_text}")
-        
-        doc.close()
-        return "\n\n".join(text_content)
-        
-    except Exception as e:
-        logger.error(f"PyMuPDF extraction failed: {e}")
-        return None
-
-def extract_text_langchain(file_path):
-    """
-    Fallback extraction using LangChain loaders
+    params, error = read_process_params(request.FILES, request.data)
+    if error:
+        return None, Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+    return params, None
+
+
+def read_process_params(uploads, data):
     """
-    try:
-        # Try PyPDFLoader first
-        loader = PyPDFLoader(file_path)
-        documents = loader.load()
-        
-        if documents:
-            content = "\n".join([doc.page_content for doc in documents])
-            if len(content.strip()) > 100:  # Ensure meaningful content
-                return content
-        
-        # Fallback to UnstructuredPDFLoader for complex layouts
-        loader = UnstructuredPDFLoader(file_path)
-        documents = loader.load()
-        
-        if documents:
-            return "\n".join([doc.page_content for doc in documents])
-            
-    except Exception as e:
-        logger.error(f"LangChain extraction failed: {e}")
-        
-    return None
-
-def clean_extracted_text(text):
-    """
-    Enhanced cleaning specifically for BHEL biodata documents
-    Preserves staff numbers and other important numeric data
-    """
-    if not text:
-        return ""
-
-    # Remove page markers but preserve structure
-    text = re.sub(r'--- Page \d+ ---', '\n', text)
-    
-    # Normalize BHEL-specific section headers
-    text = re.sub(r'([A-Z][a-z]+ Particulars:)', r'\n\1\n', text)
-    text = re.sub(r'(Qualification:|Experience [^:]+:)', r'\n\1\n', text)
-    text = re.sub(r'(Experience in BHEL [^:]+:)', r'\n\1\n', text)
-    
-    # Clean up spacing around colons (important for key-value extraction)
-    text = re.sub(r'\s*:\s*', ': ', text)
-    
-    # Normalize date formats for better LLM understanding
-    text = re.sub(r'(\d{2})\.(\d{2})\.(\d{4})', r'\1.\2.\3', text)
-    
-    # Remove excessive whitespace and normalize line breaks
-    text = re.sub(r'\n\s*\n\s*\n', '\n\n', text)
-    text = re.sub(r'[ \t]+', ' ', text)
-    
-    # Remove common PDF artifacts - BUT PRESERVE STAFF NUMBERS
-    text = re.sub(r'Page \d+ of \d+', '', text)
-    # REMOVED: text = re.sub(r'^\s*\d+\s*$', '', text, flags=re.MULTILINE)  # This was removing staff numbers!
-    
-    # More specific page number removal - only remove isolated single/double digits at line start
-    text = re.sub(r'^\s*[1-9]\s*$', '', text, flags=re.MULTILINE)  # Only remove 1-9 (typical page numbers)
-    text = re.sub(r'^\s*[1-2][0-9]\s*$', '', text, flags=re.MULTILINE)  # Only remove 10-29 (common page ranges)
-    
-    # Fix common encoding issues
-    text = text.replace('â€™', "'")
-    text = text.replace('â€œ', '"')
-    text = text.replace('â€\x9d', '"')
-    text = text.replace('â€"', '-')
-    
-    # Normalize BHEL-specific terms for consistent extraction
-    text = re.sub(r'Dy\.\s*Engineer', 'Deputy Engineer', text)
-    text = re.sub(r'Asst\.\s*Engineer', 'Assistant Engineer', text)
-    
-    # Final cleanup
-    text = re.sub(r'\s+', ' ', text)
-    text = text.strip()
-    
-    return text
-
-def evaluate_extra_prompt_response(response_text, filename):
-    """
-    Enhanced evaluation that looks for final decision after reasoning
-    """
-    if not response_text:
-        logger.warning(f"Empty response for {filename}")
-        return False
-    
-    response_clean = response_text.strip().upper()
-    logger.info(f"Extra prompt response for {filename}: {response_clean}")
-    
-    # Look for final decision patterns (after reasoning)
-    final_patterns = [
-        r'FINAL ANSWER:\s*(YES|NO)',
-        r'DECISION:\s*(YES|NO)',
-        r'CONCLUSION:\s*(YES|NO)',
-        r'ANSWER:\s*(YES|NO)'
-    ]
-    
-    for pattern in final_patterns:
-        match = re.search(pattern, response_clean)
-        if match:
-            return match.group(1) == 'YES'
-    
-    # Fallback to end-of-response YES/NO
-    lines = response_clean.split('\n')
-    for line in reversed(lines[-3:]):  # Check last 3 lines
-        if re.search(r'\bYES\b', line) and not re.search(r'\bNO\b', line):
-            return True
-        if re.search(r'\bNO\b', line) and not re.search(r'\bYES\b', line):
-            return False
-    
-    logger.warning(f"Could not determine clear decision for {filename}: {response_clean}")
-    return False
-
-
-
-def extract_pdf_content(file_path):
-    """
-    Multi-method PDF extraction with fallbacks
-    """
-    logger.info(f"Extracting content from: {os.path.basename(file_path)}")
-    
-    # Method 1: Try PyMuPDF (best for complex layouts)
-    content = extract_text_pymupdf(file_path)
-    if content and len(content.strip()) > 100:
-        logger.info("Successfully extracted using PyMuPDF")
-        return clean_extracted_text(content)
-    
-    # Method 2: Fallback to LangChain loaders
-    content = extract_text_langchain(file_path)
-    if content and len(content.strip()) > 100:
-        logger.info("Successfully extracted using LangChain")
-        return clean_extracted_text(content)
-    
-    # Method 3: Last resort - basic text extraction
-    try:
-        import PyPDF2
-        with open(file_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            text_parts = []
-            for page in reader.pages:
-                text_parts.append(page.extract_text())
-            content = "\n".join(text_parts)
-            
-            if content and len(content.strip()) > 50:
-                logger.info("Successfully extracted using PyPDF2")
-                return clean_extracted_text(content)
-                
-    except Exception as e:
-        logger.error(f"PyPDF2 extraction failed: {e}")
-    
-    logger.error("All extraction methods failed")
-    return None
-
-def delete_files(file_paths):
-    import time
-    time.sleep(1000)
-    for path in file_paths:
-        if os.path.exists(path):
-            os.remove(path)
-
-def process_single_pdf(file, criteria, extra_prompt, MODEL_NAME):
-    filename = file.name
-    file_path = os.path.join(settings.MEDIA_ROOT, 'pdfs', filename)
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    Validate the processing fields given the uploaded files and form data.
+    Returns (params, None) on success or (None, error message)
+    """
+    files = uploads.getlist('files')
+    description = data.get('description', '')
+    extra_prompt = data.get('extra_prompt', '')
+    model_name = data.get('model_name', 'phi4')
+
+    if not files:
+        return None, "No files uploaded"
+    if not description:
+        return None, "Missing criteria description"
 
     try:
-        # Save file
-        with open(file_path, 'wb+') as dest:
-            for chunk in file.chunks():
-                dest.write(chunk)
-
-        # Enhanced PDF content extraction
-        content_str = extract_pdf_content(file_path)
-        ### print(content_str)
-        
-        if not content_str:
-            logger.error(f"Failed to extract content from {filename}")
-            return None, file_path
-
-        logger.info(f"Extracted {len(content_str)} characters from {filename}")
-
-        # Initialize Ollama LLM with optimized settings
-        llm = OllamaLLM(
-            model=MODEL_NAME,
-            base_url="http://localhost:11434",
-            temperature=0.1,
-            num_predict=2048,  # Limit response length for efficiency
-            top_k=10,          # Reduce randomness
-            top_p=0.9
-        )
+        criteria = json.loads(description)
+        if not isinstance(criteria, dict):
+            raise ValueError("Criteria must be a JSON object")
+        validate_criteria(criteria)
+    except (json.JSONDecodeError, ValueError) as e:
+        return None, f"Invalid criteria format: {str(e)}"
+
+    return {
+        "files": files,
+        "criteria": criteria,
+        "extra_prompt": extra_prompt,
+        "model_name": model_name,
+    }, None
+
+
+def download_url(request, filename, content_hash=None):
+    if content_hash:
+        return request.build_absolute_uri(f'/api/download/{content_hash}/{filename}/')
+    return request.build_absolute_uri(f'/api/download/{filename}/')
 
-        # Process extra prompt if provided
-        extra_prompt_flag = True
-        if extra_prompt:
-            # Enhanced prompt for better accuracy
-            if MODEL_NAME in ['phi4', 'phi3']:
-                prompt = f"""
-                You are a strict bio-data analyzer for BHEL.
-
-                DOCUMENT: {content_str[:3000]}
-                CRITERIA: {extra_prompt}
-
-                First, analyze the document step by step:
-                1. What relevant information do you find in the document?
-                2. How does this information relate to the criteria?
-                3. Based on your analysis, does the document meet the criteria?
-
-                Provide your reasoning first, then conclude with:
-                FINAL ANSWER: YES or NO
-
-                ANALYSIS:"""
-
-            elif MODEL_NAME == 'mistral':
-                prompt = f"""
-                You are a strict bio-data analyzer for BHEL.
-
-                DOCUMENT: {content_str[:3000]}
-                CRITERIA: {extra_prompt}
-
-                First, analyze the document step by step:
-                1. What relevant information do you find in the document?
-                2. How does this information relate to the criteria?
-                3. Based on your analysis, does the document meet the criteria?
-
-                Provide your reasoning first, then conclude with:
-                FINAL ANSWER: YES or NO
-
-                ANALYSIS:"""
-
-            
-            response_text = llm.invoke(prompt).strip()
-            extra_prompt_flag = evaluate_extra_prompt_response(response_text, filename)
-
-        # If extra_prompt check failed, return early
-        if not extra_prompt_flag:
-            return None, file_path
-
-        # If criteria is empty, return filename since extra_prompt check passed
-        if not criteria:
-            return filename, file_path
-
-        # Enhanced criteria processing with better prompt engineering
-        prompt = f"""
-        Extract structured data from this BHEL employee biodata document.
-
-        DOCUMENT CONTENT:
-        {content_str}
-
-        REQUIRED FIELDS TO EXTRACT:
-        {json.dumps(list(criteria.keys()), indent=2)}
-
-        INSTRUCTIONS:
-        - Extract ONLY the exact values present in the document
-        - Use the exact field names provided above
-        - Return valid JSON format only
-        - If a field is missing, set its value to null
-        - Do not add explanations or extra text
-
-        EXAMPLE OUTPUT FORMAT:
-        {{"name": "extracted name", "dateofbirth": "DD-MM-YYYY", "department": "department name"}}
-
-        JSON OUTPUT:"""
-
-        llm_response = llm.invoke(prompt).strip()
-        
-        # Clean response to extract JSON
-        if llm_response.startswith("```"):
-            llm_response = re.sub(r"```(?:json)?\n?|```", "", llm_response)
-        
-        # Find JSON in response
-        json_match = re.search(r'\{.*\}', llm_response, re.DOTALL)
-        if json_match:
-            llm_response = json_match.group()
-        
-        try:
-            extracted_data = json.loads(llm_response)
-            extracted_data = {k.lower(): str(v).lower() for k, v in extracted_data.items() if v is not None}
-            criteria_lower = {k.lower(): str(v).lower() for k, v in criteria.items()}
-            
-            # Enhanced date format handling
-            if 'dateofbirth' in extracted_data:
-                date_val = extracted_data['dateofbirth']
-                # Normalize various date formats
-                date_val = re.sub(r'[-/\\.]', '.', date_val)
-                extracted_data['dateofbirth'] = date_val
-            
-            # Improved matching logic
-            match = all(
-                k in extracted_data and (
-                    criteria_lower[k] in extracted_data[k] or 
-                    extracted_data[k] in criteria_lower[k] or
-                    any(word in extracted_data[k] for word in criteria_lower[k].split()) or
-                    any(word in criteria_lower[k] for word in extracted_data[k].split())
-                )
-                for k in criteria_lower
-            )
-            
-            if match:
-                logger.info(f"Match found: {filename}")
-                return filename, file_path
-                
-        except (json.JSONDecodeError, Exception) as e:
-            logger.error(f"Error processing {filename}: {str(e)[:200]}")
-            return None, file_path
-
-    except Exception as e:
-        logger.error(f"Error processing {filename}: {str(e)[:200]}")
-        return None, file_path
-
-    return None, file_path
+
+STREAM_CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+def get_stream_format(query, data):
+    """
+    Streaming mode requested via ?stream=ndjson|sse or a 'stream' form field.
+    Returns None for a regular buffered response.
+    """
+    requested = (query.get('stream') or data.get('stream') or '').lower()
+    return requested if requested in STREAM_CONTENT_TYPES else None
+
+
+def format_event(event, payload, stream_format):
+    data = json.dumps(payload, default=str)
+    if stream_format == "sse":
+        return f"event: {event}\ndata: {data}\n\n"
+    return json.dumps({"event": event, **payload}, default=str) + "\n"
+
+
+class BatchSummary:
+    """
+    Running totals of a processing batch: one event payload per result and
+    the final summary
+    """
+
+    def __init__(self, request, total):
+        self.request = request
+        self.total = total
+        self.matches = []
+        self.methods = Counter()
+        self.field_sources = Counter()
+        self.pruned = 0
+        self.processed = 0
+
+    def add(self, result):
+        """
+        Count a result and return its event payload
+        """
+        self.processed += 1
+        self.methods[result.get("extraction_method")] += 1
+        self.field_sources.update((result.get("field_sources") or {}).values())
+        self.pruned += bool(result.get("pruned"))
+        payload = {
+            "filename": result["filename"],
+            "content_hash": result.get("content_hash"),
+            "matched": result["matched"],
+            "fields": result["fields"],
+            "error": result["error"],
+            "extraction_method": result.get("extraction_method"),
+            "field_sources": result.get("field_sources") or {},
+            "pruned": bool(result.get("pruned")),
+            "processed": self.processed,
+            "total": self.total,
+        }
+        if result["matched"]:
+            payload["url"] = download_url(self.request, result["filename"], result.get("content_hash"))
+            self.matches.append({"filename": result["filename"], "url": payload["url"]})
+        return payload
+
+    def summary(self):
+        return {
+            "matches": self.matches,
+            "processed_files": self.total,
+            "matching_files": len(self.matches),
+            "extraction_method": "enhanced_multi_method",
+            "extraction_methods": dict(self.methods),
+            "field_sources": dict(self.field_sources),
+            "pruned_files": self.pruned
+        }
+
+
+def stream_results(request, params, stream_format):
+    """
+    Emit one event per file as soon as it is processed, then a summary event
+    """
+    batch = BatchSummary(request, len(params["files"]))
+    for result in process_batch(
+        params["files"],
+        params["criteria"],
+        params["extra_prompt"],
+        params["model_name"],
+    ):
+        yield format_event("result", batch.add(result), stream_format)
+
+    yield format_event("summary", batch.summary(), stream_format)
+
+
+async def astream_results(request, params, stream_format):
+    """
+    stream_results over the async pipeline
+    """
+    batch = BatchSummary(request, len(params["files"]))
+    async for result in aprocess_batch(
+        params["files"],
+        params["criteria"],
+        params["extra_prompt"],
+        params["model_name"],
+    ):
+        yield format_event("result", batch.add(result), stream_format)
+
+    yield format_event("summary", batch.summary(), stream_format)
+
+
+def stream_response(events, stream_format):
+    response = StreamingHttpResponse(events, content_type=STREAM_CONTENT_TYPES[stream_format])
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 class PDFProcessView(APIView):
     def post(self, request, format=None):
-        files = request.FILES.getlist('files')
-        description = request.data.get('description', '')
-        extra_prompt = request.data.get('extra_prompt', '')
-        model_name = request.data.get('model_name', 'phi4')
+        params, error = parse_process_request(request)
+        if error:
+            return error
+
+        stream_format = get_stream_format(request.query_params, request.data)
+        if stream_format:
+            return stream_response(stream_results(request, params, stream_format), stream_format)
+
+        batch = BatchSummary(request, len(params["files"]))
+        for result in process_batch(
+            params["files"],
+            params["criteria"],
+            params["extra_prompt"],
+            params["model_name"],
+        ):
+            batch.add(result)
+
+        return Response(batch.summary(), status=status.HTTP_200_OK)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncPDFProcessView(View):
+    """
+    PDFProcessView for ASGI servers: the batch runs as tasks on the event
+    loop with non-blocking Ollama calls, so a request holds no thread while
+    its documents wait on parsing or the model. Same fields and responses.
+    Needs an ASGI server run separately (daphne or uvicorn on backend.asgi);
+    under runserver / WSGI its streamed responses are buffered in full.
+    """
+    async def post(self, request):
+        params, error = read_process_params(request.FILES, request.POST)
+        if error:
+            return JsonResponse({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        stream_format = get_stream_format(request.GET, request.POST)
+        if stream_format:
+            return stream_response(astream_results(request, params, stream_format), stream_format)
+
+        batch = BatchSummary(request, len(params["files"]))
+        async for result in aprocess_batch(
+            params["files"],
+            params["criteria"],
+            params["extra_prompt"],
+            params["model_name"],
+        ):
+            batch.add(result)
+
+        return JsonResponse(batch.summary(), status=status.HTTP_200_OK)
+
+
+class JobCreateView(APIView):
+    """
+    Queue a batch for background processing and return its job id immediately
+    """
+    def post(self, request, format=None):
+        params, error = parse_process_request(request)
+        if error:
+            return error
+
+        job = create_job(
+            params["files"],
+            params["criteria"],
+            params["extra_prompt"],
+            params["model_name"],
+        )
 
-        if not files:
-            return Response({"error": "No files uploaded"}, status=status.HTTP_400_BAD_REQUEST)
-        if not description:
-            return Response({"error": "Missing criteria description"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "job_id": str(job.id),
+            "status": job.status,
+            "total_files": len(params["files"]),
+            "status_url": request.build_absolute_uri(f'/api/jobs/{job.id}/')
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class JobStatusView(APIView):
+    """
+    Progress of a background job: per-file status, matches found so far and ETA
+    """
+    def get(self, request, job_id):
+        # Polling after a restart is enough to pick interrupted jobs back up
+        get_job_executor()
+
+        job = get_object_or_404(Job, id=job_id)
+        progress = job_progress(job)
+        progress["matches"] = [
+            {
+                "filename": f["filename"],
+                "url": download_url(request, f["filename"], f["content_hash"])
+            } for f in progress["files"] if f["status"] == "matched"
+        ]
+        return Response(progress, status=status.HTTP_200_OK)
+
+
+class FieldQueryView(APIView):
+    """
+    Answer criteria over stored documents from their already extracted
+    fields, running the LLM only for fields no document has stored yet
+    """
+    def post(self, request, format=None):
+        criteria = request.data.get('criteria', request.data.get('description', ''))
+        model_name = request.data.get('model_name', 'phi4')
+        content_hashes = request.data.get('content_hashes')
 
         try:
-            criteria = json.loads(description)
-            if not isinstance(criteria, dict):
-                raise ValueError("Criteria must be a JSON object")
+            if isinstance(criteria, str):
+                criteria = json.loads(criteria) if criteria else None
+            if not isinstance(criteria, dict) or not criteria:
+                raise ValueError("Criteria must be a non-empty JSON object")
+            validate_criteria(criteria)
         except (json.JSONDecodeError, ValueError) as e:
             return Response({"error": f"Invalid criteria format: {str(e)}"},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        matching_files = []
-        file_paths = []
-
-        # Optimized for single instance with reduced concurrency
-        with ThreadPoolExecutor(max_workers=min(len(files), 2)) as executor:
-            futures = []
-            for file in files:
-                future = executor.submit(
-                    process_single_pdf,
-                    file, criteria, extra_prompt, model_name
-                )
-                futures.append(future)
-            
-            for future in as_completed(futures):
-                try:
-                    filename, file_path = future.result()
-                    if filename:
-                        matching_files.append(filename)
-                    if file_path:
-                        file_paths.append(file_path)
-                except Exception as e:
-                    logger.error(f"Error processing file: {e}")
-
-        threading.Thread(
-            target=delete_files,
-            args=(file_paths,),
-            daemon=True
-        ).start()
+        if isinstance(content_hashes, str):
+            content_hashes = [h.strip() for h in content_hashes.split(',') if h.strip()]
+
+        results, stats = query_documents(criteria, model_name, content_hashes)
+
+        field_sources = Counter()
+        for result in results:
+            field_sources.update((result.get("field_sources") or {}).values())
 
         return Response({
             "matches": [
                 {
-                    "filename": fname,
-                    "url": request.build_absolute_uri(f'/api/download/{fname}/')
-                } for fname in matching_files
+                    "filename": result["filename"],
+                    "url": download_url(request, result["filename"], result["content_hash"]),
+                    "fields": result["fields"],
+                } for result in results if result["matched"]
             ],
-            "processed_files": len(files),
-            "matching_files": len(matching_files),
-            "extraction_method": "enhanced_multi_method"
+            "matching_files": sum(1 for result in results if result["matched"]),
+            "failed_files": sum(1 for result in results if result["error"]),
+            "field_sources": dict(field_sources),
+            **stats,
         }, status=status.HTTP_200_OK)
 
+
+class KeywordSearchView(APIView):
+    """
+    Stored documents ranked by keyword relevance (BM25), without any inference.
+    Uploads are covered only until they expire (upload_ttl_seconds).
+    """
+    def get(self, request):
+        text = request.query_params.get('q', '')
+        if not text.strip():
+            return Response({"error": "Missing search text"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 200)
+        except ValueError:
+            return Response({"error": "Invalid limit"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not search_available():
+            return Response({"error": "Full-text index not available"},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        hits = keyword_search(text, limit)
+        for hit in hits:
+            hit["url"] = download_url(request, hit["filename"], hit["content_hash"])
+        return Response({"query": text, "hits": hits, "upload_ttl_seconds": STORAGE_TTL_SECONDS},
+                        status=status.HTTP_200_OK)
+
+
+class SemanticSearchView(APIView):
+    """
+    Stored documents ranked by meaning (local embedding index); the yes/no
+    LLM check runs only on the top candidates
+    """
+    def post(self, request, format=None):
+        text = request.data.get('query', '')
+        model_name = request.data.get('model_name', 'phi4')
+        verify = str(request.data.get('verify', 'true')).lower() == 'true'
+        if not str(text).strip():
+            return Response({"error": "Missing search text"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            top_k = min(max(int(request.data.get('top_k', SEMANTIC_TOP_K)), 1), 100)
+        except (TypeError, ValueError):
+            return Response({"error": "Invalid top_k"}, status=status.HTTP_400_BAD_REQUEST)
+
+        hits, stats = semantic_search(text, top_k, model_name, verify)
+        for hit in hits:
+            hit["url"] = download_url(request, hit["filename"], hit["content_hash"])
+
+        response = {"query": text, "hits": hits, **stats}
+        if verify:
+            response["matching_files"] = sum(1 for hit in hits if hit.get("matched"))
+        return Response(response, status=status.HTTP_200_OK)
+
+
+def ingest_events(sources, stream_format):
+    """
+    Emit one event per PDF as it is ingested, then a summary event
+    """
+    counts = Counter()
+    for result in ingest(sources):
+        counts[result["status"]] += 1
+        yield format_event("result", {**result, "processed": sum(counts.values())}, stream_format)
+
+    yield format_event("summary", {"total_files": sum(counts.values()), **counts}, stream_format)
+
+
+class IngestView(APIView):
+    """
+    Bulk-add PDFs to the document store from an uploaded ZIP ('archive') or
+    a server-side directory ('directory') under INGEST_DIRECTORY_ROOTS. PDFs
+    are stored, extracted and indexed one at a time, skipping those already
+    ingested; criteria can then be answered with /api/query/.
+    """
+    def post(self, request, format=None):
+        archive = request.FILES.get('archive')
+        directory = request.data.get('directory', '')
+
+        if archive is not None:
+            if not zipfile.is_zipfile(archive):
+                return Response({"error": "Archive is not a ZIP file"}, status=status.HTTP_400_BAD_REQUEST)
+            archive.seek(0)
+            sources = zip_sources(archive)
+        elif directory:
+            # Checked first so the answer does not reveal which paths exist
+            if not directory_allowed(directory):
+                return Response({"error": "Directory not allowed"}, status=status.HTTP_403_FORBIDDEN)
+            if not os.path.isdir(directory):
+                return Response({"error": "Directory not found"}, status=status.HTTP_400_BAD_REQUEST)
+            sources = directory_sources(directory)
+        else:
+            return Response({"error": "Upload an 'archive' or give a 'directory'"}, status=status.HTTP_400_BAD_REQUEST)
+
+        stream_format = get_stream_format(request.query_params, request.data)
+        if stream_format:
+            return stream_response(ingest_events(sources, stream_format), stream_format)
+
+        files = list(ingest(sources))
+        counts = Counter(result["status"] for result in files)
+        return Response({"total_files": len(files), **counts, "files": files}, status=status.HTTP_200_OK)
+
 # Your existing PDFDownloadView and HealthCheckView remain the same
 
 
 class PDFDownloadView(APIView):
     @xframe_options_exempt
-    def get(self, request, filename):
-        file_path = os.path.join(settings.MEDIA_ROOT, 'pdfs', filename)
-        if os.path.exists(file_path):
+    def get(self, request, filename, content_hash=None):
+        if content_hash is not None and not re.fullmatch(r'[0-9a-f]{64}', content_hash):
+            raise Http404("PDF not found")
+
+        file_path = find_pdf(filename, content_hash)
+        if file_path:
             # Use ?download=true for download, otherwise preview inline
             download = request.query_params.get('download', 'false').lower() == 'true'
             return FileResponse(open(file_path, 'rb'), as_attachment=download, filename=filename)
@@ -448,8 +453,36 @@ class PDFDownloadView(APIView):
 
 class HealthCheckView(APIView):
     def get(self, request):
+        record_health_check()
         return Response({
             "status": "healthy",
             "message": "API is up and running"
         }, status=status.HTTP_200_OK)
 
+
+class StatsView(APIView):
+    """
+    Cache, storage, Ollama, concurrency and startup statistics (kept off
+    /api/health/, which the desktop app polls and must stay cheap)
+    """
+    def get(self, request):
+        return Response({
+            "extraction_cache": extraction_cache_stats(),
+            "llm_cache": llm_cache_stats(),
+            "storage": janitor_stats(),
+            "ollama": llm_stats(),
+            "llm_concurrency": limiter_stats(),
+            "startup": startup_stats(),
+        }, status=status.HTTP_200_OK)
+
+
+class MetricsView(APIView):
+    """
+    Stage timings, extraction methods, LLM latency/tokens, cache and queue
+    metrics in the Prometheus text format
+    """
+    def get(self, request):
+        if not METRICS_ENABLED:
+            raise Http404("Metrics are disabled")
+        return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
@@ -14,3 +14,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_asgi_application()
+
+# Load the default model into Ollama while the server finishes starting;
+# once it is up, resume interrupted jobs and import the PDF / LLM libraries
+from api.llm import start_warm_up  # noqa: E402
+from api.startup import start_preload  # noqa: E402
+
+start_warm_up()
+start_preload()
@@ -63,6 +63,12 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
+# Opt-in: /api/process/async/ only runs on the event loop (and streams)
+# under an ASGI server, e.g. `daphne backend.asgi:application` or
+# `uvicorn backend.asgi:application`. runserver, which the desktop app
+# launches, stays on WSGI where the streamed /api/process/ and /api/ingest/
+# responses are sent as each file finishes.
+ASGI_APPLICATION = 'backend.asgi.application'
 
 
 # Database
@@ -131,3 +137,108 @@ REST_FRAMEWORK = {
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Extraction cache: total bytes of cleaned text kept before LRU eviction
+EXTRACTION_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# LLM response cache: entries expire after the TTL or when over the byte budget
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+LLM_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Background job workers shared by all queued batches
+JOB_WORKERS = 2
+
+# Processing pipeline: PDF parsing processes (0 = parse in threads)
+EXTRACTION_WORKERS = os.cpu_count() or 1
+# LLM worker threads per batch, for each Ollama host
+LLM_WORKERS = 8
+# Parsed documents that may wait for the LLM stage
+LLM_QUEUE_SIZE = 8
+# PDFs with at least PAGE_SPLIT_MIN_PAGES pages are parsed in PAGES_PER_TASK ranges
+PAGE_SPLIT_MIN_PAGES = 16
+PAGES_PER_TASK = 8
+
+# Storage janitor: uploaded PDFs expire after the TTL (downloads and queries
+# renew it) and the least recently used go first once the directory exceeds
+# the byte quota. Their Documents go with them, so /api/query/ and the
+# searches cover only uploads younger than the TTL plus ingested PDFs.
+STORAGE_TTL_SECONDS = 60 * 60
+STORAGE_MAX_BYTES = 1024 * 1024 * 1024
+JANITOR_INTERVAL_SECONDS = 60
+
+# Ollama: one pooled client per model, models stay loaded for OLLAMA_KEEP_ALIVE
+# and OLLAMA_WARMUP_MODELS are preloaded when the server starts
+OLLAMA_BASE_URL = 'http://localhost:11434'
+# LLM calls are spread over OLLAMA_HOSTS (default: OLLAMA_BASE_URL alone), each
+# to the healthy host serving the model with the fewest calls outstanding and
+# retried on another host if it fails; hosts are probed every interval
+OLLAMA_HOSTS = [OLLAMA_BASE_URL]
+OLLAMA_HEALTH_INTERVAL_SECONDS = 30
+OLLAMA_HEALTH_TIMEOUT_SECONDS = 5
+OLLAMA_KEEP_ALIVE = '30m'
+OLLAMA_MAX_CONNECTIONS = 8
+OLLAMA_WARMUP_MODELS = ['phi4']
+
+# Adaptive (AIMD) limit on concurrent LLM calls per model across all requests:
+# grows while latency stays normal, is cut by LLM_BACKOFF on errors or calls
+# slower than LLM_LATENCY_TOLERANCE times the usual latency
+LLM_INITIAL_CONCURRENCY = 2
+LLM_MAX_CONCURRENCY = 8
+LLM_LATENCY_TOLERANCE = 2.0
+LLM_BACKOFF = 0.5
+
+# With both an extra prompt and criteria, answer both in one JSON-schema call
+COMBINED_LLM_CALL = True
+
+# Opt-in: LLM workers take up to BATCHED_PROMPT_MAX_DOCUMENTS parsed documents
+# at once and extract the criteria fields of the short ones (together within
+# the model's context budget) in one call returning a JSON array by document
+# id; documents the answer misses fall back to their own call
+BATCHED_PROMPTS = False
+BATCHED_PROMPT_MAX_DOCUMENTS = 4
+
+# Read structured BHEL fields (staff no, dates, grade, ...) with rules first and
+# only ask the LLM for criteria the rules cannot answer
+RULE_EXTRACTION = True
+
+# Documents analyzed concurrently by /api/query/ for fields not stored yet
+QUERY_WORKERS = 4
+
+# Skip the LLM for documents whose text contains none of the words of some
+# eq/contains/in criterion value (SQLite FTS5 index for stored documents, see
+# /api/search/); plain loosely matched values never rule a document out
+TEXT_PREFILTER = True
+
+# Section-aware prompt context: prompts carry only the biodata sections that
+# matter for the requested fields / extra prompt, within a per-model budget of
+# document tokens (models not listed get DEFAULT_CONTEXT_TOKENS)
+SECTION_CONTEXT = True
+MODEL_CONTEXT_TOKENS = {'phi4': 3000, 'phi3': 1500, 'mistral': 3000}
+DEFAULT_CONTEXT_TOKENS = 2000
+
+# Local embedding index for /api/semantic-search/ ('stub' embeds offline by
+# hashing words, for tests); vectors live under MEDIA_ROOT/embeddings/<model>
+EMBEDDING_BACKEND = 'ollama'
+EMBEDDING_MODEL = 'nomic-embed-text'
+EMBEDDING_CHUNK_CHARS = 1000
+SEMANTIC_TOP_K = 5
+# Documents are embedded by a background worker as they are extracted or
+# ingested (through the Ollama host pool); searches only embed the query
+BACKGROUND_EMBEDDING = True
+
+# Bulk ingestion (/api/ingest/, manage.py ingest_pdfs) of ZIP archives and
+# server-side directories. /api/ingest/ only reads directories under these
+# roots: CORS lets any web page call the API, so none are allowed by default
+# and manage.py ingest_pdfs is the way to ingest a local directory
+INGEST_DIRECTORY_ROOTS = []
+INGEST_MAX_FILE_BYTES = 200 * 1024 * 1024
+
+# The PDF and LLM libraries are imported on first use so /api/health/ answers
+# right after start-up; PRELOAD_IMPORTS imports them in the background
+# PRELOAD_DELAY_SECONDS later, when interrupted jobs are also resumed
+PRELOAD_IMPORTS = True
+PRELOAD_DELAY_SECONDS = 1.0
+
+# Prometheus-format metrics at /api/metrics/ (stage timings, extraction
+# methods, LLM latency and tokens, caches, queues); off skips all recording
+METRICS_ENABLED = True
@@ -2,10 +2,14 @@
 """Django's command-line utility for administrative tasks."""
 import os
 import sys
+import multiprocessing
 
 
 def main():
     """Run administrative tasks."""
+    # In the frozen desktop build every spawned PDF parsing worker starts
+    # this executable again; this hands it over to multiprocessing instead
+    multiprocessing.freeze_support()
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
     try:
         from django.core.management import execute_from_command_line